@@ -1,2 +1,17 @@
-scp db.sqlite3 phoenix.elmartus.mooo.com:workspace/irdin
-scp db.sqlite3 multilanguage:apps/irdin/repo
+#!/bin/bash
+set -eo pipefail
+
+# Push the rows changed here since the last push, instead of the whole db.sqlite3.
+# Each host keeps the high-water mark of what it merged from us in .sync_mark_<our hostname>.
+MARK=.sync_mark_$(hostname -s)
+
+push() {
+    local host=$1 dir=$2
+    local since
+    since=$(ssh "$host" "cat $dir/$MARK 2>/dev/null" || true)
+    uv run python manage.py sync_export - ${since:+--since $since} \
+        | ssh -C "$host" "cd $dir && uv run python manage.py sync_import - --mark-file $MARK"
+}
+
+push phoenix.elmartus.mooo.com workspace/irdin
+push multilanguage apps/irdin/repo
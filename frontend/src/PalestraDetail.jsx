@@ -1,7 +1,7 @@
 import { useState, useEffect, useRef, useCallback } from "react";
 import { useParams, useSearchParams, Link } from "react-router-dom";
 import "./PalestraDetail.css";
-import { highlightText } from "./textUtils.jsx";
+import { highlightText, queryTerms } from "./textUtils.jsx";
 import ThemeToggle from "./ThemeToggle.jsx";
 
 function parseTimecoded(text) {
@@ -139,14 +139,23 @@ function TrackPlayer({ track, words, initialTime, onSeek, getShareUrl, onCopy })
         ref={audioRef}
         controls
         preload="metadata"
-        src={track.audio_url}
         className="track-audio"
-      />
+      >
+        {/* The first playable source wins: HLS where native (iOS), else Opus, else the original */}
+        {track.renditions?.hls && (
+          <source src={track.renditions.hls} type="application/vnd.apple.mpegurl" />
+        )}
+        {track.renditions?.opus && (
+          <source src={track.renditions.opus} type='audio/ogg; codecs="opus"' />
+        )}
+        <source src={track.audio_url} />
+      </audio>
       {lines.length > 0 && (
         <div className="transcription" ref={transcriptionRef}>
           {lines.map((line, i) => (
             <div
               key={i}
+              id={`line-${track.id}-${i}`}
               ref={(el) => { lineElemsRef.current[i] = el; }}
               className={`transcription-line${i === activeIndex ? " active" : ""}${line.seconds !== null ? " clickable" : ""}`}
               onClick={() => seekTo(line.seconds)}
@@ -183,7 +192,7 @@ export default function PalestraDetail() {
   const { slug } = useParams();
   const [searchParams, setSearchParams] = useSearchParams();
   const q = searchParams.get("q") || "";
-  const words = q.trim().split(/\s+/).filter(Boolean);
+  const words = queryTerms(q);
   const initialTrackId = searchParams.get("track") ? parseInt(searchParams.get("track"), 10) : null;
   const initialTime = searchParams.get("t") ? parseFloat(searchParams.get("t")) : null;
 
@@ -191,6 +200,9 @@ export default function PalestraDetail() {
   const [error, setError] = useState(null);
   const [toast, setToast] = useState(false);
   const toastTimerRef = useRef(null);
+  const [matches, setMatches] = useState([]);
+  const [matchesTruncated, setMatchesTruncated] = useState(false);
+  const [matchIndex, setMatchIndex] = useState(-1);
 
   function showToast() {
     clearTimeout(toastTimerRef.current);
@@ -228,6 +240,29 @@ export default function PalestraDetail() {
       .catch(() => setError("Palestra não encontrada."));
   }, [slug]);
 
+  useEffect(() => {
+    setMatches([]);
+    setMatchesTruncated(false);
+    setMatchIndex(-1);
+    if (!q.trim()) return;
+    fetch(`/api/palestras/${slug}/search?q=${encodeURIComponent(q)}`)
+      .then((r) => (r.ok ? r.json() : { matches: [] }))
+      .then((result) => {
+        setMatches(result.matches);
+        setMatchesTruncated(Boolean(result.truncated));
+      });
+  }, [slug, q]);
+
+  function goToMatch(step) {
+    if (!matches.length) return;
+    const next = (matchIndex + step + matches.length) % matches.length;
+    setMatchIndex(next);
+    const match = matches[next];
+    document
+      .getElementById(`line-${match.track_id}-${match.line}`)
+      ?.scrollIntoView({ behavior: "smooth", block: "center" });
+  }
+
   const backLink = q ? `/?q=${encodeURIComponent(q)}` : "/";
 
   if (error) {
@@ -312,6 +347,15 @@ export default function PalestraDetail() {
             </Link>
           </>
         )}
+        {matches.length > 0 && (
+          <span className="match-nav">
+            <button onClick={() => goToMatch(-1)} title="Ocorrência anterior">‹</button>
+            {matchIndex >= 0
+              ? `${matchIndex + 1} / ${matches.length}${matchesTruncated ? "+" : ""}`
+              : `${matches.length}${matchesTruncated ? "+" : ""} ocorrências`}
+            <button onClick={() => goToMatch(1)} title="Próxima ocorrência">›</button>
+          </span>
+        )}
       </div>
 
       {data.tracks.length > 0 && (
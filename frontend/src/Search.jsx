@@ -1,6 +1,6 @@
 import { useState, useEffect, useRef } from "react";
 import { Link, useSearchParams } from "react-router-dom";
-import { highlightText, snippetAround } from "./textUtils.jsx";
+import { highlightText, queryTerms, snippetAround } from "./textUtils.jsx";
 import ThemeToggle from "./ThemeToggle.jsx";
 
 const ALL_FIELDS = [
@@ -92,7 +92,6 @@ function CheckboxDropdown({ label, pluralLabel, items, selected, onToggle }) {
 export default function Search() {
   const [searchParams, setSearchParams] = useSearchParams();
   const initialQ = searchParams.get("q") || "";
-  const initialPage = parseInt(searchParams.get("page"), 10) || 1;
   const initialFields = searchParams.getAll("fields").length > 0
     ? searchParams.getAll("fields")
     : loadFields();
@@ -108,6 +107,10 @@ export default function Search() {
 
   const [query, setQuery] = useState(initialQ);
   const [fields, setFields] = useState(initialFields);
+  const [fuzzy, setFuzzy] = useState(
+    searchParams.get("fuzzy") === "1" || localStorage.getItem("searchFuzzy") === "1"
+  );
+  const [expansions, setExpansions] = useState({});
   const [selectedAuthors, setSelectedAuthors] = useState(initialAuthors);
   const [selectedLanguages, setSelectedLanguages] = useState(initialLanguages);
   const [selectedCategories, setSelectedCategories] = useState(initialCategories);
@@ -116,32 +119,36 @@ export default function Search() {
   const [categoriesList, setCategoriesList] = useState([]);
   const [results, setResults] = useState([]);
   const [total, setTotal] = useState(0);
-  const [page, setPage] = useState(initialPage);
-  const [pages, setPages] = useState(1);
+  const [totalCapped, setTotalCapped] = useState(false);
+  const [next, setNext] = useState(null);
   const [loading, setLoading] = useState(false);
+  const [loadingMore, setLoadingMore] = useState(false);
+  const [suggestions, setSuggestions] = useState([]);
   const timerRef = useRef(null);
+  const suggestTimerRef = useRef(null);
   const initialLoad = useRef(true);
+  const searchRef = useRef("");  // parameters of the search the results belong to
 
   useEffect(() => {
     fetch("/api/authors")
       .then((r) => r.json())
-      .then((data) => setAuthorsList(data.authors.map((a) => ({ value: a.slug, label: a.name }))));
+      .then((data) => setAuthorsList(data.authors.map((a) => ({ value: a.slug, label: `${a.name} (${a.count})` }))));
     fetch("/api/languages")
       .then((r) => r.json())
-      .then((data) => setLanguagesList(data.languages.map((l) => ({ value: l, label: l }))));
+      .then((data) => setLanguagesList(data.languages.map((l) => ({ value: l, label: `${l} (${data.counts[l]})` }))));
     fetch("/api/categories")
       .then((r) => r.json())
-      .then((data) => setCategoriesList(data.categories.map((c) => ({ value: c, label: c }))));
+      .then((data) => setCategoriesList(data.categories.map((c) => ({ value: c, label: `${c} (${data.counts[c]})` }))));
   }, []);
 
-  function updateUrl(q, p, f, authors, languages, categories) {
+  function updateUrl(q, f, authors, languages, categories) {
     const params = new URLSearchParams();
     if (q.trim()) params.set("q", q);
-    if (p > 1) params.set("page", String(p));
     f.forEach((field) => params.append("fields", field));
     authors.forEach((slug) => params.append("author", slug));
     languages.forEach((lang) => params.append("language", lang));
     categories.forEach((c) => params.append("category", c));
+    if (fuzzy) params.set("fuzzy", "1");
     setSearchParams(params, { replace: true });
   }
 
@@ -153,6 +160,13 @@ export default function Search() {
     });
   }
 
+  function toggleFuzzy() {
+    setFuzzy((prev) => {
+      localStorage.setItem("searchFuzzy", prev ? "0" : "1");
+      return !prev;
+    });
+  }
+
   function toggleAuthor(slug) {
     setSelectedAuthors((prev) => {
       const next = prev.includes(slug) ? prev.filter((s) => s !== slug) : [...prev, slug];
@@ -177,49 +191,89 @@ export default function Search() {
     });
   }
 
-  function doSearch(q, p = 1, f = fields, authors = selectedAuthors, languages = selectedLanguages, categories = selectedCategories) {
+  function doSearch(q, f = fields, authors = selectedAuthors, languages = selectedLanguages, categories = selectedCategories) {
     if (!q.trim() && authors.length === 0 && languages.length === 0 && categories.length === 0) {
+      searchRef.current = "";
       setResults([]);
       setTotal(0);
-      setPage(1);
-      setPages(1);
-      updateUrl("", 1, f, authors, languages, categories);
+      setTotalCapped(false);
+      setNext(null);
+      updateUrl("", f, authors, languages, categories);
       return;
     }
     setLoading(true);
-    updateUrl(q, p, f, authors, languages, categories);
+    updateUrl(q, f, authors, languages, categories);
     const params = new URLSearchParams();
     params.set("q", q);
-    params.set("page", p);
     f.forEach((field) => params.append("fields", field));
     authors.forEach((slug) => params.append("author", slug));
     languages.forEach((lang) => params.append("language", lang));
     categories.forEach((c) => params.append("category", c));
-    fetch(`/api/search?${params}`)
+    if (fuzzy) params.set("fuzzy", "1");
+    const search = params.toString();
+    searchRef.current = search;
+    fetch(`/api/search?${search}`)
       .then((r) => r.json())
       .then((data) => {
+        if (searchRef.current !== search) return;  // a newer search was started
         setResults(data.results);
+        setExpansions(data.expansions || {});
         setTotal(data.total);
-        setPage(data.page);
-        setPages(data.pages);
+        setTotalCapped(data.total_capped);
+        setNext(data.next);
       })
       .finally(() => setLoading(false));
   }
 
+  // Later pages follow the cursor of the last one; counts and facets come with the first.
+  function loadMore() {
+    const search = searchRef.current;
+    setLoadingMore(true);
+    fetch(`/api/search?${search}&cursor=${encodeURIComponent(next)}`)
+      .then((r) => r.json())
+      .then((data) => {
+        if (searchRef.current !== search) return;
+        setResults((prev) => [...prev, ...data.results]);
+        setNext(data.next);
+      })
+      .finally(() => setLoadingMore(false));
+  }
+
   useEffect(() => {
     if (initialLoad.current) {
       initialLoad.current = false;
-      doSearch(query, initialPage, fields, selectedAuthors, selectedLanguages, selectedCategories);
+      doSearch(query, fields, selectedAuthors, selectedLanguages, selectedCategories);
       return;
     }
     clearTimeout(timerRef.current);
     timerRef.current = setTimeout(() => {
-      doSearch(query, 1, fields, selectedAuthors, selectedLanguages, selectedCategories);
+      doSearch(query, fields, selectedAuthors, selectedLanguages, selectedCategories);
     }, 300);
     return () => clearTimeout(timerRef.current);
-  }, [query, fields, selectedAuthors, selectedLanguages, selectedCategories]);
+  }, [query, fields, fuzzy, selectedAuthors, selectedLanguages, selectedCategories]);
 
-  const words = query.trim().split(/\s+/).filter(Boolean);
+  useEffect(() => {
+    clearTimeout(suggestTimerRef.current);
+    if (query.trim().length < 2) {
+      setSuggestions([]);
+      return;
+    }
+    suggestTimerRef.current = setTimeout(() => {
+      fetch(`/api/suggest?q=${encodeURIComponent(query)}`)
+        .then((r) => r.json())
+        .then((data) => setSuggestions(data.suggestions));
+    }, 80);
+    return () => clearTimeout(suggestTimerRef.current);
+  }, [query]);
+
+  function handleKeyDown(e) {
+    if (e.key === "Enter") {
+      clearTimeout(timerRef.current);
+      doSearch(query);
+    }
+  }
+
+  const words = [...queryTerms(query), ...Object.values(expansions).flat()];
 
   return (
     <>
@@ -237,8 +291,15 @@ export default function Search() {
         placeholder="Pesquisar palestras…"
         value={query}
         onChange={(e) => setQuery(e.target.value)}
+        onKeyDown={handleKeyDown}
+        list="search-suggestions"
         autoFocus
       />
+      <datalist id="search-suggestions">
+        {suggestions.map((s) => (
+          <option key={`${s.kind}:${s.slug || s.label}`} value={s.label} />
+        ))}
+      </datalist>
 
       <div className="field-filters">
         {ALL_FIELDS.map(({ key, label }) => (
@@ -251,6 +312,10 @@ export default function Search() {
             {label}
           </label>
         ))}
+        <label className="field-checkbox" title="Encontra também palavras parecidas, para erros de digitação">
+          <input type="checkbox" checked={fuzzy} onChange={toggleFuzzy} />
+          Aproximada
+        </label>
         <CheckboxDropdown
           label="Autor"
           pluralLabel="Autores"
@@ -278,7 +343,7 @@ export default function Search() {
 
       {!loading && (query.trim() || selectedAuthors.length > 0 || selectedLanguages.length > 0 || selectedCategories.length > 0) && (
         <p className="status">
-          {total} resultado{total !== 1 ? "s" : ""} encontrado
+          {total}{totalCapped ? "+" : ""} resultado{total !== 1 ? "s" : ""} encontrado
           {total !== 1 ? "s" : ""}
         </p>
       )}
@@ -352,19 +417,10 @@ export default function Search() {
         ))}
       </div>
 
-      {pages > 1 && (
+      {!loading && next && (
         <div className="pagination">
-          <button disabled={page <= 1} onClick={() => doSearch(query, page - 1)}>
-            ← Anterior
-          </button>
-          <span>
-            Página {page} de {pages}
-          </span>
-          <button
-            disabled={page >= pages}
-            onClick={() => doSearch(query, page + 1)}
-          >
-            Próxima →
+          <button disabled={loadingMore} onClick={loadMore}>
+            {loadingMore ? "Carregando…" : "Mais resultados"}
           </button>
         </div>
       )}
@@ -2,6 +2,15 @@ function stripAccents(s) {
   return s.normalize("NFD").replace(/\p{Mn}/gu, "");
 }
 
+// Terms to highlight from a search query: drops -excluded terms, field: prefixes,
+// quotes and trailing * so they match what the server searched for.
+export function queryTerms(q) {
+  return (q.match(/-?(\w+:)?("[^"]*"?|\S+)/g) || [])
+    .filter((t) => !t.startsWith("-"))
+    .map((t) => t.replace(/^\w+:/, "").replace(/["*]/g, "").trim())
+    .filter(Boolean);
+}
+
 export function highlightText(text, words) {
   if (!words || !words.length || !text) return text;
   // Build patterns that match base chars optionally followed by combining diacritic marks,
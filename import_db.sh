@@ -1 +1,9 @@
-scp phoenix.elmartus.mooo.com:workspace/irdin/db.sqlite3 .
+#!/bin/bash
+set -eo pipefail
+
+# Pull the rows changed on phoenix since the last pull, instead of the whole db.sqlite3.
+MARK=.sync_mark_phoenix
+SINCE=$(cat "$MARK" 2>/dev/null || true)
+
+ssh -C phoenix.elmartus.mooo.com "cd ~/workspace/irdin && uv run python manage.py sync_export - ${SINCE:+--since $SINCE}" \
+    | uv run python manage.py sync_import - --mark-file "$MARK"
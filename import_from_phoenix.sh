@@ -1,6 +1,14 @@
 #!/bin/bash
 set -e
 
-ssh phoenix.elmartus.mooo.com 'cd ~/workspace/irdin && uv run python manage.py export_transcriptions'
-scp -P 2200 phoenix.elmartus.mooo.com:~/workspace/irdin/transcriptions_export.json .
-uv run python manage.py import_transcriptions transcriptions_export.json
+# Only transcriptions made since the last successful import are transferred.
+# The high-water mark is the remote clock, which also stamps transcribed_on.
+# A track transcribed here is only replaced by a newer remote transcription.
+SINCE_FILE=.transcriptions_since
+SINCE=$(cat "$SINCE_FILE" 2>/dev/null || true)
+NOW=$(ssh phoenix.elmartus.mooo.com 'date -u +%Y-%m-%dT%H:%M:%S')
+
+ssh phoenix.elmartus.mooo.com "cd ~/workspace/irdin && uv run python manage.py export_transcriptions transcriptions_export.jsonl.gz ${SINCE:+--since $SINCE}"
+scp -P 2200 phoenix.elmartus.mooo.com:~/workspace/irdin/transcriptions_export.jsonl.gz .
+uv run python manage.py import_transcriptions transcriptions_export.jsonl.gz ${SINCE:+--newer}
+echo "$NOW" > "$SINCE_FILE"
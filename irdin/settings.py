@@ -10,6 +10,7 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/6.0/ref/settings/
 """
 
+import os
 from pathlib import Path
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
@@ -73,12 +74,73 @@ WSGI_APPLICATION = 'irdin.wsgi.application'
 # Database
 # https://docs.djangoproject.com/en/6.0/ref/settings/#databases
 
+# WAL lets API reads run while transcribe/scrape_products write; the other
+# pragmas trade a little durability on power loss for fewer fsyncs and keep
+# hot pages in memory. Run on every new connection.
+SQLITE_PRAGMAS = (
+    'PRAGMA journal_mode=WAL;'
+    'PRAGMA synchronous=NORMAL;'
+    'PRAGMA mmap_size=268435456;'  # 256 MB
+    'PRAGMA cache_size=-65536;'    # 64 MB
+    'PRAGMA temp_store=MEMORY;'
+)
+
 DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
         'NAME': BASE_DIR / 'db.sqlite3',
         'OPTIONS': {
             'timeout': 30,  # seconds to wait for lock before raising OperationalError
+            'transaction_mode': 'IMMEDIATE',  # take the write lock up front instead of failing to upgrade
+            'init_command': SQLITE_PRAGMAS,
+        },
+        'CONN_MAX_AGE': 600,
+        'CONN_HEALTH_CHECKS': True,
+    },
+    # Read-only connections for the public API (see palestras.routers), so
+    # reads never wait on a batch writer's lock.
+    'readonly': {
+        'ENGINE': 'django.db.backends.sqlite3',
+        'NAME': f"file:{BASE_DIR / 'db.sqlite3'}?mode=ro",
+        'OPTIONS': {
+            'timeout': 30,
+            'init_command': SQLITE_PRAGMAS.replace('PRAGMA journal_mode=WAL;', ''),
+        },
+        'CONN_MAX_AGE': 600,
+        'CONN_HEALTH_CHECKS': True,
+        'TEST': {'MIRROR': 'default'},
+    },
+}
+
+# PostgreSQL instead, when POSTGRES_DB is set (needs the 'postgres' extra).
+# Search then uses the tsvector and trigram indexes from migration 0015.
+if os.environ.get('POSTGRES_DB'):
+    DATABASES = {
+        'default': {
+            'ENGINE': 'django.db.backends.postgresql',
+            'NAME': os.environ['POSTGRES_DB'],
+            'USER': os.environ.get('POSTGRES_USER', ''),
+            'PASSWORD': os.environ.get('POSTGRES_PASSWORD', ''),
+            'HOST': os.environ.get('POSTGRES_HOST', ''),
+            'PORT': os.environ.get('POSTGRES_PORT', ''),
+            'CONN_MAX_AGE': 600,
+            'CONN_HEALTH_CHECKS': True,
+        },
+    }
+
+DATABASE_ROUTERS = ['palestras.routers.ReadOnlyRouter']
+
+
+# Cache
+# File-based so that writes from management commands invalidate what the web
+# process serves.
+
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        'LOCATION': BASE_DIR / 'cache',
+        'OPTIONS': {
+            'MAX_ENTRIES': 20000,
         },
     }
 }
@@ -22,14 +22,20 @@ from django.conf import settings
 from django.contrib import admin
 from django.http import FileResponse, Http404, HttpResponse, StreamingHttpResponse
 from django.urls import path, re_path
+from django.views.decorators.gzip import gzip_page
 
-from palestras.views import authors_list, categories_list, languages_list, palestra_detail, palestra_page, search
-
-FRONTEND_INDEX = settings.BASE_DIR / "static" / "frontend" / "index.html"
+from palestras.frontend import shell
+from palestras.views import authors_list, categories_list, languages_list, palestra_detail, palestra_page, palestra_search, search, suggest
 
 
+@gzip_page
 def serve_frontend(request):
-    return FileResponse(open(FRONTEND_INDEX, "rb"), content_type="text/html")
+    return HttpResponse(shell.document(), content_type="text/html")
+
+
+# Renditions from the transcode command; .ts would otherwise guess as a Qt translation file
+mimetypes.add_type("video/mp2t", ".ts")
+mimetypes.add_type("audio/ogg", ".opus")
 
 
 def serve_media(request, path):
@@ -67,7 +73,9 @@ urlpatterns = [
     path('api/languages', languages_list),
     path('api/categories', categories_list),
     path('api/search', search),
+    path('api/suggest', suggest),
     path('api/palestras/<slug:slug>', palestra_detail),
+    path('api/palestras/<slug:slug>/search', palestra_search),
 ]
 
 if settings.DEBUG:
@@ -1,7 +1,10 @@
 from django.contrib import admin
+from django.db.models import Count
+from django.utils import timezone
 
 from .audio_download import download_tracks, missing_on_disk
-from .models import AudioTrack, Author, Palestra
+from .caching import bump_data_version
+from .models import AudioTrack, Author, Category, Language, Palestra, Transcript
 
 
 class AudioDownloadedFilter(admin.SimpleListFilter):
@@ -53,21 +56,24 @@ class AudioTranscribedFilter(admin.SimpleListFilter):
 class AudioTrackInline(admin.TabularInline):
     model = AudioTrack
     extra = 0
-    readonly_fields = ("name", "local_path", "transcription", "transcribed_on")
+    readonly_fields = ("name", "local_path", "transcript", "transcribed_on")
 
 
 @admin.register(Palestra)
 class PalestraAdmin(admin.ModelAdmin):
     list_display = ("title", "slug", "scraped_on", "track_count", "categories")
-    list_filter = ("scraped_on", "language", "categories", "media_format", AudioDownloadedFilter, AudioTranscribedFilter)
+    list_filter = ("scraped_on", "languages", "category_terms", "media_format", AudioDownloadedFilter, AudioTranscribedFilter)
     search_fields = ("title", "slug", "sku", "description")
-    filter_horizontal = ("authors",)
+    filter_horizontal = ("authors", "languages", "category_terms")
     inlines = [AudioTrackInline]
     actions = ["download_audios"]
 
-    @admin.display(description="Tracks")
+    def get_queryset(self, request):
+        return super().get_queryset(request).annotate(track_count=Count("tracks", distinct=True))
+
+    @admin.display(description="Tracks", ordering="track_count")
     def track_count(self, obj):
-        return obj.tracks.count()
+        return obj.track_count
 
     @admin.action(description="Download audio files")
     def download_audios(self, request, queryset):
@@ -109,10 +115,25 @@ class AudioTrackAdmin(admin.ModelAdmin):
 
     @admin.action(description="Clear transcription")
     def clear_transcription(self, request, queryset):
-        count = queryset.exclude(transcribed_on=None).update(
-            transcription="",
-            transcription_timecoded="",
+        tracks = queryset.exclude(transcribed_on=None)
+        transcript_ids = set(tracks.exclude(transcript=None).values_list("transcript_id", flat=True))
+        count = tracks.update(
+            transcript=None,
             transcription_method="",
             transcribed_on=None,
+            updated_on=timezone.now(),
         )
+        # Transcripts are shared by tracks with the same audio; keep those still in use
+        Transcript.objects.filter(id__in=transcript_ids, tracks=None).delete()
+        bump_data_version()
         self.message_user(request, f"Cleared transcription for {count} track(s).")
+
+
+@admin.register(Language)
+class LanguageAdmin(admin.ModelAdmin):
+    search_fields = ("name",)
+
+
+@admin.register(Category)
+class CategoryAdmin(admin.ModelAdmin):
+    search_fields = ("name",)
@@ -6,3 +6,4 @@ class PalestrasConfig(AppConfig):
 
     def ready(self):
         from . import db_functions  # noqa — registers UNACCENT and custom lookup
+        from . import caching  # noqa — bumps the data version on writes
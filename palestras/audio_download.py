@@ -1,3 +1,14 @@
+"""
+Audio downloads, deduplicated by content.
+
+Every downloaded file gets its sha256, and the ETag and size the server
+sent with it. A track whose URL answers with the ETag and size already on
+record for that URL is not downloaded again (ETags only identify content
+within one resource). A download whose hash matches a file we
+already have is dropped, and the track points at the existing file. Either
+way each distinct audio is stored, and later transcribed, once.
+"""
+import hashlib
 from pathlib import Path
 
 import httpx
@@ -6,6 +17,35 @@ from django.conf import settings
 from .models import AudioTrack
 
 AUDIOS_DIR = Path(settings.MEDIA_ROOT) / "audios"
+CHUNK = 65536
+
+
+def file_sha256(path):
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def _known_copy(**lookup):
+    """A downloaded track with the same content, whose file is still on disk."""
+    for track in AudioTrack.objects.filter(**lookup).exclude(local_path=None).exclude(local_path=""):
+        if (AUDIOS_DIR / Path(track.local_path.name).name).exists():
+            return track
+    return None
+
+
+def _share(track, source):
+    track.local_path = source.local_path.name
+    track.audio_sha256 = source.audio_sha256
+    track.audio_etag = track.audio_etag or source.audio_etag
+    track.audio_size = source.audio_size
+    if track.transcript_id is None and source.transcript_id:
+        track.transcript_id = source.transcript_id
+        track.transcription_method = source.transcription_method
+        track.transcribed_on = source.transcribed_on
+    track.save()
 
 
 def pending_tracks(queryset=None):
@@ -48,6 +88,8 @@ def download_tracks(tracks, on_progress=None, delay=0):
 
             if dest.exists():
                 track.local_path = f"audios/{filename}"
+                track.audio_sha256 = track.audio_sha256 or file_sha256(dest)
+                track.audio_size = dest.stat().st_size
                 track.save()
                 downloaded += 1
                 if on_progress:
@@ -59,15 +101,34 @@ def download_tracks(tracks, on_progress=None, delay=0):
             try:
                 with client.stream("GET", track.mp3_url) as resp:
                     resp.raise_for_status()
-                    with open(tmp, "wb") as f:
-                        for chunk in resp.iter_bytes(chunk_size=65536):
-                            f.write(chunk)
-                tmp.rename(dest)
-                track.local_path = f"audios/{filename}"
-                track.save()
+                    track.audio_etag = resp.headers.get("etag", "")
+                    size = resp.headers.get("content-length")
+                    source = None
+                    if track.audio_etag and size:
+                        # Already have this URL at this ETag and size: leave the body unread
+                        source = _known_copy(
+                            mp3_url=track.mp3_url, audio_etag=track.audio_etag, audio_size=int(size)
+                        )
+                    if source is None:
+                        digest = hashlib.sha256()
+                        with open(tmp, "wb") as f:
+                            for chunk in resp.iter_bytes(chunk_size=CHUNK):
+                                digest.update(chunk)
+                                f.write(chunk)
+                        source = _known_copy(audio_sha256=digest.hexdigest())
+                if source is None:
+                    tmp.rename(dest)
+                    track.local_path = f"audios/{filename}"
+                    track.audio_sha256 = digest.hexdigest()
+                    track.audio_size = dest.stat().st_size
+                    track.save()
+                else:
+                    tmp.unlink(missing_ok=True)
+                    _share(track, source)
+                    filename = Path(source.local_path.name).name
                 downloaded += 1
                 if on_progress:
-                    on_progress(track, filename, dest.stat().st_size, None)
+                    on_progress(track, filename, (AUDIOS_DIR / filename).stat().st_size, None)
             except httpx.HTTPError as e:
                 error = e
                 errors += 1
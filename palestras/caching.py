@@ -0,0 +1,228 @@
+import hashlib
+import logging
+import threading
+import time
+import zlib
+from functools import wraps
+
+import brotli
+from django.core.cache import cache
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import connections
+from django.db.models.signals import m2m_changed, post_delete, post_save
+from django.http import HttpResponse, StreamingHttpResponse
+from django.http.response import HttpResponseBase
+from django.utils.cache import get_conditional_response, patch_vary_headers
+from django.utils.http import http_date
+
+from .models import AudioTrack, Author, Category, Language, Palestra, RelatedPalestra, Transcript
+from .routers import read_only
+
+logger = logging.getLogger(__name__)
+
+DATA_VERSION_KEY = "palestras:data_version"
+RESPONSE_TTL = 24 * 3600  # stale versions age out; a bump already makes them unreachable
+
+ENCODINGS = ("br", "gzip")   # server preference
+COMPRESS_MIN_BYTES = 1024    # not worth a Content-Encoding below this
+CHUNK_CHARS = 65536          # JSON buffered per compressor call
+
+
+def data_version():
+    """Return (token, timestamp) of the last write to the palestras data."""
+    version = cache.get(DATA_VERSION_KEY)
+    if version is None:
+        cache.add(DATA_VERSION_KEY, _new_version(), timeout=None)
+        version = cache.get(DATA_VERSION_KEY)
+    return version
+
+
+def _new_version():
+    now = time.time_ns()
+    return f"{now:x}", now / 1e9
+
+
+def bump_data_version(**kwargs):
+    """Mark every cached response as stale. Call after writes that skip model signals."""
+    cache.set(DATA_VERSION_KEY, _new_version(), timeout=None)
+
+
+class VersionedIndex:
+    """
+    An in-memory structure derived from the data, rebuilt off the request path.
+
+    get() returns the last built value at once (None until the first build
+    ends). When the data version has moved on, one background thread calls
+    build(previous value) and swaps the result in, so requests keep being
+    served from the old value meanwhile.
+    """
+
+    def __init__(self, build):
+        self.build = build
+        self.value = None
+        self.version = None
+        self._building = False
+        self._lock = threading.Lock()
+
+    def get(self):
+        version = data_version()[0]
+        if version != self.version:
+            with self._lock:
+                start = version != self.version and not self._building
+                self._building = self._building or start
+            if start:
+                threading.Thread(target=self._refresh_in_background, args=(version,), daemon=True).start()
+        return self.value
+
+    def refresh(self, version=None):
+        """Build the value for version (default: the current one) in this thread."""
+        version = version or data_version()[0]
+        with read_only():
+            self.value = self.build(self.value)
+        self.version = version
+        return self.value
+
+    def _refresh_in_background(self, version):
+        try:
+            self.refresh(version)
+        except Exception:
+            logger.exception("Rebuilding the %s index failed", self.build.__module__)
+        finally:
+            self._building = False
+            connections.close_all()  # this thread's connections only
+
+
+def versioned_key(name):
+    return f"palestras:{name}:{data_version()[0]}"
+
+
+def _normalized_params(request):
+    return sorted((k, sorted(v)) for k, v in request.GET.lists())
+
+
+def _accepted_encoding(request):
+    """The client's most wanted coding we offer (server preference breaks ties); q=0 refuses one."""
+    weights = {}
+    for part in request.headers.get("Accept-Encoding", "").split(","):
+        coding, *params = (piece.strip() for piece in part.split(";"))
+        q = 1.0
+        for param in params:
+            name, _, value = param.partition("=")
+            if name.strip().lower() == "q":
+                try:
+                    q = float(value)
+                except ValueError:
+                    q = 0.0
+        if coding:
+            weights[coding.lower()] = q
+    wildcard = weights.get("*", 0.0)
+    offered = [(weights.get(encoding, wildcard), encoding) for encoding in ENCODINGS]
+    q, encoding = max(offered, key=lambda item: item[0], default=(0.0, None))
+    return encoding if q > 0 else "identity"
+
+
+def encode_json(data):
+    """
+    Serialise data into response bodies, {encoding: bytes}.
+
+    The JSON is produced chunk by chunk and fed straight into the gzip and
+    brotli compressors, so large payloads never exist as one uncompressed
+    string. Payloads under COMPRESS_MIN_BYTES are kept as plain JSON.
+    """
+    chunks = DjangoJSONEncoder().iterencode(data)
+    buffer, buffered = [], 0
+    for chunk in chunks:
+        buffer.append(chunk)
+        buffered += len(chunk)
+        if buffered >= COMPRESS_MIN_BYTES:
+            break
+    else:
+        return {"identity": "".join(buffer).encode()}
+
+    gzip = zlib.compressobj(6, zlib.DEFLATED, 31)
+    br = brotli.Compressor(quality=5)
+    gzip_parts, br_parts = [], []
+    for chunk in chunks:
+        buffer.append(chunk)
+        buffered += len(chunk)
+        if buffered >= CHUNK_CHARS:
+            block = "".join(buffer).encode()
+            gzip_parts.append(gzip.compress(block))
+            br_parts.append(br.process(block))
+            buffer, buffered = [], 0
+    block = "".join(buffer).encode()
+    gzip_parts += [gzip.compress(block), gzip.flush()]
+    br_parts += [br.process(block), br.finish()]
+    return {"gzip": b"".join(gzip_parts), "br": b"".join(br_parts)}
+
+
+def _gunzip_chunks(body, size=65536):
+    decompressor = zlib.decompressobj(31)
+    for start in range(0, len(body), size):
+        yield decompressor.decompress(body[start:start + size])
+    yield decompressor.flush()
+
+
+def _build_response(status, bodies, encoding):
+    if "identity" in bodies:
+        response = HttpResponse(bodies["identity"], content_type="application/json", status=status)
+    elif encoding in bodies:
+        response = HttpResponse(bodies[encoding], content_type="application/json", status=status)
+        response["Content-Encoding"] = encoding
+    else:
+        # Rare client without gzip support: inflate the stored body as it goes out
+        response = StreamingHttpResponse(
+            _gunzip_chunks(bodies["gzip"]), content_type="application/json", status=status
+        )
+    patch_vary_headers(response, ("Accept-Encoding",))
+    return response
+
+
+def cached_api(view):
+    """
+    Serve a JSON view from the response cache, keyed by data version, path and
+    normalised query parameters, with a strong ETag and Last-Modified so
+    clients can revalidate with a 304.
+
+    The view returns the data to serialise (or an HttpResponse, for errors);
+    bodies are cached already compressed and picked by Accept-Encoding. The
+    view's reads go to the read-only database.
+    """
+    @wraps(view)
+    def wrapper(request, *args, **kwargs):
+        token, modified = data_version()
+        digest = hashlib.sha1(
+            repr((token, request.path, _normalized_params(request))).encode()
+        ).hexdigest()
+        encoding = _accepted_encoding(request)
+        etag = f'"{digest}-{encoding}"'
+
+        response = get_conditional_response(request, etag=etag, last_modified=int(modified))
+        if response is None:
+            key = f"palestras:api:{digest}"
+            cached = cache.get(key)
+            if cached is None:
+                with read_only():
+                    result = view(request, *args, **kwargs)
+                if isinstance(result, HttpResponseBase):
+                    if result.status_code != 404:
+                        return result
+                    cached = (result.status_code, {"identity": result.content})
+                else:
+                    cached = (200, encode_json(result))
+                cache.set(key, cached, RESPONSE_TTL)
+            response = _build_response(*cached, encoding)
+
+        response["ETag"] = etag
+        response["Last-Modified"] = http_date(modified)
+        response["Cache-Control"] = "no-cache"  # always revalidate; revalidation is a 304
+        return response
+
+    return wrapper
+
+
+for _model in (Palestra, Author, AudioTrack, Transcript, Language, Category, RelatedPalestra):
+    post_save.connect(bump_data_version, sender=_model, dispatch_uid=f"data_version_save_{_model.__name__}")
+    post_delete.connect(bump_data_version, sender=_model, dispatch_uid=f"data_version_delete_{_model.__name__}")
+for _field in ("authors", "languages", "category_terms"):
+    m2m_changed.connect(bump_data_version, sender=getattr(Palestra, _field).through, dispatch_uid=f"data_version_{_field}")
@@ -0,0 +1,169 @@
+"""
+Compressed storage for the large transcript columns.
+
+A value is a short header (codec, dictionary id) followed by a zlib stream,
+or a zstandard one with the `zstd` extra installed, compressed against a
+shared dictionary trained from the stored transcripts by
+`train_compression_dictionary`. Dictionaries are rows of the
+CompressionDictionary table, so every copy of the database can decode its
+own values, and each value keeps the id of the dictionary it was written
+with: training a new one never invalidates old rows.
+
+CompressedTextField keeps the stored bytes as loaded and decodes them on
+first attribute access, so rows read for their other columns never pay for
+decompression. values()/values_list() return the raw bytes; pass them to
+decompress().
+"""
+import struct
+import zlib
+from collections import Counter
+
+from django.core.exceptions import ImproperlyConfigured
+from django.db import models
+from django.db.models.query_utils import DeferredAttribute
+
+ZLIB, ZSTD = 1, 2
+CODECS = {ZLIB: "zlib", ZSTD: "zstd"}
+HEADER = struct.Struct(">BI")  # codec, dictionary id (0: no dictionary)
+ZLIB_LEVEL = 9
+ZSTD_LEVEL = 19
+ZLIB_DICT_SIZE = 32 * 1024     # zlib never looks further back than its window
+ZSTD_DICT_SIZE = 112 * 1024
+
+_dictionaries = {}    # id -> CompressionDictionary, immutable once written
+_current = []         # [CompressionDictionary or None] once looked up
+
+
+def _zstandard():
+    try:
+        import zstandard
+    except ImportError:
+        raise ImproperlyConfigured("zstd-compressed values need the 'zstd' extra (zstandard)")
+    return zstandard
+
+
+def zstd_available():
+    try:
+        _zstandard()
+    except ImproperlyConfigured:
+        return False
+    return True
+
+
+def _dictionary(dict_id):
+    if dict_id not in _dictionaries:
+        from .models import CompressionDictionary
+
+        _dictionaries[dict_id] = CompressionDictionary.objects.get(id=dict_id)
+    return _dictionaries[dict_id]
+
+
+def current_dictionary():
+    """The newest dictionary this process can compress with, or None."""
+    if not _current:
+        from .models import CompressionDictionary
+
+        qs = CompressionDictionary.objects.order_by("-id")
+        if not zstd_available():
+            qs = qs.filter(codec=ZLIB)
+        _current.append(qs.first())
+    return _current[0]
+
+
+def reset():
+    """Forget the cached current dictionary, e.g. after training a new one."""
+    _current.clear()
+
+
+def compress(text):
+    if not text:
+        return b""
+    data = text.encode("utf-8")
+    dictionary = current_dictionary()
+    if dictionary is None:
+        return HEADER.pack(ZLIB, 0) + zlib.compress(data, ZLIB_LEVEL)
+    if dictionary.codec == ZSTD:
+        zstandard = _zstandard()
+        compressor = zstandard.ZstdCompressor(
+            level=ZSTD_LEVEL, dict_data=zstandard.ZstdCompressionDict(bytes(dictionary.data))
+        )
+        return HEADER.pack(ZSTD, dictionary.id) + compressor.compress(data)
+    compressor = zlib.compressobj(ZLIB_LEVEL, zdict=bytes(dictionary.data))
+    return HEADER.pack(ZLIB, dictionary.id) + compressor.compress(data) + compressor.flush()
+
+
+def decompress(value):
+    value = bytes(value)
+    if not value:
+        return ""
+    codec, dict_id = HEADER.unpack_from(value)
+    payload = value[HEADER.size:]
+    zdict = bytes(_dictionary(dict_id).data) if dict_id else None
+    if codec == ZSTD:
+        zstandard = _zstandard()
+        decompressor = zstandard.ZstdDecompressor(dict_data=zstandard.ZstdCompressionDict(zdict) if zdict else None)
+        return decompressor.decompress(payload).decode("utf-8")
+    decompressor = zlib.decompressobj(zdict=zdict) if zdict else zlib.decompressobj()
+    return (decompressor.decompress(payload) + decompressor.flush()).decode("utf-8")
+
+
+def train(samples, codec):
+    """Build a dictionary for codec from sample texts."""
+    if codec == ZSTD:
+        data = [s.encode("utf-8") for s in samples if s]
+        return _zstandard().train_dictionary(ZSTD_DICT_SIZE, data).as_bytes()
+    # zlib has no trainer: take the word n-grams that would save the most bytes,
+    # the most valuable last, where they sit closest to the compressed data.
+    counts = Counter()
+    for sample in samples:
+        words = sample.split(" ")
+        for n in (1, 2, 3):
+            counts.update(" ".join(words[i:i + n]) for i in range(len(words) - n + 1))
+    picked, size = [], 0
+    for gram, count in sorted(counts.items(), key=lambda kv: kv[1] * len(kv[0]), reverse=True):
+        if count < 2 or len(gram) < 4:
+            continue
+        encoded = gram.encode("utf-8") + b" "
+        if size + len(encoded) > ZLIB_DICT_SIZE:
+            break
+        picked.append(encoded)
+        size += len(encoded)
+    return b"".join(reversed(picked))
+
+
+class CompressedText(DeferredAttribute):
+    """Decode the stored bytes on first access and keep the text on the instance."""
+
+    def __get__(self, instance, cls=None):
+        if instance is None:
+            return self
+        value = super().__get__(instance, cls)
+        if isinstance(value, (bytes, memoryview)):
+            value = decompress(value)
+            instance.__dict__[self.field.attname] = value
+        return value
+
+    def __set__(self, instance, value):
+        # A data descriptor, so reads of a loaded value still go through __get__
+        instance.__dict__[self.field.attname] = value
+
+
+class CompressedTextField(models.BinaryField):
+    """Text stored compressed; reads as str, and "" filters match empty values."""
+
+    descriptor_class = CompressedText
+
+    def pre_save(self, model_instance, add):
+        # Bytes that were never decoded go back as they are
+        return model_instance.__dict__.get(self.attname)
+
+    def get_prep_value(self, value):
+        if isinstance(value, str):
+            value = compress(value)
+        return super().get_prep_value(value)
+
+    def to_python(self, value):
+        return value
+
+    def value_to_string(self, obj):
+        return self.value_from_object(obj)
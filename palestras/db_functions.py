@@ -30,6 +30,12 @@ class UnaccentIContains(Lookup):
         rhs = strip_accents(self.rhs)
         return f"UNACCENT({lhs}) LIKE %s", lhs_params + (f'%{rhs}%',)
 
+    def as_postgresql(self, compiler, connection):
+        # Same expression as the trigram indexes created by search_index.install_postgres
+        lhs, lhs_params = self.process_lhs(compiler, connection)
+        rhs = strip_accents(self.rhs)
+        return f"lower(f_unaccent({lhs})) LIKE %s", tuple(lhs_params) + (f'%{rhs}%',)
+
 
 for _field_class in (CharField, TextField):
     _field_class.register_lookup(UnaccentIContains)
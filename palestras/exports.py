@@ -0,0 +1,99 @@
+"""
+Transcription exchange files, as written by export_transcriptions.
+
+An export is JSON Lines, one track per line, compressed according to the
+file suffix: .gz with gzip, .zst with zstandard (the `zstd` extra), anything
+else plain. "-" is stdout/stdin. Older exports that hold a single JSON array
+are still read.
+"""
+import gzip
+import json
+import sys
+from contextlib import nullcontext
+from datetime import datetime, timezone
+
+from django.core.exceptions import ImproperlyConfigured
+
+GZIP_LEVEL = 6
+ZSTD_LEVEL = 10
+READ_CHUNK = 64 * 1024
+
+
+def _zstandard():
+    try:
+        import zstandard
+    except ImportError:
+        raise ImproperlyConfigured(".zst exports need the 'zstd' extra (zstandard)")
+    return zstandard
+
+
+def open_export(path, mode="r"):
+    """Open an export for reading ("r") or writing ("w"), compressed by suffix; text unless mode has "b"."""
+    binary = "b" in mode
+    encoding = None if binary else "utf-8"
+    if path == "-":
+        stream = sys.stdin if mode.startswith("r") else sys.stdout
+        return nullcontext(stream.buffer if binary else stream)
+    mode = mode if binary else mode + "t"
+    if path.endswith(".gz"):
+        return gzip.open(path, mode, encoding=encoding, compresslevel=GZIP_LEVEL)
+    if path.endswith(".zst"):
+        zstandard = _zstandard()
+        if mode.startswith("w"):
+            return zstandard.open(path, mode, cctx=zstandard.ZstdCompressor(level=ZSTD_LEVEL), encoding=encoding)
+        return zstandard.open(path, mode, encoding=encoding)
+    return open(path, mode, encoding=encoding)
+
+
+def parse_timestamp(value):
+    """Parse an exported ISO timestamp; naive ones are UTC."""
+    if not value:
+        return None
+    parsed = datetime.fromisoformat(value)
+    return parsed if parsed.tzinfo else parsed.replace(tzinfo=timezone.utc)
+
+
+def write_record(f, record):
+    f.write(json.dumps(record, ensure_ascii=False))
+    f.write("\n")
+
+
+def read_records(f):
+    """Yield the records of an open export, JSON Lines or a legacy JSON array."""
+    head = f.read(1)
+    while head.isspace():
+        head = f.read(1)
+    if head == "[":
+        yield from _array_items(f)
+        return
+    first = head + f.readline()
+    if first.strip():
+        yield json.loads(first)
+    for line in f:
+        if line.strip():
+            yield json.loads(line)
+
+
+def _array_items(f):
+    """Yield the items of a JSON array whose opening bracket was already read, a chunk at a time."""
+    decoder = json.JSONDecoder()
+    buffer, pos, eof = "", 0, False
+    while True:
+        while pos < len(buffer) and (buffer[pos].isspace() or buffer[pos] == ","):
+            pos += 1
+        if buffer[pos:pos + 1] == "]":
+            return
+        try:
+            item, end = decoder.raw_decode(buffer, pos)
+        except json.JSONDecodeError:
+            if eof:
+                raise
+            end = None
+        # an item reaching the end of the buffer may go on in the next chunk
+        if end is None or (end == len(buffer) and not eof):
+            chunk = f.read(READ_CHUNK)
+            eof = not chunk
+            buffer, pos = buffer[pos:] + chunk, 0
+            continue
+        yield item
+        pos = end
@@ -0,0 +1,56 @@
+from django.core.cache import cache
+from django.db.models import Count, Exists, OuterRef
+
+from .caching import versioned_key
+from .models import Author, Category, Language, Palestra
+
+# facet name -> (model, field on Palestra, through-table column, key returned to clients)
+FACETS = {
+    "languages": (Language, "languages", "language", "name"),
+    "categories": (Category, "category_terms", "category", "name"),
+    "authors": (Author, "authors", "author", "slug"),
+}
+
+
+def split_csv(value):
+    return [item.strip() for item in value.split(",") if item.strip()] if value else []
+
+
+def facet_map():
+    """Languages, categories and authors with palestra counts, cached until the next write."""
+    key = versioned_key("facets")
+    facets = cache.get(key)
+    if facets is None:
+        facets = {}
+        for name, (model, _, _, client_key) in FACETS.items():
+            fields = ("name", "count") if client_key == "name" else ("name", client_key, "count")
+            facets[name] = list(
+                model.objects.annotate(count=Count("palestra")).filter(count__gt=0)
+                .order_by("name").values(*fields)
+            )
+        cache.set(key, facets, timeout=24 * 3600)
+    return facets
+
+
+def filter_by(queryset, name, selected):
+    """Restrict queryset to palestras tagged with any of the selected facet values."""
+    model, field, column, key = FACETS[name]
+    through = getattr(Palestra, field).through
+    return queryset.filter(
+        Exists(through.objects.filter(palestra_id=OuterRef("pk"), **{f"{column}__{key}__in": selected}))
+    )
+
+
+def facet_counts(queryset, limit=None):
+    """Facet counts restricted to the palestras in queryset, or to its first limit palestras by id."""
+    ids = queryset.order_by("id").values("id")[:limit] if limit else queryset.order_by().values("id")
+    counts = {}
+    for name, (model, field, column, key) in FACETS.items():
+        through = getattr(Palestra, field).through
+        counts[name] = dict(
+            through.objects.filter(palestra_id__in=ids)
+            .values_list(f"{column}__{key}")
+            .annotate(n=Count("palestra_id", distinct=True))
+            .order_by(f"{column}__{key}")
+        )
+    return counts
@@ -0,0 +1,79 @@
+import threading
+
+from django.conf import settings
+from django.utils.html import escape
+
+FRONTEND_INDEX = settings.BASE_DIR / "static" / "frontend" / "index.html"
+
+
+class FrontendShell:
+    """
+    The built index.html, held in memory and split around </head> so tags can
+    be spliced into the head without rescanning the document. Reloaded when
+    the file's mtime changes (i.e. after a frontend build).
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.mtime = None
+        self.html = self.head = self.tail = b""
+        self._lock = threading.Lock()
+
+    def _refresh(self):
+        mtime = self.path.stat().st_mtime_ns
+        if mtime != self.mtime:
+            with self._lock:
+                if mtime != self.mtime:
+                    html = self.path.read_bytes()
+                    split = html.find(b"</head>")
+                    if split == -1:
+                        split = len(html)
+                    self.html, self.head, self.tail = html, html[:split], html[split:]
+                    self.mtime = mtime
+
+    def version(self):
+        """Identifies the current file contents; changes after a frontend build."""
+        self._refresh()
+        return self.mtime
+
+    def document(self):
+        self._refresh()
+        return self.html
+
+    def render(self, head_tags):
+        """Return the document with head_tags (bytes) inserted before </head>."""
+        self._refresh()
+        return b"".join((self.head, head_tags, b"\n  ", self.tail))
+
+
+shell = FrontendShell(FRONTEND_INDEX)
+
+
+def og_tags(palestra, url):
+    """Open Graph meta tags for a palestra, for link previews."""
+    author_names = ", ".join(a.name for a in palestra.authors.all())
+    og_title = f"{author_names} - {palestra.title}" if author_names else palestra.title
+    description = palestra.description[:200].strip() if palestra.description else ""
+
+    return f"""
+    <meta property="og:type" content="website" />
+    <meta property="og:title" content="{escape(og_title)}" />
+    <meta property="og:description" content="{escape(description)}" />
+    <meta property="og:url" content="{escape(url)}" />"""
+
+
+def transcript_excerpt(palestra, max_len=1500):
+    """Server-rendered body content for crawlers: title, description and the start of a transcript."""
+    parts = [f"<h1>{escape(palestra.title)}</h1>"]
+    for line in (palestra.description or "").splitlines():
+        if line.strip():
+            parts.append(f"<p>{escape(line.strip())}</p>")
+    for track in palestra.tracks.all():
+        if track.transcript and track.transcript.text:
+            text = track.transcript.text[:max_len]
+            if len(track.transcript.text) > max_len:
+                text = text.rsplit(" ", 1)[0] + "…"
+            parts.append(f"<h2>{escape(track.name)}</h2>")
+            parts.append(f"<p>{escape(text)}</p>")
+            break
+    return "<article>" + "".join(parts) + "</article>"
@@ -0,0 +1,142 @@
+"""
+Typo-tolerant term expansion for fuzzy search.
+
+The vocabulary is every term of the full-text indexes (read from their
+fts5vocab tables on SQLite, already folded by the FTS tokenizer, or ts_stat
+on PostgreSQL) plus the words of author names. A trigram index over it finds the words that share most
+trigrams with a query term, and a bounded edit distance keeps the close
+ones. After a data version bump a background thread rereads the
+vocabulary and adds or drops only the terms that appeared or vanished, on a
+copy of the index that replaces the one requests use when it is ready.
+"""
+from array import array
+from collections import Counter
+
+from . import search_index
+from .caching import VersionedIndex
+from .db_functions import strip_accents
+from .models import Author
+from .routers import read_connection
+
+MIN_LENGTH = 3        # shorter terms are not expanded
+MAX_EXPANSIONS = 5
+CANDIDATES = 64       # words ranked by shared trigrams before computing edit distance
+
+
+def max_distance(term):
+    return 1 if len(term) <= 5 else 2
+
+
+def trigrams(word):
+    padded = f"  {word} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+def edit_distance(a, b, limit):
+    """Optimal string alignment distance, or limit + 1 once it is known to exceed limit."""
+    if abs(len(a) - len(b)) > limit:
+        return limit + 1
+    prev2, prev = None, list(range(len(b) + 1))
+    for i, ca in enumerate(a, 1):
+        row = [i] + [0] * len(b)
+        for j, cb in enumerate(b, 1):
+            row[j] = min(prev[j] + 1, row[j - 1] + 1, prev[j - 1] + (ca != cb))
+            if prev2 is not None and i > 1 and j > 1 and ca == b[j - 2] and a[i - 2] == cb:
+                row[j] = min(row[j], prev2[j - 2] + 1)
+        if min(row) > limit:
+            return limit + 1
+        prev2, prev = prev, row
+    return prev[-1]
+
+
+def _vocabulary():
+    """Return {term: document frequency} over the search indexes and author names."""
+    terms = Counter()
+    connection = read_connection()
+    if connection.vendor == "sqlite":
+        queries = [f"SELECT term, doc FROM {fts}_vocab WHERE length(term) >= %s" for fts in search_index.INDEXES]
+    elif connection.vendor == "postgresql":
+        # lexemes are stems, which is also what the expanded tsquery matches on
+        queries = [
+            f"SELECT word, ndoc FROM ts_stat('SELECT search_vector FROM {table}') WHERE length(word) >= %s"
+            for table, _ in search_index.DOCUMENTS.values()
+        ]
+    else:
+        queries = []
+    with connection.cursor() as cursor:
+        for sql in queries:
+            cursor.execute(sql, [MIN_LENGTH])
+            for term, doc in cursor.fetchall():
+                if term.isalpha():
+                    terms[term] += doc
+    for name in Author.objects.values_list("name", flat=True):
+        terms.update(w for w in strip_accents(name).split() if len(w) >= MIN_LENGTH and w.isalpha())
+    return terms
+
+
+class FuzzyIndex:
+    def __init__(self):
+        self.words = []        # term id -> term
+        self.ids = {}          # term -> term id
+        self.frequency = {}    # term -> document frequency
+        self.postings = {}     # trigram -> array of term ids
+
+    def refreshed(self):
+        """Return a copy brought up to date with the vocabulary; self stays as it is for readers."""
+        current = _vocabulary()
+        fresh = FuzzyIndex()
+        removed = self.ids.keys() - current.keys()
+        if len(self.words) - len(self.ids) + len(removed) <= len(self.words) // 4:
+            # carry the postings over; rebuild them when too many entries are dead
+            fresh.words = self.words.copy()
+            fresh.ids = {term: term_id for term, term_id in self.ids.items() if term not in removed}
+            fresh.postings = {gram: array("I", ids) for gram, ids in self.postings.items()}
+        for term in current.keys() - fresh.ids.keys():
+            term_id = len(fresh.words)
+            fresh.words.append(term)
+            fresh.ids[term] = term_id
+            for gram in trigrams(term):
+                fresh.postings.setdefault(gram, array("I")).append(term_id)
+        fresh.frequency = current
+        return fresh
+
+    def expand(self, term):
+        """Return up to MAX_EXPANSIONS vocabulary words within edit distance of term, best first."""
+        if len(term) < MIN_LENGTH or not term.isalpha():
+            return []
+        limit = max_distance(term)
+        shared = Counter()
+        for gram in trigrams(term):
+            shared.update(self.postings.get(gram, ()))
+        matches = []
+        for term_id, _ in shared.most_common(CANDIDATES):
+            word = self.words[term_id]
+            if word == term or self.ids.get(word) != term_id:
+                continue  # removed from the vocabulary, or a stale id of a re-added word
+            distance = edit_distance(term, word, limit)
+            if distance <= limit:
+                matches.append((distance, -self.frequency[word], word))
+        return [word for _, _, word in sorted(matches)[:MAX_EXPANSIONS]]
+
+
+def _build(previous):
+    return (previous or FuzzyIndex()).refreshed()
+
+
+index = VersionedIndex(_build)
+
+
+def expand(terms):
+    """
+    Return {term: [close vocabulary words]} for the folded query terms that
+    have any; none while the index is first being built.
+    """
+    current = index.get()
+    if current is None:
+        return {}
+    expansions = {}
+    for term in terms:
+        words = current.expand(term)
+        if words:
+            expansions[term] = words
+    return expansions
@@ -0,0 +1,188 @@
+import math
+import pickle
+import re
+from collections import Counter
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import F
+
+from palestras.caching import bump_data_version
+from palestras.db_functions import strip_accents
+from palestras.models import AudioTrack, Palestra, RelatedPalestra
+
+CACHE_PATH = getattr(settings, "RELATED_CACHE_PATH", settings.BASE_DIR / "related_cache.pkl")
+CACHE_VERSION = 1
+
+TOKEN_RE = re.compile(r"[a-z]{3,}")
+
+# Field weights: a word in the title says more about the talk than one in the transcript
+TITLE_WEIGHT = 3
+CONCEPT_WEIGHT = 2
+
+MAX_DF_RATIO = 0.5   # terms in more than half the palestras carry no signal
+MIN_DF = 2           # terms in a single palestra can't link two palestras
+BLOCK_ROWS = 512     # rows of the similarity matrix materialised at once
+
+
+def _tokens(text):
+    return TOKEN_RE.findall(strip_accents(text)) if text else []
+
+
+def _signature(palestra, tracks):
+    """Cheap fingerprint of everything that feeds a palestra's document vector."""
+    return (
+        palestra["scraped_on"],
+        tuple((t["id"], t["transcribed_on"], len(t["concepts"] or [])) for t in tracks),
+    )
+
+
+def _term_counts(palestra, tracks):
+    counts = Counter()
+    for tok in _tokens(palestra.title):
+        counts[tok] += TITLE_WEIGHT
+    counts.update(_tokens(palestra.description))
+    for track in tracks:
+        if not track.transcript:
+            continue
+        counts.update(_tokens(track.transcript.text))
+        for concept in track.transcript.concepts or []:
+            for tok in _tokens(concept):
+                counts[tok] += CONCEPT_WEIGHT
+    return counts
+
+
+def _load_cache(rebuild):
+    if rebuild or not CACHE_PATH.exists():
+        return {}
+    with open(CACHE_PATH, "rb") as f:
+        cached = pickle.load(f)
+    if cached.get("version") != CACHE_VERSION:
+        return {}
+    return cached["docs"]
+
+
+def _save_cache(docs):
+    tmp = CACHE_PATH.with_suffix(".tmp")
+    with open(tmp, "wb") as f:
+        pickle.dump({"version": CACHE_VERSION, "docs": docs}, f, protocol=pickle.HIGHEST_PROTOCOL)
+    tmp.replace(CACHE_PATH)
+
+
+class Command(BaseCommand):
+    help = "Precompute related palestras from TF-IDF similarity (needs the 'related' extra)"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--top", type=int, default=8, help="Related palestras to keep per palestra"
+        )
+        parser.add_argument(
+            "--min-score", type=float, default=0.05, help="Drop neighbours below this cosine similarity"
+        )
+        parser.add_argument(
+            "--rebuild", action="store_true", help="Ignore the token cache and re-tokenize everything"
+        )
+
+    def handle(self, *args, **options):
+        import numpy as np
+        from scipy import sparse
+
+        top = options["top"]
+        min_score = options["min_score"]
+
+        cached = _load_cache(options["rebuild"])
+
+        tracks_by_palestra = {}
+        for t in AudioTrack.objects.values(
+            "id", "palestra_id", "transcribed_on", concepts=F("transcript__concepts")
+        ).order_by("id"):
+            tracks_by_palestra.setdefault(t["palestra_id"], []).append(t)
+
+        palestras = list(Palestra.objects.values("id", "scraped_on").order_by("id"))
+        signatures = {
+            p["id"]: _signature(p, tracks_by_palestra.get(p["id"], [])) for p in palestras
+        }
+        stale = [pid for pid, sig in signatures.items() if cached.get(pid, (None,))[0] != sig]
+        self.stdout.write(f"{len(palestras)} palestras, {len(stale)} to tokenize")
+
+        docs = {pid: cached[pid] for pid in signatures if pid not in stale}
+        for i, p in enumerate(Palestra.objects.filter(id__in=stale).prefetch_related("tracks__transcript").iterator(chunk_size=100), 1):
+            docs[p.id] = (signatures[p.id], _term_counts(p, p.tracks.all()))
+            if i % 200 == 0:
+                self.stdout.write(f"  tokenized {i}/{len(stale)}")
+        _save_cache(docs)
+
+        ids = [p["id"] for p in palestras]
+        n = len(ids)
+        if n < 2:
+            self.stdout.write("Not enough palestras to compare.")
+            return
+
+        # Vocabulary and document frequencies
+        df = Counter()
+        for _, counts in docs.values():
+            df.update(counts.keys())
+        max_df = max(MIN_DF, int(n * MAX_DF_RATIO))
+        vocab = {term: j for j, term in enumerate(t for t, c in df.items() if MIN_DF <= c <= max_df)}
+        idf = np.empty(len(vocab), dtype=np.float32)
+        for term, j in vocab.items():
+            idf[j] = math.log((1 + n) / (1 + df[term])) + 1
+
+        rows, cols, vals = [], [], []
+        for row, pid in enumerate(ids):
+            for term, count in docs[pid][1].items():
+                j = vocab.get(term)
+                if j is not None:
+                    rows.append(row)
+                    cols.append(j)
+                    vals.append(count)
+
+        X = sparse.csr_matrix(
+            (np.asarray(vals, dtype=np.float32), (rows, cols)), shape=(n, len(vocab))
+        )
+        X.data = 1 + np.log(X.data)  # sublinear tf
+        X = X @ sparse.diags(idf)
+        norms = np.sqrt(np.asarray(X.multiply(X).sum(axis=1)).ravel())
+        norms[norms == 0] = 1
+        X = sparse.diags(1 / norms) @ X
+        XT = X.T.tocsc()
+        self.stdout.write(f"TF-IDF matrix: {n} x {len(vocab)}, {X.nnz} non-zeros")
+
+        k = min(top, n - 1)
+        neighbours = {}
+        for start in range(0, n, BLOCK_ROWS):
+            block = (X[start:start + BLOCK_ROWS] @ XT).toarray()
+            local = np.arange(block.shape[0])
+            block[local, start + local] = -1  # a palestra is not related to itself
+            best = np.argpartition(-block, k - 1, axis=1)[:, :k]
+            best_scores = np.take_along_axis(block, best, axis=1)
+            order = np.argsort(-best_scores, axis=1)
+            best = np.take_along_axis(best, order, axis=1)
+            best_scores = np.take_along_axis(best_scores, order, axis=1)
+            for r in local:
+                neighbours[ids[start + r]] = [
+                    (ids[c], round(float(s), 4))
+                    for c, s in zip(best[r], best_scores[r])
+                    if s >= min_score
+                ]
+
+        current = {}
+        for link in RelatedPalestra.objects.values("palestra_id", "related_id", "score").order_by("palestra_id", "-score"):
+            current.setdefault(link["palestra_id"], []).append((link["related_id"], link["score"]))
+
+        changed = [pid for pid in ids if neighbours[pid] != current.get(pid, [])]
+        with transaction.atomic():
+            RelatedPalestra.objects.exclude(palestra_id__in=ids).delete()
+            RelatedPalestra.objects.filter(palestra_id__in=changed).delete()
+            RelatedPalestra.objects.bulk_create(
+                RelatedPalestra(palestra_id=pid, related_id=rid, score=score)
+                for pid in changed
+                for rid, score in neighbours[pid]
+            )
+        if changed:
+            bump_data_version()
+
+        self.stdout.write(
+            self.style.SUCCESS(f"Done. Updated related palestras for {len(changed)}/{n} palestras")
+        )
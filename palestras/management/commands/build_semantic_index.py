@@ -0,0 +1,139 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from palestras import semantic
+from palestras.caching import bump_data_version
+from palestras.models import AudioTrack
+
+INDEX_FILES = ("vectors.i8", "rows.bin", "assign.i4", "centroids.f4", "manifest.json")
+
+
+class Command(BaseCommand):
+    help = "Embed transcription segments into the semantic search index (needs the 'semantic' extra)"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--limit", type=int, default=0, help="Max new tracks to index (0=all)"
+        )
+        parser.add_argument(
+            "--batch-size", type=int, default=64, help="Segments per embedding batch"
+        )
+        parser.add_argument(
+            "--rebuild", action="store_true", help="Drop the index and embed everything again"
+        )
+        parser.add_argument(
+            "--retrain", action="store_true", help="Retrain IVF centroids over all rows"
+        )
+
+    def handle(self, *args, **options):
+        import numpy as np
+
+        index_dir = semantic.INDEX_DIR
+        index_dir.mkdir(exist_ok=True)
+
+        if options["rebuild"]:
+            for name in INDEX_FILES:
+                (index_dir / name).unlink(missing_ok=True)
+
+        manifest = semantic.read_manifest()
+        if manifest and manifest["model"] != semantic.MODEL_NAME:
+            raise CommandError(
+                f"Index was built with {manifest['model']}, run with --rebuild to switch models"
+            )
+        if manifest is None:
+            manifest = {"model": semantic.MODEL_NAME, "dim": 0, "count": 0, "tracks": {}, "signatures": {}}
+
+        # Drop rows written by an interrupted run
+        count = manifest["count"]
+        for name, row_bytes in (("vectors.i8", manifest["dim"]), ("rows.bin", np.dtype(semantic.ROW_DTYPE).itemsize), ("assign.i4", 4)):
+            path = index_dir / name
+            if path.exists():
+                with open(path, "r+b") as f:
+                    f.truncate(count * row_bytes)
+
+        current = {}
+        for track_id, transcribed_on in (
+            AudioTrack.objects.filter(transcribed_on__isnull=False)
+            .exclude(transcript=None)
+            .exclude(transcript__text="")
+            .values_list("id", "transcribed_on")
+        ):
+            current[str(track_id)] = transcribed_on.isoformat()
+
+        removed = [tid for tid in manifest["tracks"] if current.get(tid) != manifest["signatures"].get(tid)]
+        for tid in removed:
+            del manifest["tracks"][tid]
+            del manifest["signatures"][tid]
+        pending = [int(tid) for tid in current if tid not in manifest["tracks"]]
+        if options["limit"]:
+            pending = pending[:options["limit"]]
+        self.stdout.write(f"{len(manifest['tracks'])} tracks indexed, {len(removed)} stale, {len(pending)} to embed")
+
+        centroids = None
+        if (index_dir / "centroids.f4").exists() and not options["retrain"]:
+            centroids = np.fromfile(index_dir / "centroids.f4", dtype=np.float32).reshape(-1, manifest["dim"])
+
+        new_rows = 0
+        batch_size = options["batch_size"]
+        with open(index_dir / "vectors.i8", "ab") as vec_f, open(index_dir / "rows.bin", "ab") as rows_f, \
+                open(index_dir / "assign.i4", "ab") as assign_f:
+            qs = AudioTrack.objects.filter(id__in=pending).select_related("transcript").only(
+                "id", "palestra_id", "transcribed_on", "transcript__text", "transcript__timecoded"
+            )
+            for i, track in enumerate(qs.iterator(chunk_size=50), 1):
+                windows = semantic.track_windows(track.transcript)
+                if not windows:
+                    continue
+                vectors = semantic.embed([w[3] for w in windows], batch_size=batch_size)
+                manifest["dim"] = vectors.shape[1]
+
+                rows = np.array(
+                    [(track.id, track.palestra_id, first, last, start) for first, last, start, _ in windows],
+                    dtype=semantic.ROW_DTYPE,
+                )
+                vec_f.write(semantic.quantize(vectors).tobytes())
+                rows_f.write(rows.tobytes())
+                if centroids is not None:
+                    assign_f.write(np.argmax(vectors @ centroids.T, axis=1).astype(np.int32).tobytes())
+
+                start = manifest["count"]
+                manifest["count"] += len(windows)
+                manifest["tracks"][str(track.id)] = [start, manifest["count"]]
+                manifest["signatures"][str(track.id)] = semantic.track_signature(track)
+                new_rows += len(windows)
+                if i % 20 == 0:
+                    self.stdout.write(f"  [{i}/{len(pending)}] {manifest['count']} segments")
+
+        count = manifest["count"]
+        if not count:
+            self.stdout.write("Nothing to index.")
+            return
+
+        if centroids is None or semantic.n_lists_for(count) > 2 * len(centroids):
+            self._train(index_dir, manifest)
+
+        semantic.write_manifest(manifest)
+        bump_data_version()
+        self.stdout.write(self.style.SUCCESS(
+            f"Done. Added {new_rows} segments, index has {count} rows over {len(manifest['tracks'])} tracks"
+        ))
+
+    def _train(self, index_dir, manifest):
+        """Train IVF centroids on a sample of rows and reassign every row."""
+        import numpy as np
+
+        count, dim = manifest["count"], manifest["dim"]
+        vectors = np.memmap(index_dir / "vectors.i8", dtype=np.int8, mode="r", shape=(count, dim))
+        n_lists = semantic.n_lists_for(count)
+        self.stdout.write(f"Training {n_lists} IVF centroids...")
+
+        rng = np.random.default_rng(0)
+        sample_ids = np.sort(rng.choice(count, min(count, semantic.KMEANS_SAMPLE), replace=False))
+        sample = vectors[sample_ids].astype(np.float32) / 127
+        centroids = semantic.kmeans(sample, n_lists)
+        centroids.tofile(index_dir / "centroids.f4")
+
+        assign = np.empty(count, dtype=np.int32)
+        for start in range(0, count, 65536):
+            block = vectors[start:start + 65536].astype(np.float32)
+            assign[start:start + 65536] = np.argmax(block @ centroids.T, axis=1)
+        assign.tofile(index_dir / "assign.i4")
@@ -0,0 +1,85 @@
+import json
+import pickle
+import re
+from collections import Counter
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from palestras.caching import bump_data_version
+from palestras.db_functions import strip_accents
+from palestras.models import AudioTrack
+from palestras.typeahead import VOCABULARY_PATH
+
+CACHE_PATH = getattr(settings, "VOCABULARY_CACHE_PATH", settings.BASE_DIR / "vocabulary_cache.pkl")
+CACHE_VERSION = 1
+
+TOKEN_RE = re.compile(r"[a-z]{4,}")
+
+
+def _load_cache(rebuild):
+    if rebuild or not CACHE_PATH.exists():
+        return {}
+    with open(CACHE_PATH, "rb") as f:
+        cached = pickle.load(f)
+    if cached.get("version") != CACHE_VERSION:
+        return {}
+    return cached["tracks"]
+
+
+def _save_cache(tracks):
+    tmp = CACHE_PATH.with_suffix(".tmp")
+    with open(tmp, "wb") as f:
+        pickle.dump({"version": CACHE_VERSION, "tracks": tracks}, f, protocol=pickle.HIGHEST_PROTOCOL)
+    tmp.replace(CACHE_PATH)
+
+
+class Command(BaseCommand):
+    help = "Collect frequent transcript terms for search suggestions"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--size", type=int, default=20000, help="Terms to keep, most frequent first"
+        )
+        parser.add_argument(
+            "--min-df", type=int, default=3, help="Drop terms found in fewer tracks than this"
+        )
+        parser.add_argument(
+            "--rebuild", action="store_true", help="Ignore the token cache and re-tokenize everything"
+        )
+
+    def handle(self, *args, **options):
+        cached = _load_cache(options["rebuild"])
+
+        current = {
+            track_id: transcribed_on.isoformat()
+            for track_id, transcribed_on in AudioTrack.objects.filter(transcribed_on__isnull=False)
+            .exclude(transcript=None)
+            .exclude(transcript__text="")
+            .values_list("id", "transcribed_on")
+        }
+        tracks = {tid: entry for tid, entry in cached.items() if current.get(tid) == entry[0]}
+        stale = [tid for tid in current if tid not in tracks]
+        self.stdout.write(f"{len(current)} transcribed tracks, {len(stale)} to tokenize")
+
+        qs = AudioTrack.objects.filter(id__in=stale).values_list("id", "transcript__text")
+        for i, (track_id, transcription) in enumerate(qs.iterator(chunk_size=100), 1):
+            tracks[track_id] = (current[track_id], frozenset(TOKEN_RE.findall(strip_accents(transcription))))
+            if i % 500 == 0:
+                self.stdout.write(f"  tokenized {i}/{len(stale)}")
+        _save_cache(tracks)
+
+        df = Counter()
+        for _, terms in tracks.values():
+            df.update(terms)
+        terms = [(term, n) for term, n in df.most_common(options["size"]) if n >= options["min_df"]]
+
+        previous = VOCABULARY_PATH.read_text(encoding="utf-8") if VOCABULARY_PATH.exists() else None
+        content = json.dumps({"terms": terms}, ensure_ascii=False)
+        if content != previous:
+            tmp = VOCABULARY_PATH.with_suffix(".tmp")
+            tmp.write_text(content, encoding="utf-8")
+            tmp.replace(VOCABULARY_PATH)
+            bump_data_version()
+
+        self.stdout.write(self.style.SUCCESS(f"Done. {len(terms)} terms in {VOCABULARY_PATH}"))
@@ -0,0 +1,92 @@
+import os
+from pathlib import Path
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from palestras.audio_download import AUDIOS_DIR, file_sha256
+from palestras.caching import bump_data_version
+from palestras.models import AudioTrack, Transcript
+
+
+class Command(BaseCommand):
+    help = "Hash downloaded audio, hardlink duplicate files and share transcripts between tracks with the same audio"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--dry-run", action="store_true", help="Only report what would change"
+        )
+
+    def handle(self, *args, **options):
+        dry_run = options["dry_run"]
+
+        hashed = 0
+        groups = {}
+        for track in AudioTrack.objects.exclude(local_path=None).exclude(local_path="").order_by("id"):
+            path = AUDIOS_DIR / Path(track.local_path.name).name
+            if not path.exists():
+                continue
+            if not track.audio_sha256:
+                track.audio_sha256 = file_sha256(path)
+                track.audio_size = path.stat().st_size
+                hashed += 1
+                if not dry_run:
+                    track.save(update_fields=["audio_sha256", "audio_size", "updated_on"])
+            groups.setdefault(track.audio_sha256, []).append((track, path))
+        duplicates = {sha: members for sha, members in groups.items() if len(members) > 1}
+        self.stdout.write(f"Hashed {hashed} files; {len(duplicates)} audios shared by more than one track")
+
+        linked = saved = shared = 0
+        for sha, members in duplicates.items():
+            canonical = members[0][1]
+            for _, path in members[1:]:
+                if path == canonical or os.path.samefile(path, canonical):
+                    continue
+                saved += path.stat().st_size
+                linked += 1
+                if not dry_run:
+                    tmp = path.with_suffix(".link")
+                    os.link(canonical, tmp)
+                    tmp.replace(path)
+            shared += self._share_transcript(sha, [track for track, _ in members], dry_run)
+
+        if shared and not dry_run:
+            bump_data_version()
+        verb = "Would free" if dry_run else "Freed"
+        self.stdout.write(self.style.SUCCESS(
+            f"Done. {verb} {saved / (1024 * 1024):.1f} MB by hardlinking {linked} files; "
+            f"{shared} tracks take an existing transcript"
+        ))
+
+    def _share_transcript(self, sha, tracks, dry_run):
+        """Point the untranscribed tracks at the transcript of their audio; returns how many."""
+        transcript = Transcript.objects.filter(audio_sha256=sha).first()
+        if transcript:
+            # Method and date come from a track using it, in this group or not
+            source = next((t for t in tracks if t.transcript_id == transcript.id), None) or (
+                transcript.tracks.exclude(transcribed_on=None).order_by("-transcribed_on").first()
+            )
+            if source is None:
+                return 0  # not transcribed by any track: transcribe will fill it
+        else:
+            transcribed = [t for t in tracks if t.transcript_id and t.transcribed_on]
+            if not transcribed:
+                return 0
+            source = max(transcribed, key=lambda t: t.transcribed_on)
+            transcript = source.transcript
+            transcript.audio_sha256 = sha
+            if not dry_run:
+                transcript.save(update_fields=["audio_sha256", "updated_on"])
+        pending = [t for t in tracks if t.transcript_id is None]
+        if dry_run:
+            return len(pending)
+        now = timezone.now()  # bulk_update skips auto_now
+        for track in pending:
+            track.updated_on = now
+            track.transcript = transcript
+            track.transcription_method = source.transcription_method
+            track.transcribed_on = source.transcribed_on
+        AudioTrack.objects.bulk_update(
+            pending, ["transcript", "transcription_method", "transcribed_on", "updated_on"]
+        )
+        return len(pending)
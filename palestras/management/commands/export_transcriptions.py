@@ -1,36 +1,66 @@
-import json
+from datetime import datetime, timezone
 
-from django.core.management.base import BaseCommand
+from django.core.management.base import BaseCommand, CommandError
 
+from palestras.exports import open_export, write_record
 from palestras.models import AudioTrack
 
 
 class Command(BaseCommand):
-    help = "Export transcriptions to a JSON file"
+    help = "Export transcriptions as JSON Lines (.gz/.zst compressed by suffix, '-' for stdout)"
 
     def add_arguments(self, parser):
         parser.add_argument(
-            "output", nargs="?", default="transcriptions_export.json",
-            help="Output file path (default: transcriptions_export.json)",
+            "output", nargs="?", default="transcriptions_export.jsonl.gz",
+            help="Output file path (default: transcriptions_export.jsonl.gz)",
+        )
+        parser.add_argument(
+            "--since", help="Only tracks transcribed at or after this ISO timestamp (UTC unless given)"
+        )
+        parser.add_argument(
+            "--method", help="Only tracks whose transcription method contains this"
+        )
+        parser.add_argument(
+            "--chunk-size", type=int, default=500, help="Rows fetched per database round trip"
         )
 
     def handle(self, *args, **options):
         output = options["output"]
-        qs = AudioTrack.objects.exclude(transcription="").select_related("palestra")
-        records = []
-        for t in qs:
-            records.append({
-                "id": t.id,
-                "mp3_url": t.mp3_url,
-                "name": t.name,
-                "palestra_slug": t.palestra.slug,
-                "transcription": t.transcription,
-                "transcription_timecoded": t.transcription_timecoded,
-                "transcription_method": t.transcription_method,
-                "transcribed_on": t.transcribed_on.isoformat() if t.transcribed_on else None,
-            })
-
-        with open(output, "w", encoding="utf-8") as f:
-            json.dump(records, f, ensure_ascii=False, indent=2)
-
-        self.stdout.write(self.style.SUCCESS(f"Exported {len(records)} transcriptions to {output}"))
+        qs = AudioTrack.objects.exclude(transcript=None).exclude(transcript__text="")
+        if options["since"]:
+            try:
+                since = datetime.fromisoformat(options["since"])
+            except ValueError:
+                raise CommandError(f"Invalid --since timestamp: {options['since']}")
+            if since.tzinfo is None:
+                since = since.replace(tzinfo=timezone.utc)
+            qs = qs.filter(transcribed_on__gte=since)
+        if options["method"]:
+            qs = qs.filter(transcription_method__icontains=options["method"])
+        qs = qs.select_related("palestra", "transcript").only(
+            "id", "mp3_url", "name", "transcription_method", "transcribed_on",
+            "palestra__slug", "transcript__text", "transcript__timecoded",
+        ).order_by("transcribed_on", "id")
+
+        count = 0
+        latest = None
+        with open_export(output, "w") as f:
+            for t in qs.iterator(chunk_size=options["chunk_size"]):
+                write_record(f, {
+                    "id": t.id,
+                    "mp3_url": t.mp3_url,
+                    "name": t.name,
+                    "palestra_slug": t.palestra.slug,
+                    "transcription": t.transcript.text,
+                    "transcription_timecoded": t.transcript.timecoded,
+                    "transcription_method": t.transcription_method,
+                    "transcribed_on": t.transcribed_on.isoformat() if t.transcribed_on else None,
+                })
+                count += 1
+                latest = t.transcribed_on or latest
+
+        # stdout may be the export itself
+        log = self.stderr if output == "-" else self.stdout
+        log.write(self.style.SUCCESS(f"Exported {count} transcriptions to {output}"))
+        if latest:
+            log.write(f"Latest transcribed_on: {latest.isoformat()}")
@@ -35,8 +35,8 @@ class Command(BaseCommand):
 
         qs = AudioTrack.objects.filter(
             transcribed_on__isnull=False,
-            concepts=[],
-        )
+            transcript__concepts=[],
+        ).select_related("transcript")
 
         if limit:
             qs = qs[:limit]
@@ -47,11 +47,15 @@ class Command(BaseCommand):
         if not pending:
             return
 
+        seen = set()
         for i, track in enumerate(pending, 1):
+            if track.transcript_id in seen:
+                continue  # a transcript shared by tracks with the same audio
+            seen.add(track.transcript_id)
             self.stdout.write(f"[{i}/{len(pending)}] {track.name}")
 
             try:
-                concepts = self._extract(track.transcription, model)
+                concepts = self._extract(track.transcript.text, model)
             except Exception as e:
                 self.stderr.write(f"  Error: {e}")
                 continue
@@ -62,11 +66,11 @@ class Command(BaseCommand):
                 if name:
                     cleaned.append(name)
 
-            track.concepts = cleaned
-            track.save(update_fields=["concepts"])
+            track.transcript.concepts = cleaned
+            track.transcript.save(update_fields=["concepts"])
             self.stdout.write(f"  -> {len(cleaned)} concepts")
 
-        total_with = AudioTrack.objects.exclude(concepts=[]).count()
+        total_with = AudioTrack.objects.exclude(transcript=None).exclude(transcript__concepts=[]).count()
         total = AudioTrack.objects.filter(transcribed_on__isnull=False).count()
         self.stdout.write(
             self.style.SUCCESS(f"Done. Tracks with concepts: {total_with}/{total}")
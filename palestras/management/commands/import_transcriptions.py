@@ -1,55 +1,115 @@
-import json
-from datetime import datetime, timezone
+import time
+from itertools import batched
 
 from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.utils import timezone
 
-from palestras.models import AudioTrack
+from palestras.caching import bump_data_version
+from palestras.exports import open_export, parse_timestamp, read_records
+from palestras.models import AudioTrack, Transcript
+
+
+def _is_newer(rec, track):
+    """Whether the record was transcribed after the local track."""
+    incoming, local = parse_timestamp(rec["transcribed_on"]), track[1]
+    return incoming is not None and (local is None or incoming > local)
 
 
 class Command(BaseCommand):
-    help = "Import transcriptions from a JSON file exported by export_transcriptions"
+    help = "Import transcriptions from a file exported by export_transcriptions"
 
     def add_arguments(self, parser):
         parser.add_argument(
-            "input", help="Input JSON file path"
+            "input", help="Input file path (.jsonl, .gz, .zst or a legacy .json array; '-' for stdin)"
         )
         parser.add_argument(
             "--overwrite", action="store_true",
             help="Overwrite tracks that are already transcribed",
         )
+        parser.add_argument(
+            "--newer", action="store_true",
+            help="Overwrite transcribed tracks only when the record's transcribed_on is newer",
+        )
+        parser.add_argument(
+            "--batch-size", type=int, default=500, help="Records written per transaction"
+        )
 
     def handle(self, *args, **options):
         input_file = options["input"]
         overwrite = options["overwrite"]
+        newer = options["newer"]
+        started = time.monotonic()
 
-        with open(input_file, encoding="utf-8") as f:
-            records = json.load(f)
-
-        # Build lookup by id and by mp3_url as fallback
-        tracks_by_id = {t.id: t for t in AudioTrack.objects.all()}
-        tracks_by_url = {t.mp3_url: t for t in AudioTrack.objects.all()}
+        # Only what matching needs: track id -> [transcript id, transcribed_on, audio hash], mp3_url -> track id
+        tracks = {}
+        ids_by_url = {}
+        for track_id, mp3_url, transcript_id, transcribed_on, sha in AudioTrack.objects.values_list(
+            "id", "mp3_url", "transcript_id", "transcribed_on", "audio_sha256"
+        ).iterator(chunk_size=2000):
+            tracks[track_id] = [transcript_id, transcribed_on, sha]
+            ids_by_url.setdefault(mp3_url, track_id)
 
         imported = skipped = not_found = 0
+        with open_export(input_file) as f:
+            for batch in batched(read_records(f), options["batch_size"]):
+                pending = {}
+                for rec in batch:
+                    track_id = rec["id"] if rec["id"] in tracks else ids_by_url.get(rec["mp3_url"])
+                    if track_id is None:
+                        self.stdout.write(f"  Not found: {rec['name']} ({rec['palestra_slug']})")
+                        not_found += 1
+                    elif tracks[track_id][0] and not overwrite and not (newer and _is_newer(rec, tracks[track_id])):
+                        skipped += 1
+                    else:
+                        pending[track_id] = rec  # a later record for the same track wins
+                if pending:
+                    self._apply(pending, tracks)
+                    imported += len(pending)
+                elapsed = time.monotonic() - started
+                self.stdout.write(
+                    f"  {imported + skipped + not_found} records, {imported} imported ({imported / elapsed:.0f}/s)"
+                )
 
-        for rec in records:
-            track = tracks_by_id.get(rec["id"]) or tracks_by_url.get(rec["mp3_url"])
-            if not track:
-                self.stdout.write(f"  Not found: {rec['name']} ({rec['palestra_slug']})")
-                not_found += 1
-                continue
-
-            if track.transcription and not overwrite:
-                skipped += 1
-                continue
-
-            track.transcription = rec["transcription"]
-            track.transcription_timecoded = rec["transcription_timecoded"]
-            track.transcription_method = rec["transcription_method"]
-            if rec["transcribed_on"]:
-                track.transcribed_on = datetime.fromisoformat(rec["transcribed_on"]).replace(tzinfo=timezone.utc)
-            track.save()
-            imported += 1
-
+        if imported:
+            bump_data_version()  # bulk writes skip the model signals
+        elapsed = time.monotonic() - started
         self.stdout.write(self.style.SUCCESS(
-            f"Done. Imported: {imported}, skipped (already transcribed): {skipped}, not found: {not_found}"
+            f"Done. Imported: {imported}, skipped (already transcribed): {skipped}, not found: {not_found} "
+            f"in {elapsed:.1f}s"
         ))
+
+    @transaction.atomic
+    def _apply(self, pending, tracks):
+        now = timezone.now()  # bulk_update skips auto_now
+        # Transcripts are shared by audio hash: an untranscribed track takes the one stored for its audio
+        by_sha = dict(Transcript.objects.filter(
+            audio_sha256__in={tracks[track_id][2] for track_id in pending if tracks[track_id][2]}
+        ).values_list("audio_sha256", "id"))
+        transcripts, track_rows = {}, []
+        for track_id, rec in pending.items():
+            transcript_id, transcribed_on, sha = tracks[track_id]
+            transcript_id = transcript_id or by_sha.get(sha)
+            key = transcript_id or sha or ("track", track_id)
+            transcript = transcripts.get(key)
+            if transcript is None:
+                transcript = transcripts[key] = Transcript(id=transcript_id, audio_sha256=sha)
+            transcript.text, transcript.timecoded = rec["transcription"], rec["transcription_timecoded"]
+            transcript.updated_on = now
+            track_rows.append(AudioTrack(
+                id=track_id,
+                transcript=transcript,
+                transcription_method=rec["transcription_method"],
+                transcribed_on=parse_timestamp(rec["transcribed_on"]) or transcribed_on,
+                updated_on=now,
+            ))
+        Transcript.objects.bulk_update(
+            [t for t in transcripts.values() if t.id], ["text", "timecoded", "updated_on"]
+        )
+        Transcript.objects.bulk_create([t for t in transcripts.values() if not t.id])
+        for track in track_rows:
+            track.transcript_id = track.transcript.id
+            tracks[track.id][:2] = [track.transcript_id, track.transcribed_on]
+        AudioTrack.objects.bulk_update(
+            track_rows, ["transcript", "transcription_method", "transcribed_on", "updated_on"]
+        )
@@ -0,0 +1,130 @@
+import gzip
+import hashlib
+import json
+import shutil
+from datetime import datetime, timezone
+from pathlib import Path
+from xml.sax.saxutils import escape as xml_escape
+
+import brotli
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.core.serializers.json import DjangoJSONEncoder
+
+from palestras.frontend import og_tags, shell, transcript_excerpt
+from palestras.models import AudioTrack, Palestra, RelatedPalestra
+from palestras.views import palestra_detail_data
+
+PRERENDER_DIR = getattr(settings, "PRERENDER_DIR", settings.BASE_DIR / "prerendered")
+MANIFEST = "manifest.json"
+ROOT_DIV = b'<div id="root"></div>'
+
+
+def _write(path, data):
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = path.with_name(path.name + ".tmp")
+    tmp.write_bytes(data)
+    tmp.replace(path)
+
+
+def _write_compressed(path, data):
+    """Write data plus .gz and .br siblings for proxies that serve precompressed files."""
+    _write(path, data)
+    _write(path.with_name(path.name + ".gz"), gzip.compress(data, 9))
+    _write(path.with_name(path.name + ".br"), brotli.compress(data, quality=11))
+
+
+class Command(BaseCommand):
+    help = "Prerender palestra pages, detail JSON and sitemap.xml for a front proxy to serve"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--base-url", default=getattr(settings, "SITE_URL", ""),
+            help="Public site URL for og:url and the sitemap (default: settings.SITE_URL)",
+        )
+        parser.add_argument(
+            "--output", default=str(PRERENDER_DIR), help="Output directory"
+        )
+        parser.add_argument(
+            "--force", action="store_true", help="Render every palestra, not only changed ones"
+        )
+
+    def handle(self, *args, **options):
+        base_url = options["base_url"].rstrip("/")
+        if not base_url:
+            raise CommandError("Pass --base-url or set SITE_URL in settings")
+        if not shell.path.exists():
+            raise CommandError(f"{shell.path} not found, build the frontend first")
+        output = Path(options["output"])
+        manifest_path = output / MANIFEST
+        manifest = {}
+        if manifest_path.exists() and not options["force"]:
+            manifest = json.loads(manifest_path.read_text(encoding="utf-8"))
+
+        signatures = self._signatures(base_url)
+        changed = [slug for slug, sig in signatures.items() if manifest.get(slug, {}).get("signature") != sig]
+        removed = [slug for slug in manifest if slug not in signatures]
+        self.stdout.write(f"{len(signatures)} palestras, {len(changed)} to render, {len(removed)} removed")
+
+        now = datetime.now(timezone.utc).strftime("%Y-%m-%d")
+        qs = Palestra.objects.filter(slug__in=changed).prefetch_related("authors", "tracks__transcript")
+        for i, p in enumerate(qs.iterator(chunk_size=100), 1):
+            url = f"{base_url}/palestras/{p.slug}"
+            html = shell.render(og_tags(p, url).encode()).replace(
+                ROOT_DIV, f'<div id="root">{transcript_excerpt(p)}</div>'.encode(), 1
+            )
+            _write_compressed(output / "palestras" / p.slug / "index.html", html)
+
+            detail = json.dumps(palestra_detail_data(p), cls=DjangoJSONEncoder).encode()
+            _write_compressed(output / "api" / "palestras" / f"{p.slug}.json", detail)
+
+            manifest[p.slug] = {"signature": signatures[p.slug], "lastmod": now}
+            if i % 100 == 0:
+                self.stdout.write(f"  [{i}/{len(changed)}] rendered")
+
+        for slug in removed:
+            shutil.rmtree(output / "palestras" / slug, ignore_errors=True)
+            for suffix in ("", ".gz", ".br"):
+                (output / "api" / "palestras" / f"{slug}.json{suffix}").unlink(missing_ok=True)
+            del manifest[slug]
+
+        if changed or removed or not (output / "sitemap.xml").exists():
+            _write_compressed(output / "sitemap.xml", self._sitemap(base_url, manifest))
+        _write(manifest_path, json.dumps(manifest).encode())
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Done. Rendered {len(changed)}, removed {len(removed)}, output in {output}"
+        ))
+
+    def _signatures(self, base_url):
+        """
+        Fingerprint every palestra from cheap columns only: its own fields,
+        track metadata (transcribed_on stands in for the transcript), authors,
+        related links and the frontend build.
+        """
+        parts = {}
+        for row in Palestra.objects.values().order_by("id"):
+            parts[row["id"]] = [row]
+        for row in AudioTrack.objects.values("palestra_id", "id", "name", "mp3_url", "local_path", "transcribed_on", "renditions").order_by("id"):
+            parts[row["palestra_id"]].append(row)
+        for pid, name in Palestra.authors.through.objects.values_list("palestra_id", "author__name").order_by("id"):
+            parts[pid].append(name)
+        for pid, rid, score in RelatedPalestra.objects.values_list("palestra_id", "related__slug", "score").order_by("id"):
+            parts[pid].append((rid, score))
+
+        common = (shell.version(), base_url)
+        return {
+            rows[0]["slug"]: hashlib.sha1(repr((common, rows)).encode()).hexdigest()
+            for rows in parts.values()
+        }
+
+    def _sitemap(self, base_url, manifest):
+        urls = "".join(
+            f"  <url><loc>{xml_escape(f'{base_url}/palestras/{slug}')}</loc><lastmod>{entry['lastmod']}</lastmod></url>\n"
+            for slug, entry in sorted(manifest.items())
+        )
+        return (
+            '<?xml version="1.0" encoding="UTF-8"?>\n'
+            '<urlset xmlns="http://www.sitemaps.org/schemas/sitemap/0.9">\n'
+            f"{urls}</urlset>\n"
+        ).encode()
@@ -0,0 +1,16 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+
+from palestras import search_index
+
+
+class Command(BaseCommand):
+    help = "Recreate the full-text search tables and triggers and reindex every row (SQLite)"
+
+    def handle(self, *args, **options):
+        if connection.vendor != "sqlite":
+            raise CommandError(f"Only the SQLite full-text index needs rebuilding, not {connection.vendor}")
+        with connection.schema_editor() as schema_editor:
+            search_index.uninstall(schema_editor)
+            search_index.install(schema_editor)
+        self.stdout.write(self.style.SUCCESS("Done. Search index rebuilt"))
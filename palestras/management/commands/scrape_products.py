@@ -10,7 +10,9 @@ from django.db import close_old_connections
 from django.utils import timezone
 from django.utils.text import slugify
 
-from palestras.models import AudioTrack, Author, Palestra
+from palestras.caching import bump_data_version
+from palestras.facets import split_csv
+from palestras.models import AudioTrack, Author, Category, Language, Palestra
 
 _print_lock = threading.Lock()
 
@@ -39,6 +41,7 @@ class Command(BaseCommand):
 
         if options["reset"]:
             count = Palestra.objects.exclude(scraped_on=None).update(scraped_on=None)
+            bump_data_version()
             self.stdout.write(self.style.SUCCESS(f"Reset scraped_on for {count} products."))
             return
 
@@ -121,6 +124,9 @@ class Command(BaseCommand):
         cat_links = soup.select(".posted_in a")
         if cat_links:
             palestra.categories = ", ".join(a.get_text(strip=True) for a in cat_links)
+            palestra.category_terms.set([
+                Category.objects.get_or_create(name=a.get_text(strip=True))[0] for a in cat_links
+            ])
 
         # Tags
         tag_links = soup.select(".tagged_as a")
@@ -150,6 +156,9 @@ class Command(BaseCommand):
                     if language == "Multi-idioma":
                         language = "Inglês,Português"
                     palestra.language = language
+                    palestra.languages.set([
+                        Language.objects.get_or_create(name=name)[0] for name in split_csv(language)
+                    ])
                 elif "autor" in label or "author" in label:
                     self._parse_authors(palestra, td)
 
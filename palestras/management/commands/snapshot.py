@@ -0,0 +1,120 @@
+import hashlib
+import sqlite3
+import time
+from contextlib import closing
+from pathlib import Path
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+from django.utils import timezone
+
+from palestras import compression
+from palestras.exports import open_export
+
+SNAPSHOTS_DIR = settings.BASE_DIR / "snapshots"
+COPY_CHUNK = 1024 * 1024
+COMPRESSED = (".gz", ".zst")
+
+
+def _sha256(f):
+    digest = hashlib.sha256()
+    for chunk in iter(lambda: f.read(COPY_CHUNK), b""):
+        digest.update(chunk)
+    return digest.hexdigest()
+
+
+class Command(BaseCommand):
+    help = "Take a consistent hot backup of the SQLite database with the online backup API, and verify it"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "output", nargs="?",
+            help="Snapshot path, compressed if it ends in .gz or .zst "
+                 "(default: snapshots/db-<UTC time>.sqlite3, .sqlite3.gz with --compact)",
+        )
+        parser.add_argument(
+            "--pages", type=int, default=1024, help="Pages copied per backup step"
+        )
+        parser.add_argument(
+            "--pause", type=float, default=0.05,
+            help="Seconds to wait between steps, so the site and workers get the database in between",
+        )
+        parser.add_argument(
+            "--compact", action="store_true", help="VACUUM the copy into a compacted file (and compress it by default)"
+        )
+
+    def handle(self, *args, **options):
+        connection = connections["default"]
+        if connection.vendor != "sqlite":
+            raise CommandError("snapshot backs up SQLite; use pg_dump for PostgreSQL")
+        if options["output"]:
+            output = Path(options["output"])
+        else:
+            suffix = ".sqlite3.gz" if options["compact"] else ".sqlite3"
+            output = SNAPSHOTS_DIR / f"db-{timezone.now():%Y%m%dT%H%M%SZ}{suffix}"
+        if output.suffix == ".zst" and not compression.zstd_available():
+            raise CommandError(".zst snapshots need the 'zstd' extra (zstandard)")
+        output.parent.mkdir(parents=True, exist_ok=True)
+        copy = output.with_name(f".{output.name}.backup")
+        compacted = output.with_name(f".{output.name}.compact")
+        partial = output.with_name(f".{output.name}")
+
+        try:
+            self._backup(connection, copy, options["pages"], options["pause"])
+            if options["compact"]:
+                before = copy.stat().st_size
+                with closing(sqlite3.connect(copy)) as db:
+                    db.execute("VACUUM INTO ?", (str(compacted),))
+                compacted.replace(copy)
+                self.stdout.write(f"  Compacted {before / 1e6:.1f} MB -> {copy.stat().st_size / 1e6:.1f} MB")
+            self._verify(copy)
+
+            if output.suffix in COMPRESSED:
+                with open(copy, "rb") as src, open_export(str(partial), "wb") as dst:
+                    for chunk in iter(lambda: src.read(COPY_CHUNK), b""):
+                        dst.write(chunk)
+                with open(copy, "rb") as src:
+                    expected = _sha256(src)
+                with open_export(str(partial), "rb") as f:
+                    if _sha256(f) != expected:
+                        raise CommandError(f"{output} does not decompress to the verified copy")
+                partial.replace(output)
+            else:
+                copy.replace(output)
+        finally:
+            for path in (copy, compacted, partial):
+                path.unlink(missing_ok=True)
+
+        self.stdout.write(self.style.SUCCESS(f"Snapshot {output} ({output.stat().st_size / 1e6:.1f} MB) verified"))
+
+    def _backup(self, connection, path, pages, pause):
+        """
+        Copy the live database a few pages at a time. The copy reads one WAL
+        snapshot, so it stays consistent without restarting when others write,
+        and writers are never blocked.
+        """
+        steps = 0
+
+        def progress(status, remaining, total):
+            nonlocal steps
+            steps += 1
+            time.sleep(pause)
+
+        started = time.monotonic()
+        params = connection.get_connection_params()
+        source = sqlite3.connect(params["database"], uri=params["uri"], timeout=params["timeout"], isolation_level=None)
+        with closing(source), closing(sqlite3.connect(path)) as target:
+            source.execute("BEGIN")
+            source.execute("SELECT 1 FROM sqlite_master LIMIT 1")  # starts the read snapshot
+            source.backup(target, pages=pages, progress=progress)
+            source.execute("COMMIT")
+            # One self-contained file, whatever the live database's journal mode
+            target.execute("PRAGMA journal_mode=DELETE")
+        self.stdout.write(f"  Backed up in {steps} steps of {pages} pages in {time.monotonic() - started:.1f}s")
+
+    def _verify(self, path):
+        with closing(sqlite3.connect(f"file:{path}?mode=ro", uri=True)) as db:
+            problems = [row[0] for row in db.execute("PRAGMA integrity_check")]
+        if problems != ["ok"]:
+            raise CommandError(f"Integrity check failed: {'; '.join(problems[:5])}")
@@ -22,11 +22,13 @@ class Command(BaseCommand):
         total_tracks = AudioTrack.objects.count()
         downloaded = AudioTrack.objects.exclude(local_path="").exclude(local_path__isnull=True).count()
         not_downloaded = total_tracks - downloaded
+        distinct_audio = AudioTrack.objects.exclude(audio_sha256="").values("audio_sha256").distinct().count()
 
-        transcribed = AudioTrack.objects.exclude(transcription="").count()
-        timecoded = AudioTrack.objects.exclude(transcription_timecoded="").count()
+        with_transcript = AudioTrack.objects.exclude(transcript=None)
+        transcribed = with_transcript.exclude(transcript__text="").count()
+        timecoded = with_transcript.exclude(transcript__timecoded="").count()
         not_transcribed = total_tracks - transcribed
-        with_concepts = AudioTrack.objects.filter(concepts__len__gt=0).count()
+        with_concepts = with_transcript.exclude(transcript__concepts=[]).count()
 
         methods = (
             AudioTrack.objects.exclude(transcription_method="")
@@ -55,6 +57,7 @@ class Command(BaseCommand):
         self.stdout.write(w("=== Audio Tracks ==="))
         self.stdout.write(f"  Total:               {total_tracks}")
         self.stdout.write(f"  Downloaded:          {s(str(downloaded))}  ({e(str(not_downloaded)) if not_downloaded else s('0')} missing)")
+        self.stdout.write(f"  Distinct audio:      {distinct_audio}")
         self.stdout.write(f"  Transcribed:         {s(str(transcribed))}  ({e(str(not_transcribed)) if not_transcribed else s('0')} pending)")
         self.stdout.write(f"  With timestamps:     {timecoded}")
         self.stdout.write(f"  With concepts:       {with_concepts}")
@@ -0,0 +1,45 @@
+import time
+from itertools import batched
+from pathlib import Path
+
+from django.core.management.base import BaseCommand, CommandError
+
+from palestras.caching import bump_data_version
+from palestras.exports import open_export, read_records
+from palestras.sync import Merger
+
+
+class Command(BaseCommand):
+    help = "Merge a change set written by sync_export, resolving conflicts per field"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "input", help="Input file path (.jsonl, .gz or .zst; '-' for stdin)"
+        )
+        parser.add_argument(
+            "--mark-file",
+            help="Where to store the exporter's high-water mark, for its next --since; only written once all is merged",
+        )
+        parser.add_argument(
+            "--batch-size", type=int, default=500, help="Records merged per transaction"
+        )
+
+    def handle(self, *args, **options):
+        started = time.monotonic()
+        merger = Merger()
+        with open_export(options["input"]) as f:
+            for batch in batched(read_records(f), options["batch_size"]):
+                merger.apply(batch)
+
+        written = sum(n for key, n in merger.counts.items() if key.endswith(("created", "updated")))
+        if written:
+            bump_data_version()  # bulk writes skip the model signals
+        for key, n in sorted(merger.counts.items()):
+            self.stdout.write(f"  {key}: {n}")
+        if merger.until is None:
+            raise CommandError("Change set ended early (no high-water mark); the merged batches are kept")
+        if options["mark_file"]:
+            Path(options["mark_file"]).write_text(merger.until + "\n")
+        self.stdout.write(self.style.SUCCESS(
+            f"Done. Wrote {written} rows in {time.monotonic() - started:.1f}s; next mark {merger.until}"
+        ))
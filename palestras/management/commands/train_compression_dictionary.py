@@ -0,0 +1,55 @@
+import random
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db.models import Sum
+from django.db.models.functions import Length
+
+from palestras import compression
+from palestras.models import CompressionDictionary, Transcript
+
+BATCH = 200
+
+
+class Command(BaseCommand):
+    help = "Train a shared dictionary for the compressed transcript columns (zstd with the 'zstd' extra, else zlib)"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--samples", type=int, default=1000, help="Transcripts sampled for training"
+        )
+        parser.add_argument(
+            "--codec", choices=list(compression.CODECS.values()),
+            help="Dictionary codec (default: zstd when installed, else zlib)",
+        )
+        parser.add_argument(
+            "--recompress", action="store_true", help="Re-encode every stored transcript with the new dictionary"
+        )
+
+    def handle(self, *args, **options):
+        codec_name = options["codec"] or ("zstd" if compression.zstd_available() else "zlib")
+        codec = {name: c for c, name in compression.CODECS.items()}[codec_name]
+        if codec == compression.ZSTD and not compression.zstd_available():
+            raise CommandError("zstd dictionaries need the 'zstd' extra (zstandard)")
+
+        ids = list(Transcript.objects.exclude(timecoded="").values_list("id", flat=True))
+        if not ids:
+            raise CommandError("No transcripts to train on")
+        sample = random.sample(ids, min(len(ids), options["samples"]))
+        texts = [t.timecoded for t in Transcript.objects.filter(id__in=sample).only("id", "timecoded")]
+        data = compression.train(texts, codec)
+        dictionary = CompressionDictionary.objects.create(codec=codec, data=data)
+        compression.reset()
+        self.stdout.write(f"Trained {codec_name} dictionary {dictionary.id} ({len(data)} bytes) from {len(texts)} transcripts")
+
+        if options["recompress"]:
+            before = self._stored_size()
+            for start in range(0, len(ids), BATCH):
+                # Saving the decoded text re-encodes it with the current dictionary
+                batch = list(Transcript.objects.filter(id__in=ids[start:start + BATCH]).only("id", "timecoded"))
+                Transcript.objects.bulk_update(batch, ["timecoded"])
+            self.stdout.write(f"Recompressed {len(ids)} transcripts: {before} -> {self._stored_size()} bytes")
+
+        self.stdout.write(self.style.SUCCESS("Done."))
+
+    def _stored_size(self):
+        return Transcript.objects.aggregate(size=Sum(Length("timecoded")))["size"] or 0
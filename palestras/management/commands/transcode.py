@@ -0,0 +1,108 @@
+import os
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from pathlib import Path
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from palestras import renditions
+from palestras.audio_download import AUDIOS_DIR, file_sha256
+from palestras.caching import bump_data_version
+from palestras.models import AudioTrack
+
+
+class Command(BaseCommand):
+    help = "Transcode downloaded audio into low-bitrate Opus and HLS renditions with a pool of ffmpeg workers"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--workers", type=int, default=max(1, (os.cpu_count() or 2) // 2),
+            help="Parallel ffmpeg workers (default: half the CPUs)",
+        )
+        parser.add_argument(
+            "--limit", type=int, default=0, help="Max audios to transcode (0 = all)"
+        )
+        parser.add_argument(
+            "--opus-bitrate", default=renditions.OPUS_BITRATE, help="Opus bitrate (default: %(default)s)"
+        )
+        parser.add_argument(
+            "--hls-bitrates", default=",".join(renditions.HLS_BITRATES),
+            help="Comma-separated HLS (AAC) variant bitrates, one rung each (default: %(default)s)",
+        )
+        parser.add_argument(
+            "--force", action="store_true", help="Transcode again audios that already have renditions"
+        )
+
+    def handle(self, *args, **options):
+        # Group the downloaded tracks by audio: each distinct audio is transcoded once
+        audios = {}
+        for track in AudioTrack.objects.exclude(local_path=None).exclude(local_path="").only(
+            "id", "local_path", "audio_sha256", "renditions"
+        ).order_by("id"):
+            path = AUDIOS_DIR / Path(track.local_path.name).name
+            if not path.exists():
+                continue
+            if not track.audio_sha256:
+                track.audio_sha256 = file_sha256(path)
+                track.save(update_fields=["audio_sha256", "updated_on"])
+            audios.setdefault(track.audio_sha256, (path, []))[1].append(track)
+
+        hls_bitrates = [bitrate.strip() for bitrate in options["hls_bitrates"].split(",") if bitrate.strip()]
+        pending = {}
+        linked = 0
+        for sha, (path, tracks) in audios.items():
+            made = renditions.existing(sha)
+            if made.keys() == renditions.FILES.keys() and not options["force"]:
+                linked += self._record(tracks, made)
+            else:
+                pending[sha] = (path, tracks)
+        if options["limit"]:
+            pending = dict(list(pending.items())[:options["limit"]])
+        self.stdout.write(
+            f"{len(pending)} audios to transcode ({len(audios) - len(pending)} already done), "
+            f"{options['workers']} workers"
+        )
+
+        done = errors = 0
+        original_bytes = opus_bytes = 0
+        with ProcessPoolExecutor(max_workers=options["workers"]) as pool:
+            futures = {
+                pool.submit(renditions.transcode, path, sha, options["opus_bitrate"], hls_bitrates): sha
+                for sha, (path, _) in pending.items()
+            }
+            for future in as_completed(futures):
+                sha = futures[future]
+                path, tracks = pending[sha]
+                try:
+                    made = future.result()
+                except Exception as e:
+                    errors += 1
+                    self.stderr.write(f"  Error ({path.name}): {e}")
+                    continue
+                done += 1
+                linked += self._record(tracks, made)
+                size = path.stat().st_size
+                opus_size = (renditions.RENDITIONS_DIR / sha / renditions.FILES["opus"]).stat().st_size
+                original_bytes += size
+                opus_bytes += opus_size
+                self.stdout.write(
+                    f"  [{done + errors}/{len(pending)}] {path.name}: "
+                    f"{size / (1024 * 1024):.1f} MB -> {opus_size / (1024 * 1024):.1f} MB opus"
+                )
+
+        if linked:
+            bump_data_version()  # bulk writes skip the model signals
+        saving = f" (opus is {opus_bytes / original_bytes:.0%} of the originals)" if original_bytes else ""
+        self.stdout.write(self.style.SUCCESS(
+            f"Done. Transcoded {done}, errors {errors}; {linked} tracks got renditions{saving}"
+        ))
+
+    def _record(self, tracks, made):
+        """Store the renditions on the tracks missing them; returns how many changed."""
+        changed = [track for track in tracks if track.renditions != made]
+        now = timezone.now()  # bulk_update skips auto_now
+        for track in changed:
+            track.renditions = made
+            track.updated_on = now
+        AudioTrack.objects.bulk_update(changed, ["renditions", "updated_on"])
+        return len(changed)
@@ -67,6 +67,31 @@ class Command(BaseCommand):
             action="store_true",
             help="Re-transcribe tracks done with a different method",
         )
+        parser.add_argument(
+            "--write-files",
+            action="store_true",
+            help="Also write .txt and .timecoded.txt copies to transcriptions/",
+        )
+
+    def _reuse_transcript(self, track, method, retranscribe):
+        """Link track to the transcript of another track with the same audio, if there is one."""
+        if not track.audio_sha256:
+            return False
+        siblings = (
+            AudioTrack.objects.filter(audio_sha256=track.audio_sha256, transcribed_on__isnull=False)
+            .exclude(transcript=None)
+            .exclude(id=track.id)
+        )
+        if retranscribe:
+            siblings = siblings.filter(transcription_method=method)
+        sibling = siblings.first()
+        if sibling is None:
+            return False
+        track.transcript_id = sibling.transcript_id
+        track.transcription_method = sibling.transcription_method
+        track.transcribed_on = sibling.transcribed_on
+        track.save()
+        return True
 
     def _resolve_mlx_model(self, model_name):
         """Map short model names to MLX HF repos, pass through full repo names."""
@@ -321,11 +346,17 @@ class Command(BaseCommand):
         else:
             self.stdout.write(f"Using mlx-whisper with model {model_name}")
 
-        TRANSCRIPTIONS_DIR.mkdir(exist_ok=True)
+        write_files = options["write_files"]
+        if write_files:
+            TRANSCRIPTIONS_DIR.mkdir(exist_ok=True)
 
         for i, track in enumerate(pending, 1):
             self.stdout.write(f"[{i}/{len(pending)}] {track.name}")
 
+            if self._reuse_transcript(track, method, retranscribe):
+                tqdm.write(f"{track.name} — same audio as an already transcribed track, reused")
+                continue
+
             audio_path = Path(track.local_path.path)
             if not audio_path.exists():
                 tqdm.write(f"File not found: {audio_path}")
@@ -357,18 +388,17 @@ class Command(BaseCommand):
                 tqdm.write(f"Error on {track.name}: {e}")
                 continue
 
-            track.transcription = plain_text
-            track.transcription_timecoded = timecoded_text
+            track.set_transcript(plain_text, timecoded_text)
             track.transcription_method = method
             track.transcribed_on = timezone.now()
             track.save()
 
-            # Save to text files
-            txt_name = audio_path.stem + ".txt"
-            txt_path = TRANSCRIPTIONS_DIR / txt_name
-            txt_path.write_text(plain_text, encoding="utf-8")
-            tc_path = TRANSCRIPTIONS_DIR / (audio_path.stem + ".timecoded.txt")
-            tc_path.write_text(timecoded_text, encoding="utf-8")
+            if write_files:
+                txt_name = audio_path.stem + ".txt"
+                txt_path = TRANSCRIPTIONS_DIR / txt_name
+                txt_path.write_text(plain_text, encoding="utf-8")
+                tc_path = TRANSCRIPTIONS_DIR / (audio_path.stem + ".timecoded.txt")
+                tc_path.write_text(timecoded_text, encoding="utf-8")
 
             words = len(plain_text.split())
             tqdm.write(f"{track.name} — {duration_secs:.0f}s audio, {words} words")
@@ -39,7 +39,7 @@ class Command(BaseCommand):
 
         with httpx.Client(timeout=30, follow_redirects=True) as client:
             for i, track in enumerate(tracks, 1):
-                filename = track.mp3_url.rstrip("/").split("/")[-1]
+                filename = Path(track.local_path.name).name
                 local = AUDIOS_DIR / filename
 
                 if not local.exists():
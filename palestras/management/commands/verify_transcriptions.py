@@ -1,4 +1,3 @@
-import re
 import subprocess
 from pathlib import Path
 
@@ -6,8 +5,7 @@ from django.conf import settings
 from django.core.management.base import BaseCommand
 
 from palestras.models import AudioTrack
-
-TIMESTAMP_RE = re.compile(r"^\[(\d{2}):(\d{2}):(\d{2})\]\s*(.*)")
+from palestras.transcripts import parse_timecoded
 
 # Thresholds
 TRUNCATION_RATIO = 0.80       # last timestamp < 80% of audio duration → truncated
@@ -16,17 +14,6 @@ MIN_WORDS_PER_MINUTE = 15     # below this → suspiciously sparse
 GAP_THRESHOLD_SECS = 300      # gap > 5min between consecutive segments → flagged
 
 
-def _parse_timecoded(text):
-    """Return list of (start_secs, text) from timecoded transcription."""
-    segments = []
-    for line in text.splitlines():
-        m = TIMESTAMP_RE.match(line)
-        if m:
-            h, mi, s, txt = int(m.group(1)), int(m.group(2)), int(m.group(3)), m.group(4)
-            segments.append((h * 3600 + mi * 60 + s, txt))
-    return segments
-
-
 def _audio_duration(path):
     """Return audio duration in seconds via ffprobe, or None on failure."""
     try:
@@ -72,7 +59,7 @@ class Command(BaseCommand):
         method_filter = options["method"]
         skip_ffprobe = options["no_ffprobe"]
 
-        qs = AudioTrack.objects.filter(transcribed_on__isnull=False).select_related("palestra")
+        qs = AudioTrack.objects.filter(transcribed_on__isnull=False).select_related("palestra", "transcript")
         if method_filter:
             qs = qs.filter(transcription_method__icontains=method_filter)
         if limit:
@@ -96,16 +83,18 @@ class Command(BaseCommand):
 
         for i, track in enumerate(tracks, 1):
             track_issues = []
+            text = track.transcript.text if track.transcript else ""
+            timecoded = track.transcript.timecoded if track.transcript else ""
 
             # 1. Empty transcription
-            if not track.transcription.strip():
+            if not text.strip():
                 track_issues.append("empty_transcription")
                 issues["empty_transcription"].append(track)
 
             # 2. No timecoded text
             if (
-                track.transcription.strip()
-                and not track.transcription_timecoded.strip()
+                text.strip()
+                and not timecoded.strip()
             ):
                 track_issues.append("no_timecoded")
                 issues["no_timecoded"].append(track)
@@ -120,7 +109,7 @@ class Command(BaseCommand):
                     audio_path = None
 
             # Parse timecoded segments for remaining checks
-            segments = _parse_timecoded(track.transcription_timecoded) if track.transcription_timecoded else []
+            segments = parse_timecoded(timecoded) if timecoded else []
 
             if segments:
                 times = [s for s, _ in segments]
@@ -153,7 +142,7 @@ class Command(BaseCommand):
 
                 # 7. Low word density (words per minute)
                 if last_ts > 0:
-                    word_count = len(track.transcription.split())
+                    word_count = len(text.split())
                     wpm = word_count / (last_ts / 60)
                     if wpm < MIN_WORDS_PER_MINUTE:
                         track_issues.append("low_word_density")
@@ -0,0 +1,26 @@
+# Generated by Django 6.1.2 on 2026-10-19 02:46
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('palestras', '0009_palestra_language'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RelatedPalestra',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('score', models.FloatField()),
+                ('palestra', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='related_links', to='palestras.palestra')),
+                ('related', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='palestras.palestra')),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('palestra', 'related'), name='unique_related_palestra')],
+            },
+        ),
+    ]
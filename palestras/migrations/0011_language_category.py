@@ -0,0 +1,40 @@
+# Generated by Django 6.1.2 on 2026-10-19 02:50
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('palestras', '0010_relatedpalestra'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Category',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=255, unique=True)),
+            ],
+            options={
+                'verbose_name_plural': 'categories',
+            },
+        ),
+        migrations.CreateModel(
+            name='Language',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=100, unique=True)),
+            ],
+        ),
+        migrations.AddField(
+            model_name='palestra',
+            name='category_terms',
+            field=models.ManyToManyField(blank=True, to='palestras.category'),
+        ),
+        migrations.AddField(
+            model_name='palestra',
+            name='languages',
+            field=models.ManyToManyField(blank=True, to='palestras.language'),
+        ),
+    ]
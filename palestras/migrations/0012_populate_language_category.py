@@ -0,0 +1,45 @@
+from django.db import migrations
+
+
+def _split(value):
+    return [item.strip() for item in value.split(",") if item.strip()] if value else []
+
+
+def populate(apps, schema_editor):
+    Palestra = apps.get_model("palestras", "Palestra")
+    Language = apps.get_model("palestras", "Language")
+    Category = apps.get_model("palestras", "Category")
+
+    languages = {}
+    categories = {}
+    language_links = []
+    category_links = []
+    for pid, language, cats in Palestra.objects.values_list("id", "language", "categories").iterator():
+        for name in _split(language):
+            if name not in languages:
+                languages[name] = Language.objects.get_or_create(name=name)[0].id
+            language_links.append(Palestra.languages.through(palestra_id=pid, language_id=languages[name]))
+        for name in _split(cats):
+            if name not in categories:
+                categories[name] = Category.objects.get_or_create(name=name)[0].id
+            category_links.append(Palestra.category_terms.through(palestra_id=pid, category_id=categories[name]))
+
+    Palestra.languages.through.objects.bulk_create(language_links, ignore_conflicts=True)
+    Palestra.category_terms.through.objects.bulk_create(category_links, ignore_conflicts=True)
+
+
+def unpopulate(apps, schema_editor):
+    Palestra = apps.get_model("palestras", "Palestra")
+    Palestra.languages.through.objects.all().delete()
+    Palestra.category_terms.through.objects.all().delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('palestras', '0011_language_category'),
+    ]
+
+    operations = [
+        migrations.RunPython(populate, unpopulate),
+    ]
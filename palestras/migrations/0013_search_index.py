@@ -0,0 +1,28 @@
+from django.db import migrations
+
+from palestras import search_index
+
+# Layout at the time of this migration; search_index.INDEXES has changed since
+INDEXES = {
+    "palestra_fts": ("palestras_palestra", ("title", "description", "categories", "tags")),
+    "track_fts": ("palestras_audiotrack", ("name", "transcription")),
+}
+
+
+def install(apps, schema_editor):
+    search_index.install(schema_editor, INDEXES)
+
+
+def uninstall(apps, schema_editor):
+    search_index.uninstall(schema_editor, INDEXES)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("palestras", "0012_populate_language_category"),
+    ]
+
+    operations = [
+        migrations.RunPython(install, uninstall),
+    ]
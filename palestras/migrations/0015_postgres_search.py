@@ -0,0 +1,33 @@
+from django.db import migrations
+
+from palestras import search_index
+
+# Layout at the time of this migration; search_index has changed since
+DOCUMENTS = {
+    "palestra": ("palestras_palestra", {"title": "A", "description": "B", "categories": "C", "tags": "C"}),
+    "track": ("palestras_audiotrack", {"name": "A", "transcription": "B"}),
+}
+TRIGRAM_COLUMNS = {
+    "palestras_palestra": ("title", "description", "categories", "tags"),
+    "palestras_audiotrack": ("name", "transcription"),
+    "palestras_author": ("name",),
+}
+
+
+def install(apps, schema_editor):
+    search_index.install_postgres(schema_editor, DOCUMENTS, TRIGRAM_COLUMNS)
+
+
+def uninstall(apps, schema_editor):
+    search_index.uninstall_postgres(schema_editor, DOCUMENTS, TRIGRAM_COLUMNS)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("palestras", "0014_search_vocabulary"),
+    ]
+
+    operations = [
+        migrations.RunPython(install, uninstall),
+    ]
@@ -0,0 +1,41 @@
+# Generated by Django 6.1.2 on 2026-10-19 03:09
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('palestras', '0015_postgres_search'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='audiotrack',
+            index=models.Index(fields=['transcribed_on'], name='track_transcribed_on_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='audiotrack',
+            index=models.Index(fields=['local_path'], name='track_local_path_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='audiotrack',
+            index=models.Index(fields=['transcription_method'], name='track_method_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='audiotrack',
+            index=models.Index(condition=models.Q(('transcription', ''), _negated=True), fields=['palestra'], name='track_transcribed_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='audiotrack',
+            index=models.Index(condition=models.Q(('transcription_timecoded', ''), _negated=True), fields=['palestra'], name='track_timecoded_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='audiotrack',
+            index=models.Index(condition=models.Q(('concepts', [])), fields=['transcribed_on'], name='track_no_concepts_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='palestra',
+            index=models.Index(fields=['scraped_on'], name='palestra_scraped_on_idx'),
+        ),
+    ]
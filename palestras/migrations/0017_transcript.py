@@ -0,0 +1,127 @@
+# Generated by Django 6.1.2 on 2026-10-19 03:12
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.db.models import Q
+
+from palestras import search_index
+
+# Search layout before this migration (see 0013 and 0015)
+OLD_INDEXES = {
+    "palestra_fts": ("palestras_palestra", ("title", "description", "categories", "tags")),
+    "track_fts": ("palestras_audiotrack", ("name", "transcription")),
+}
+OLD_DOCUMENTS = {
+    "palestra": ("palestras_palestra", {"title": "A", "description": "B", "categories": "C", "tags": "C"}),
+    "track": ("palestras_audiotrack", {"name": "A", "transcription": "B"}),
+}
+OLD_TRIGRAM_COLUMNS = {
+    "palestras_palestra": ("title", "description", "categories", "tags"),
+    "palestras_audiotrack": ("name", "transcription"),
+    "palestras_author": ("name",),
+}
+BATCH = 500
+
+
+def move_transcripts(apps, schema_editor):
+    AudioTrack = apps.get_model("palestras", "AudioTrack")
+    Transcript = apps.get_model("palestras", "Transcript")
+    tracks = AudioTrack.objects.exclude(Q(transcription="") & Q(transcription_timecoded="") & Q(concepts=[]))
+    ids = list(tracks.order_by("id").values_list("id", flat=True))
+    for start in range(0, len(ids), BATCH):
+        batch = list(AudioTrack.objects.filter(id__in=ids[start:start + BATCH]))
+        transcripts = Transcript.objects.bulk_create(
+            Transcript(text=t.transcription, timecoded=t.transcription_timecoded, concepts=t.concepts) for t in batch
+        )
+        for track, transcript in zip(batch, transcripts):
+            track.transcript = transcript
+        AudioTrack.objects.bulk_update(batch, ["transcript"])
+
+
+def restore_transcripts(apps, schema_editor):
+    AudioTrack = apps.get_model("palestras", "AudioTrack")
+    tracks = list(AudioTrack.objects.exclude(transcript=None).select_related("transcript"))
+    for track in tracks:
+        track.transcription = track.transcript.text
+        track.transcription_timecoded = track.transcript.timecoded
+        track.concepts = track.transcript.concepts
+    AudioTrack.objects.bulk_update(tracks, ["transcription", "transcription_timecoded", "concepts"], batch_size=BATCH)
+
+
+def uninstall_old_search(apps, schema_editor):
+    search_index.uninstall(schema_editor, OLD_INDEXES)
+    search_index.uninstall_postgres(schema_editor, OLD_DOCUMENTS, OLD_TRIGRAM_COLUMNS)
+
+
+def install_old_search(apps, schema_editor):
+    search_index.install(schema_editor, OLD_INDEXES)
+    search_index.install_postgres(schema_editor, OLD_DOCUMENTS, OLD_TRIGRAM_COLUMNS)
+
+
+def install_search(apps, schema_editor):
+    search_index.install(schema_editor)
+    search_index.install_postgres(schema_editor)
+
+
+def uninstall_search(apps, schema_editor):
+    search_index.uninstall(schema_editor)
+    search_index.uninstall_postgres(schema_editor)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('palestras', '0016_status_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Transcript',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('text', models.TextField(blank=True)),
+                ('timecoded', models.TextField(blank=True)),
+                ('concepts', models.JSONField(blank=True, default=list)),
+            ],
+        ),
+        migrations.RemoveIndex(
+            model_name='audiotrack',
+            name='track_transcribed_idx',
+        ),
+        migrations.RemoveIndex(
+            model_name='audiotrack',
+            name='track_timecoded_idx',
+        ),
+        migrations.RemoveIndex(
+            model_name='audiotrack',
+            name='track_no_concepts_idx',
+        ),
+        migrations.AddIndex(
+            model_name='transcript',
+            index=models.Index(condition=models.Q(('timecoded', ''), _negated=True), fields=['id'], name='transcript_timecoded_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='transcript',
+            index=models.Index(condition=models.Q(('concepts', [])), fields=['id'], name='transcript_no_concepts_idx'),
+        ),
+        migrations.AddField(
+            model_name='audiotrack',
+            name='transcript',
+            field=models.OneToOneField(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='track', to='palestras.transcript'),
+        ),
+        migrations.RunPython(move_transcripts, restore_transcripts),
+        migrations.RunPython(uninstall_old_search, install_old_search),
+        migrations.RemoveField(
+            model_name='audiotrack',
+            name='concepts',
+        ),
+        migrations.RemoveField(
+            model_name='audiotrack',
+            name='transcription',
+        ),
+        migrations.RemoveField(
+            model_name='audiotrack',
+            name='transcription_timecoded',
+        ),
+        migrations.RunPython(install_search, uninstall_search),
+    ]
@@ -0,0 +1,77 @@
+# Generated by Django 6.1.2 on 2026-10-19 03:17
+
+import palestras.compression
+from django.db import migrations, models
+
+from palestras import search_index
+
+BATCH = 500
+
+
+def compress_timecoded(apps, schema_editor):
+    Transcript = apps.get_model("palestras", "Transcript")
+    ids = list(Transcript.objects.exclude(timecoded_plain="").order_by("id").values_list("id", flat=True))
+    for start in range(0, len(ids), BATCH):
+        batch = list(Transcript.objects.filter(id__in=ids[start:start + BATCH]))
+        for transcript in batch:
+            transcript.timecoded = transcript.timecoded_plain
+        Transcript.objects.bulk_update(batch, ["timecoded"])
+
+
+def decompress_timecoded(apps, schema_editor):
+    Transcript = apps.get_model("palestras", "Transcript")
+    ids = list(Transcript.objects.exclude(timecoded=b"").order_by("id").values_list("id", flat=True))
+    for start in range(0, len(ids), BATCH):
+        batch = list(Transcript.objects.filter(id__in=ids[start:start + BATCH]))
+        for transcript in batch:
+            transcript.timecoded_plain = transcript.timecoded
+        Transcript.objects.bulk_update(batch, ["timecoded_plain"])
+
+
+def install_search(apps, schema_editor):
+    # Remaking palestras_transcript on SQLite drops the transcript_fts triggers, both ways
+    search_index.install(schema_editor)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('palestras', '0017_transcript'),
+    ]
+
+    operations = [
+        migrations.RunPython(migrations.RunPython.noop, install_search),
+        migrations.CreateModel(
+            name='CompressionDictionary',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('codec', models.PositiveSmallIntegerField(choices=[(1, 'zlib'), (2, 'zstd')])),
+                ('data', models.BinaryField()),
+                ('trained_on', models.DateTimeField(auto_now_add=True)),
+            ],
+        ),
+        migrations.RemoveIndex(
+            model_name='transcript',
+            name='transcript_timecoded_idx',
+        ),
+        migrations.RenameField(
+            model_name='transcript',
+            old_name='timecoded',
+            new_name='timecoded_plain',
+        ),
+        migrations.AddField(
+            model_name='transcript',
+            name='timecoded',
+            field=palestras.compression.CompressedTextField(blank=True, default=b''),
+        ),
+        migrations.RunPython(compress_timecoded, decompress_timecoded),
+        migrations.RemoveField(
+            model_name='transcript',
+            name='timecoded_plain',
+        ),
+        migrations.AddIndex(
+            model_name='transcript',
+            index=models.Index(condition=models.Q(('timecoded', ''), _negated=True), fields=['id'], name='transcript_timecoded_idx'),
+        ),
+        migrations.RunPython(install_search, migrations.RunPython.noop),
+    ]
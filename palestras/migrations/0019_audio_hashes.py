@@ -0,0 +1,60 @@
+# Generated by Django 6.1.2 on 2026-10-19 03:23
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+from palestras import search_index
+
+
+def install_search(apps, schema_editor):
+    # Remaking palestras_audiotrack on SQLite drops the track_fts triggers, both ways
+    search_index.install(schema_editor)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('palestras', '0018_compressed_transcripts'),
+    ]
+
+    operations = [
+        migrations.RunPython(migrations.RunPython.noop, install_search),
+        migrations.AddField(
+            model_name='audiotrack',
+            name='audio_etag',
+            field=models.CharField(blank=True, max_length=200),
+        ),
+        migrations.AddField(
+            model_name='audiotrack',
+            name='audio_sha256',
+            field=models.CharField(blank=True, max_length=64),
+        ),
+        migrations.AddField(
+            model_name='audiotrack',
+            name='audio_size',
+            field=models.BigIntegerField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='transcript',
+            name='audio_sha256',
+            field=models.CharField(blank=True, max_length=64),
+        ),
+        migrations.AlterField(
+            model_name='audiotrack',
+            name='transcript',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='tracks', to='palestras.transcript'),
+        ),
+        migrations.AddIndex(
+            model_name='audiotrack',
+            index=models.Index(fields=['audio_sha256'], name='track_audio_sha256_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='audiotrack',
+            index=models.Index(fields=['audio_etag', 'audio_size'], name='track_audio_etag_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='transcript',
+            constraint=models.UniqueConstraint(condition=models.Q(('audio_sha256', ''), _negated=True), fields=('audio_sha256',), name='transcript_audio_sha256_uniq'),
+        ),
+        migrations.RunPython(install_search, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,49 @@
+# Generated by Django 6.1.2 on 2026-10-19 03:28
+
+from django.db import migrations, models
+
+from palestras import search_index
+
+
+def install_search(apps, schema_editor):
+    # Adding a NOT NULL column remakes the tables on SQLite, which drops the FTS triggers
+    search_index.install(schema_editor)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('palestras', '0019_audio_hashes'),
+    ]
+
+    operations = [
+        migrations.RunPython(migrations.RunPython.noop, install_search),
+        migrations.AddField(
+            model_name='audiotrack',
+            name='updated_on',
+            field=models.DateTimeField(auto_now=True),
+        ),
+        migrations.AddField(
+            model_name='palestra',
+            name='updated_on',
+            field=models.DateTimeField(auto_now=True),
+        ),
+        migrations.AddField(
+            model_name='transcript',
+            name='updated_on',
+            field=models.DateTimeField(auto_now=True),
+        ),
+        migrations.AddIndex(
+            model_name='audiotrack',
+            index=models.Index(fields=['updated_on'], name='track_updated_on_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='palestra',
+            index=models.Index(fields=['updated_on'], name='palestra_updated_on_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='transcript',
+            index=models.Index(fields=['updated_on'], name='transcript_updated_on_idx'),
+        ),
+        migrations.RunPython(install_search, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,27 @@
+# Generated by Django 6.1.2 on 2026-10-19 03:36
+
+from django.db import migrations, models
+
+from palestras import search_index
+
+
+def install_search(apps, schema_editor):
+    # Remaking palestras_audiotrack on SQLite drops the track_fts triggers, both ways
+    search_index.install(schema_editor)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('palestras', '0020_updated_on'),
+    ]
+
+    operations = [
+        migrations.RunPython(migrations.RunPython.noop, install_search),
+        migrations.AddField(
+            model_name='audiotrack',
+            name='renditions',
+            field=models.JSONField(blank=True, default=dict),
+        ),
+        migrations.RunPython(install_search, migrations.RunPython.noop),
+    ]
@@ -1,5 +1,7 @@
 from django.db import models
 
+from .compression import CODECS, CompressedTextField
+
 
 class Author(models.Model):
     name = models.CharField(max_length=255)
@@ -11,6 +13,23 @@ class Author(models.Model):
         return self.name
 
 
+class Language(models.Model):
+    name = models.CharField(max_length=100, unique=True)
+
+    def __str__(self):
+        return self.name
+
+
+class Category(models.Model):
+    name = models.CharField(max_length=255, unique=True)
+
+    class Meta:
+        verbose_name_plural = "categories"
+
+    def __str__(self):
+        return self.name
+
+
 class Palestra(models.Model):
     title = models.CharField(max_length=500, blank=True)
     slug = models.SlugField(max_length=500, unique=True)
@@ -24,12 +43,60 @@ class Palestra(models.Model):
     media_format = models.CharField(max_length=100, blank=True)
     language = models.CharField(max_length=100, blank=True)
     authors = models.ManyToManyField(Author, blank=True)
+    languages = models.ManyToManyField(Language, blank=True)
+    category_terms = models.ManyToManyField(Category, blank=True)
     scraped_on = models.DateTimeField(null=True, blank=True)
+    # High-water mark of the sync commands; bulk writes must set it themselves
+    updated_on = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["scraped_on"], name="palestra_scraped_on_idx"),
+            models.Index(fields=["updated_on"], name="palestra_updated_on_idx"),
+        ]
 
     def __str__(self):
         return self.title or self.slug
 
 
+class CompressionDictionary(models.Model):
+    """Shared dictionary the compressed transcript columns are encoded against."""
+    codec = models.PositiveSmallIntegerField(choices=CODECS.items())
+    data = models.BinaryField()
+    trained_on = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return f"{self.get_codec_display()} dictionary {self.id}"
+
+
+class Transcript(models.Model):
+    """
+    Transcript content, kept out of the audiotrack row so track listings stay
+    light. Tracks with the same audio (by sha256) share one transcript.
+    """
+    audio_sha256 = models.CharField(max_length=64, blank=True)
+    # Plain text stays uncompressed: it is the document the full-text indexes read in the database
+    text = models.TextField(blank=True)
+    timecoded = CompressedTextField(blank=True, default=b"")
+    concepts = models.JSONField(default=list, blank=True)
+    updated_on = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=["audio_sha256"], condition=~models.Q(audio_sha256=""), name="transcript_audio_sha256_uniq"
+            ),
+        ]
+        indexes = [
+            models.Index(fields=["id"], condition=~models.Q(timecoded=""), name="transcript_timecoded_idx"),
+            models.Index(fields=["id"], condition=models.Q(concepts=[]), name="transcript_no_concepts_idx"),
+            models.Index(fields=["updated_on"], name="transcript_updated_on_idx"),
+        ]
+
+    def __str__(self):
+        return self.text[:80]
+
+
 class AudioTrack(models.Model):
     palestra = models.ForeignKey(
         Palestra, on_delete=models.CASCADE, related_name="tracks"
@@ -37,11 +104,60 @@ class AudioTrack(models.Model):
     name = models.CharField(max_length=500)
     mp3_url = models.URLField(max_length=500)
     local_path = models.FileField(upload_to="audios", max_length=500, blank=True, null=True)
-    transcription = models.TextField(blank=True)
-    transcription_timecoded = models.TextField(blank=True)
+    audio_sha256 = models.CharField(max_length=64, blank=True)
+    audio_etag = models.CharField(max_length=200, blank=True)
+    audio_size = models.BigIntegerField(null=True, blank=True)
+    transcript = models.ForeignKey(
+        Transcript, on_delete=models.SET_NULL, null=True, blank=True, related_name="tracks"
+    )
     transcription_method = models.CharField(max_length=100, blank=True)
     transcribed_on = models.DateTimeField(null=True, blank=True)
-    concepts = models.JSONField(default=list, blank=True)
+    # Streaming copies made by the transcode command: kind -> media-relative path
+    renditions = models.JSONField(default=dict, blank=True)
+    updated_on = models.DateTimeField(auto_now=True)
+
+    def set_transcript(self, text, timecoded):
+        """Store the texts in the track's Transcript, creating it if missing; the track still needs saving."""
+        transcript = self.transcript
+        if transcript is None and self.audio_sha256:
+            transcript = Transcript.objects.filter(audio_sha256=self.audio_sha256).first()
+        if transcript is None:
+            transcript = Transcript(audio_sha256=self.audio_sha256)
+        transcript.text = text
+        transcript.timecoded = timecoded
+        transcript.save()
+        self.transcript = transcript
+
+    class Meta:
+        indexes = [
+            # Status predicates of the transcribe/download/stats commands and admin filters.
+            # Whether a track is transcribed is answered by the index on transcript_id.
+            models.Index(fields=["transcribed_on"], name="track_transcribed_on_idx"),
+            models.Index(fields=["local_path"], name="track_local_path_idx"),
+            models.Index(fields=["transcription_method"], name="track_method_idx"),
+            # Content-addressed lookups of already downloaded audio
+            models.Index(fields=["audio_sha256"], name="track_audio_sha256_idx"),
+            models.Index(fields=["audio_etag", "audio_size"], name="track_audio_etag_idx"),
+            models.Index(fields=["updated_on"], name="track_updated_on_idx"),
+        ]
 
     def __str__(self):
         return self.name
+
+
+class RelatedPalestra(models.Model):
+    palestra = models.ForeignKey(
+        Palestra, on_delete=models.CASCADE, related_name="related_links"
+    )
+    related = models.ForeignKey(
+        Palestra, on_delete=models.CASCADE, related_name="+"
+    )
+    score = models.FloatField()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=["palestra", "related"], name="unique_related_palestra"),
+        ]
+
+    def __str__(self):
+        return f"{self.palestra} -> {self.related}"
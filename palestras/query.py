@@ -0,0 +1,182 @@
+"""
+Search query language.
+
+    meditação cristo        every word, as a word prefix, in any searched field
+    "trigueirinho netto"    exact phrase
+    medit*                  explicit word prefix
+    -carma                  exclude palestras matching the term
+    title:luz author:netto  restrict a term to one field
+
+In fuzzy mode each single-word term also matches the close vocabulary words
+found by the fuzzy module.
+
+parse() turns the query into clauses once; plan() compiles them into filter
+conditions ordered so the most selective ones run first, each answered from
+the full-text indexes in search_index (or UNACCENT LIKE scans elsewhere).
+"""
+import re
+from typing import NamedTuple
+
+from django.db import connection
+from django.db.models import BooleanField, Exists, OuterRef, Q
+from django.db.models.expressions import RawSQL
+
+from . import fuzzy, search_index
+from .db_functions import strip_accents
+from .models import Palestra
+
+# query field -> (search_index document, column); None for fields outside the full-text indexes
+FIELDS = {
+    "title": ("palestra", "title"),
+    "description": ("palestra", "description"),
+    "categories": ("palestra", "categories"),
+    "tags": ("palestra", "tags"),
+    "track_name": ("track", "name"),
+    "transcriptions": ("transcript", "text"),
+    "author": None,
+}
+ALIASES = {"track": "track_name", "transcription": "transcriptions", "category": "categories", "tag": "tags"}
+
+# Fallback lookups when the FTS indexes are not available
+LIKE_LOOKUPS = {
+    "title": "title__unaccent_icontains",
+    "description": "description__unaccent_icontains",
+    "categories": "categories__unaccent_icontains",
+    "tags": "tags__unaccent_icontains",
+    "track_name": "tracks__name__unaccent_icontains",
+    "transcriptions": "tracks__transcript__text__unaccent_icontains",
+}
+
+CLAUSE_RE = re.compile(r'(-)?(?:([a-z_]+):)?(?:"([^"]*)"?|([^\s"]+))')
+WORD_RE = re.compile(r"\w+")
+
+
+class Clause(NamedTuple):
+    text: str
+    field: str | None = None
+    phrase: bool = False
+    negated: bool = False
+    alternatives: tuple = ()
+
+
+def parse(query):
+    """Split a query string into clauses; syntax that doesn't parse is searched as plain words."""
+    clauses = []
+    for negated, field, quoted, bare in CLAUSE_RE.findall(query):
+        field = ALIASES.get(field, field)
+        if field and field not in FIELDS:
+            bare = f"{field}:{quoted or bare}"
+            field = ""
+        text = (quoted if quoted else bare.rstrip("*")).strip()
+        if not WORD_RE.search(text):
+            continue
+        clauses.append(Clause(text, field or None, phrase=bool(quoted), negated=bool(negated)))
+    return clauses
+
+
+def terms(clauses):
+    """The texts of the positive clauses and their alternatives, for snippets and highlighting."""
+    return [text for c in clauses if not c.negated for text in (c.text, *c.alternatives)]
+
+
+def expand_fuzzy(clauses):
+    """
+    Add close vocabulary words as alternatives to the single-word clauses.
+    Returns the new clauses and {term: [alternatives]} for the terms that got any.
+    """
+    folded = {c: strip_accents(c.text) for c in clauses if not c.phrase and WORD_RE.fullmatch(c.text)}
+    expansions = fuzzy.expand(set(folded.values()))
+    expanded = [
+        c._replace(alternatives=tuple(expansions[folded[c]])) if folded.get(c) in expansions else c
+        for c in clauses
+    ]
+    return expanded, expansions
+
+
+def _selectivity(clause):
+    """Rough guess of how few rows a clause matches: phrases and long words first."""
+    words = WORD_RE.findall(clause.text)
+    return (clause.negated, -(len(words) * 4 + len(clause.text) + (8 if clause.field else 0)))
+
+
+def _author_condition(clause):
+    names = Q()
+    for text in (clause.text, *clause.alternatives):
+        names |= Q(author__name__unaccent_icontains=text)
+    return Q(Exists(Palestra.authors.through.objects.filter(names, palestra_id=OuterRef("pk"))))
+
+
+def _fts_condition(clause, fields):
+    by_document = {}
+    for name in fields:
+        if FIELDS[name]:
+            document, column = FIELDS[name]
+            by_document.setdefault(document, []).append(column)
+    words = WORD_RE.findall(strip_accents(clause.text))
+    condition = Q()
+    for document, columns in by_document.items():
+        expression = search_index.match_expression(
+            connection, document, columns, words, clause.phrase, clause.alternatives
+        )
+        condition |= Q(id__in=RawSQL(search_index.match_subquery(connection, document), [expression]))
+    return condition
+
+
+def _stopwords_only(clause):
+    """
+    True when the clause has only words the full-text config drops ("o",
+    "do"): its tsquery is empty and would match nothing, so it is ignored.
+    """
+    words = WORD_RE.findall(strip_accents(clause.text))
+    expression = search_index.match_expression(
+        connection, "palestra", ["title"], words, clause.phrase, clause.alternatives
+    )
+    return Q(RawSQL(search_index.EMPTY_QUERY[connection.vendor], [expression], output_field=BooleanField()))
+
+
+def _like_condition(clause, fields):
+    condition = Q()
+    for name in fields:
+        if name in LIKE_LOOKUPS:
+            for text in (clause.text, *clause.alternatives):
+                condition |= Q(**{LIKE_LOOKUPS[name]: text})
+    return condition
+
+
+def transcript_condition(clauses):
+    """
+    AudioTrack condition keeping the tracks whose transcript matches any
+    positive clause; empty (every track) without the full-text indexes.
+    """
+    condition = Q()
+    if not search_index.available(connection):
+        return condition
+    for clause in clauses:
+        if not clause.negated:
+            words = WORD_RE.findall(strip_accents(clause.text))
+            expression = search_index.match_expression(
+                connection, "transcript", ["text"], words, clause.phrase, clause.alternatives
+            )
+            condition |= Q(transcript_id__in=RawSQL(search_index.TRANSCRIPT_IDS[connection.vendor], [expression]))
+    return condition
+
+
+def plan(clauses, fields):
+    """
+    Compile clauses into filter conditions, most selective first. fields are
+    the FIELDS searched by clauses without a field: prefix.
+    """
+    use_fts = search_index.available(connection)
+    conditions = []
+    for clause in sorted(clauses, key=_selectivity):
+        targets = [clause.field] if clause.field else fields
+        text_condition = _fts_condition(clause, targets) if use_fts else _like_condition(clause, targets)
+        condition = text_condition
+        if "author" in targets:
+            condition |= _author_condition(clause)
+        if condition:
+            condition = ~condition if clause.negated else condition
+            if use_fts and text_condition and connection.vendor in search_index.EMPTY_QUERY:
+                condition |= _stopwords_only(clause)
+            conditions.append(condition)
+    return conditions
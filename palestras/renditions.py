@@ -0,0 +1,92 @@
+"""
+Low-bitrate streaming renditions of the lecture audio, made by the transcode
+command.
+
+Speech needs far less than the 128 kbps+ stereo MP3s we download, so each
+distinct audio gets a mono Opus file and an adaptive HLS stream (AAC in
+MPEG-TS segments, which iOS plays natively): one variant playlist per
+bitrate in HLS_BITRATES and a master playlist listing them, so players on a
+poor connection step down. They are stored by content hash under
+media/renditions/<sha256>/, so tracks with the same audio share them and no
+audio is transcoded twice.
+"""
+import re
+import shutil
+import subprocess
+from pathlib import Path
+
+from django.conf import settings
+
+RENDITIONS_DIR = Path(settings.MEDIA_ROOT) / "renditions"
+OPUS_BITRATE = "24k"
+HLS_BITRATES = ("24k", "32k")  # AAC-LC; above 32k mono speech sounds no better
+HLS_SEGMENT_SECS = 10
+
+# kind -> file inside the audio's directory
+FILES = {"opus": "audio.opus", "hls": "hls/master.m3u8"}
+
+EXTINF_RE = re.compile(r"#EXTINF:([\d.]+),\s*\n(\S+)")
+
+
+def existing(sha):
+    """Media-relative paths of the renditions already on disk for this audio, by kind."""
+    base = RENDITIONS_DIR / sha
+    return {kind: f"renditions/{sha}/{name}" for kind, name in FILES.items() if (base / name).exists()}
+
+
+def _ffmpeg(*args):
+    result = subprocess.run(["ffmpeg", "-v", "error", "-y", *args], capture_output=True, text=True)
+    if result.returncode:
+        lines = result.stderr.strip().splitlines()
+        raise RuntimeError(lines[-1] if lines else f"ffmpeg exited with {result.returncode}")
+
+
+def _stream_inf(variant):
+    """The master playlist line for a variant, with its bandwidth measured from the segments."""
+    rates = [
+        (variant.parent / name).stat().st_size * 8 / max(float(duration), 0.001)
+        for duration, name in EXTINF_RE.findall(variant.read_text())
+    ]
+    peak = max(rates, default=0)
+    average = sum(rates) / len(rates) if rates else 0
+    return (
+        f"#EXT-X-STREAM-INF:BANDWIDTH={peak:.0f},AVERAGE-BANDWIDTH={average:.0f},"
+        f'CODECS="mp4a.40.2"\n{variant.parent.name}/{variant.name}\n'
+    )
+
+
+def transcode(source, sha, opus_bitrate=OPUS_BITRATE, hls_bitrates=HLS_BITRATES):
+    """
+    Make every rendition of `source` in a scratch directory, then move it into
+    place whole. Runs in pool workers, so it only touches files.
+    """
+    partial = RENDITIONS_DIR / f".{sha}.partial"
+    shutil.rmtree(partial, ignore_errors=True)
+    partial.mkdir(parents=True)
+    # Mono, no cover art or tags
+    common = ["-i", str(source), "-vn", "-map_metadata", "-1", "-ac", "1"]
+    try:
+        _ffmpeg(
+            *common, "-c:a", "libopus", "-b:a", opus_bitrate, "-application", "voip",
+            str(partial / FILES["opus"]),
+        )
+        variants = []
+        for bitrate in hls_bitrates:
+            variant = partial / "hls" / bitrate / "index.m3u8"
+            variant.parent.mkdir(parents=True)
+            _ffmpeg(
+                *common, "-c:a", "aac", "-b:a", bitrate,
+                "-f", "hls", "-hls_time", str(HLS_SEGMENT_SECS), "-hls_playlist_type", "vod",
+                "-hls_segment_filename", str(variant.parent / "seg_%04d.ts"),
+                str(variant),
+            )
+            variants.append(_stream_inf(variant))
+        # Written last: a master playlist on disk means every variant is complete
+        (partial / FILES["hls"]).write_text("#EXTM3U\n#EXT-X-VERSION:3\n" + "".join(variants))
+        final = RENDITIONS_DIR / sha
+        shutil.rmtree(final, ignore_errors=True)
+        partial.rename(final)
+    except BaseException:
+        shutil.rmtree(partial, ignore_errors=True)
+        raise
+    return existing(sha)
@@ -0,0 +1,45 @@
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from django.db import connections, router
+
+READ_ALIAS = "readonly"
+
+_api_reads = ContextVar("api_reads", default=False)
+
+
+@contextmanager
+def read_only():
+    """Send the ORM reads made inside this block to the read-only database, when configured."""
+    token = _api_reads.set(True)
+    try:
+        yield
+    finally:
+        _api_reads.reset(token)
+
+
+def read_connection():
+    """The connection raw SQL reads should use, following the same routing as the ORM."""
+    return connections[router.db_for_read(None)]
+
+
+class ReadOnlyRouter:
+    """
+    Route reads made under read_only() to the READ_ALIAS database. Everything
+    else, including admin and management command reads, stays on default so
+    a writer always reads its own writes.
+    """
+
+    def db_for_read(self, model, **hints):
+        if _api_reads.get() and READ_ALIAS in connections.databases:
+            return READ_ALIAS
+        return None
+
+    def db_for_write(self, model, **hints):
+        return "default"
+
+    def allow_relation(self, obj1, obj2, **hints):
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        return db == "default"
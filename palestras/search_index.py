@@ -0,0 +1,205 @@
+"""
+Full-text indexes behind keyword search, per database vendor.
+
+SQLite: palestra_fts indexes the text columns of palestras, track_fts the
+track names and transcript_fts the transcripts. All are FTS5 external-content tables: they
+store only the inverted index and read rows back from the model tables,
+kept in sync by triggers. A fts5vocab table next to each index
+({fts}_vocab) lists its terms; the fuzzy matcher reads it as its vocabulary.
+
+Django remakes a table on some SQLite schema changes and the triggers go
+with it, so migrations that alter these tables call install() again (it is
+idempotent), and `rebuild_search_index` repairs a drifted index. Migrations
+pass the layout of their own time, so they still replay on a fresh database.
+
+PostgreSQL: the same documents are a generated, weighted `search_vector`
+tsvector column (Portuguese config over unaccented text) with a GIN index,
+and the columns UnaccentIContains filters on get trigram GIN indexes over
+lower(f_unaccent(col)), the exact expression the lookup compiles to.
+"""
+
+# document -> (model table, {column: tsvector weight})
+DOCUMENTS = {
+    "palestra": ("palestras_palestra", {"title": "A", "description": "B", "categories": "C", "tags": "C"}),
+    "track": ("palestras_audiotrack", {"name": "A"}),
+    "transcript": ("palestras_transcript", {"text": "B"}),
+}
+
+# SQLite FTS5 table -> (model table, indexed columns)
+INDEXES = {
+    f"{document}_fts": (table, tuple(columns)) for document, (table, columns) in DOCUMENTS.items()
+}
+TOKENIZE = "unicode61 remove_diacritics 2"
+
+TS_CONFIG = "portuguese"
+TRIGRAM_COLUMNS = {
+    "palestras_palestra": ("title", "description", "categories", "tags"),
+    "palestras_audiotrack": ("name",),
+    "palestras_transcript": ("text",),
+    "palestras_author": ("name",),
+}
+
+SUBQUERIES = {
+    "sqlite": {
+        "palestra": "SELECT rowid FROM palestra_fts WHERE palestra_fts MATCH %s",
+        "track": (
+            "SELECT t.palestra_id FROM track_fts JOIN palestras_audiotrack t ON t.id = track_fts.rowid "
+            "WHERE track_fts MATCH %s"
+        ),
+        "transcript": (
+            "SELECT t.palestra_id FROM transcript_fts JOIN palestras_audiotrack t ON t.transcript_id = transcript_fts.rowid "
+            "WHERE transcript_fts MATCH %s"
+        ),
+    },
+    "postgresql": {
+        "palestra": f"SELECT id FROM palestras_palestra WHERE search_vector @@ to_tsquery('{TS_CONFIG}', %s)",
+        "track": f"SELECT palestra_id FROM palestras_audiotrack WHERE search_vector @@ to_tsquery('{TS_CONFIG}', %s)",
+        "transcript": (
+            "SELECT t.palestra_id FROM palestras_audiotrack t JOIN palestras_transcript x ON x.id = t.transcript_id "
+            f"WHERE x.search_vector @@ to_tsquery('{TS_CONFIG}', %s)"
+        ),
+    },
+}
+
+
+# Ids of the transcripts matching, for finding hits within one palestra's tracks
+TRANSCRIPT_IDS = {
+    "sqlite": "SELECT rowid FROM transcript_fts WHERE transcript_fts MATCH %s",
+    "postgresql": f"SELECT id FROM palestras_transcript WHERE search_vector @@ to_tsquery('{TS_CONFIG}', %s)",
+}
+
+
+# True when a tsquery holds no lexemes, only stopwords ("o", "do"), and so would
+# match no row. A scalar subquery, so it is evaluated once and not per row.
+EMPTY_QUERY = {
+    "postgresql": f"(SELECT numnode(to_tsquery('{TS_CONFIG}', %s)) = 0)",
+}
+
+
+def available(connection):
+    return connection.vendor in SUBQUERIES
+
+
+def match_subquery(connection, document):
+    return SUBQUERIES[connection.vendor][document]
+
+
+def match_expression(connection, document, columns, words, phrase=False, alternatives=()):
+    """
+    Full-text query for words (as a phrase, or with the last one as a prefix)
+    or any of the single-word alternatives, restricted to columns of document.
+    """
+    if connection.vendor == "postgresql":
+        return _tsquery(document, columns, words, phrase, alternatives)
+    expression = '"' + " ".join(words) + ('"' if phrase else '"*')
+    if alternatives:
+        expression = "(" + " OR ".join([expression, *(f'"{alt}"' for alt in alternatives)]) + ")"
+    return f"{{{' '.join(columns)}}} : {expression}"
+
+
+def _tsquery(document, columns, words, phrase, alternatives):
+    weights = DOCUMENTS[document][1]
+    letters = "".join(sorted({weights[c] for c in columns}))
+    if set(letters) == set(weights.values()):
+        letters = ""  # every column: no weight restriction
+    terms = [f"{w}:{letters}" if letters else w for w in words]
+    if not phrase:
+        terms[-1] = f"{words[-1]}:*{letters}"
+    expression = " <-> ".join(terms) if phrase else " & ".join(terms)
+    if alternatives:
+        # Alternatives are lexemes from ts_stat, which to_tsquery stems once more
+        # (meditaca -> meditac); as prefixes they still match the lexeme itself
+        expression = " | ".join([f"({expression})", *(f"{alt}:*{letters}" for alt in alternatives)])
+    return expression
+
+
+# SQLite
+
+def _statements(fts, table, columns):
+    cols = ", ".join(columns)
+    new = ", ".join(f"new.{c}" for c in columns)
+    old = ", ".join(f"old.{c}" for c in columns)
+    delete = f"INSERT INTO {fts}({fts}, rowid, {cols}) VALUES ('delete', old.id, {old});"
+    insert = f"INSERT INTO {fts}(rowid, {cols}) VALUES (new.id, {new});"
+    return [
+        f"CREATE VIRTUAL TABLE IF NOT EXISTS {fts} USING fts5("
+        f"{cols}, content='{table}', content_rowid='id', tokenize='{TOKENIZE}')",
+        f"CREATE TRIGGER IF NOT EXISTS {fts}_ai AFTER INSERT ON {table} BEGIN {insert} END",
+        f"CREATE TRIGGER IF NOT EXISTS {fts}_ad AFTER DELETE ON {table} BEGIN {delete} END",
+        f"CREATE TRIGGER IF NOT EXISTS {fts}_au AFTER UPDATE OF {cols} ON {table} BEGIN {delete} {insert} END",
+        f"CREATE VIRTUAL TABLE IF NOT EXISTS {fts}_vocab USING fts5vocab({fts}, row)",
+    ]
+
+
+def install(schema_editor, indexes=INDEXES):
+    """Create the SQLite indexes and their triggers if missing, then rebuild them from the tables."""
+    if schema_editor.connection.vendor != "sqlite":
+        return
+    for fts, (table, columns) in indexes.items():
+        for sql in _statements(fts, table, columns):
+            schema_editor.execute(sql)
+    rebuild(schema_editor.connection, indexes)
+
+
+def uninstall(schema_editor, indexes=INDEXES):
+    if schema_editor.connection.vendor != "sqlite":
+        return
+    for fts in indexes:
+        for suffix in ("ai", "ad", "au"):
+            schema_editor.execute(f"DROP TRIGGER IF EXISTS {fts}_{suffix}")
+        schema_editor.execute(f"DROP TABLE IF EXISTS {fts}_vocab")
+        schema_editor.execute(f"DROP TABLE IF EXISTS {fts}")
+
+
+def rebuild(connection, indexes=INDEXES):
+    with connection.cursor() as cursor:
+        for fts in indexes:
+            cursor.execute(f"INSERT INTO {fts}({fts}) VALUES ('rebuild')")
+
+
+# PostgreSQL
+
+def _search_vector_sql(weights):
+    return " || ".join(
+        f"setweight(to_tsvector('{TS_CONFIG}'::regconfig, f_unaccent(coalesce({column}, ''))), '{weight}')"
+        for column, weight in weights.items()
+    )
+
+
+def install_postgres(schema_editor, documents=DOCUMENTS, trigram_columns=TRIGRAM_COLUMNS):
+    """Create the extensions, f_unaccent, trigram indexes and search_vector columns if missing."""
+    if schema_editor.connection.vendor != "postgresql":
+        return
+    schema_editor.execute("CREATE EXTENSION IF NOT EXISTS unaccent")
+    schema_editor.execute("CREATE EXTENSION IF NOT EXISTS pg_trgm")
+    # unaccent() is only STABLE; an IMMUTABLE wrapper with a fixed dictionary can be indexed
+    schema_editor.execute(
+        "CREATE OR REPLACE FUNCTION f_unaccent(text) RETURNS text "
+        "LANGUAGE sql IMMUTABLE PARALLEL SAFE STRICT "
+        "AS $$ SELECT public.unaccent('public.unaccent'::regdictionary, $1) $$"
+    )
+    for table, columns in trigram_columns.items():
+        for column in columns:
+            schema_editor.execute(
+                f"CREATE INDEX IF NOT EXISTS {table}_{column}_trgm ON {table} "
+                f"USING gin (lower(f_unaccent({column})) gin_trgm_ops)"
+            )
+    for table, weights in documents.values():
+        schema_editor.execute(
+            f"ALTER TABLE {table} ADD COLUMN IF NOT EXISTS search_vector tsvector "
+            f"GENERATED ALWAYS AS ({_search_vector_sql(weights)}) STORED"
+        )
+        schema_editor.execute(
+            f"CREATE INDEX IF NOT EXISTS {table}_search_vector ON {table} USING gin (search_vector)"
+        )
+
+
+def uninstall_postgres(schema_editor, documents=DOCUMENTS, trigram_columns=TRIGRAM_COLUMNS):
+    if schema_editor.connection.vendor != "postgresql":
+        return
+    for table, _ in documents.values():
+        schema_editor.execute(f"ALTER TABLE {table} DROP COLUMN IF EXISTS search_vector")
+    for table, columns in trigram_columns.items():
+        for column in columns:
+            schema_editor.execute(f"DROP INDEX IF EXISTS {table}_{column}_trgm")
+    schema_editor.execute("DROP FUNCTION IF EXISTS f_unaccent(text)")
@@ -0,0 +1,227 @@
+"""
+Segment-level semantic search over transcriptions (needs the 'semantic' extra).
+
+Transcriptions are cut into windows of consecutive lines, embedded with a
+local CPU model and stored L2-normalised and quantised to int8 in an
+append-only memory-mapped matrix. An IVF index (k-means centroids plus a
+list assignment per row) narrows each query to a few lists, so a query only
+dequantises a small slice of the matrix.
+
+Files in SEMANTIC_INDEX_DIR:
+    manifest.json   model, dim, row count and the row range of every indexed track
+    vectors.i8      int8 matrix, one row per segment
+    rows.bin        ROW_DTYPE record per segment (track, palestra, window, start)
+    centroids.f4    float32 IVF centroids
+    assign.i4       centroid of every row
+"""
+import json
+import math
+import threading
+from pathlib import Path
+
+from django.conf import settings
+
+from .transcripts import parse_timecoded
+
+INDEX_DIR = Path(getattr(settings, "SEMANTIC_INDEX_DIR", settings.BASE_DIR / "semantic_index"))
+MODEL_NAME = getattr(
+    settings, "SEMANTIC_MODEL", "sentence-transformers/paraphrase-multilingual-MiniLM-L12-v2"
+)
+
+SEGMENT_WORDS = 60     # words per embedded window
+N_PROBE = 8            # IVF lists scanned per query
+MAX_LISTS = 1024
+KMEANS_SAMPLE = 50000
+KMEANS_ITERATIONS = 12
+
+ROW_DTYPE = [
+    ("track_id", "<i4"),
+    ("palestra_id", "<i4"),
+    ("first", "<i4"),    # first line (timecoded) or word (plain) of the window
+    ("last", "<i4"),     # exclusive
+    ("start", "<f4"),    # seconds, -1 when the transcription has no timecodes
+]
+
+_model = None
+_index = None
+_lock = threading.Lock()
+
+
+def get_model():
+    global _model
+    if _model is None:
+        from sentence_transformers import SentenceTransformer
+
+        _model = SentenceTransformer(MODEL_NAME, device="cpu")
+    return _model
+
+
+def embed(texts, batch_size=64):
+    """Return L2-normalised float32 embeddings, one row per text."""
+    return get_model().encode(
+        texts, batch_size=batch_size, normalize_embeddings=True, convert_to_numpy=True
+    )
+
+
+def quantize(vectors):
+    import numpy as np
+
+    return np.clip(np.rint(vectors * 127), -127, 127).astype(np.int8)
+
+
+def track_windows(transcript):
+    """Return (first, last, start_secs, text) windows over a track's transcript."""
+    windows = []
+    lines = parse_timecoded(transcript.timecoded) if transcript.timecoded else []
+    if lines:
+        first, words, texts = 0, 0, []
+        for i, (_, text) in enumerate(lines):
+            texts.append(text)
+            words += len(text.split())
+            if words >= SEGMENT_WORDS or i == len(lines) - 1:
+                windows.append((first, i + 1, float(lines[first][0]), " ".join(texts)))
+                first, words, texts = i + 1, 0, []
+        return windows
+
+    words = transcript.text.split()
+    for first in range(0, len(words), SEGMENT_WORDS):
+        last = min(first + SEGMENT_WORDS, len(words))
+        windows.append((first, last, -1.0, " ".join(words[first:last])))
+    return windows
+
+
+def window_text(transcript, first, last, start):
+    """Rebuild the text of an indexed window from the track's transcript."""
+    if start >= 0:
+        lines = parse_timecoded(transcript.timecoded)
+        return " ".join(text for _, text in lines[first:last])
+    return " ".join(transcript.text.split()[first:last])
+
+
+def track_signature(track):
+    return track.transcribed_on.isoformat() if track.transcribed_on else ""
+
+
+def kmeans(sample, n_lists, iterations=KMEANS_ITERATIONS, seed=0):
+    """Spherical k-means over unit vectors; returns float32 centroids."""
+    import numpy as np
+
+    rng = np.random.default_rng(seed)
+    n_lists = min(n_lists, len(sample))  # each centroid starts from a distinct sample row
+    centroids = sample[rng.choice(len(sample), n_lists, replace=False)].copy()
+    for _ in range(iterations):
+        assign = np.argmax(sample @ centroids.T, axis=1)
+        for c in range(n_lists):
+            members = sample[assign == c]
+            if len(members):
+                centroid = members.sum(axis=0)
+                centroids[c] = centroid / (np.linalg.norm(centroid) or 1)
+    return centroids.astype(np.float32)
+
+
+def n_lists_for(rows):
+    return max(1, min(MAX_LISTS, rows, int(4 * math.sqrt(rows))))
+
+
+def read_manifest(index_dir=INDEX_DIR):
+    path = Path(index_dir) / "manifest.json"
+    if not path.exists():
+        return None
+    with open(path, encoding="utf-8") as f:
+        return json.load(f)
+
+
+def write_manifest(manifest, index_dir=INDEX_DIR):
+    path = Path(index_dir) / "manifest.json"
+    tmp = path.with_suffix(".tmp")
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(manifest, f)
+    tmp.replace(path)
+
+
+class SemanticIndex:
+    """Read-only view over the on-disk index, as of one manifest."""
+
+    def __init__(self, index_dir=INDEX_DIR):
+        import numpy as np
+
+        index_dir = Path(index_dir)
+        self.manifest = read_manifest(index_dir)
+        self.mtime = (index_dir / "manifest.json").stat().st_mtime
+        count, dim = self.manifest["count"], self.manifest["dim"]
+
+        self.vectors = np.memmap(index_dir / "vectors.i8", dtype=np.int8, mode="r", shape=(count, dim))
+        self.rows = np.memmap(index_dir / "rows.bin", dtype=ROW_DTYPE, mode="r", shape=(count,))
+        self.centroids = np.fromfile(index_dir / "centroids.f4", dtype=np.float32).reshape(-1, dim)
+        assign = np.fromfile(index_dir / "assign.i4", dtype=np.int32, count=count)
+
+        # Rows of re-transcribed tracks stay in the files until the next --rebuild
+        live = np.zeros(count, dtype=bool)
+        for start, end in self.manifest["tracks"].values():
+            live[start:end] = True
+        live_rows = np.flatnonzero(live)
+        order = np.argsort(assign[live_rows], kind="stable")
+        self.list_rows = live_rows[order]
+        self.list_offsets = np.searchsorted(
+            assign[live_rows][order], np.arange(len(self.centroids) + 1)
+        )
+
+    def search(self, query_vector, k=200):
+        """Return [(row, score)] of the k best live rows for a unit query vector."""
+        import numpy as np
+
+        probe = np.argsort(-(self.centroids @ query_vector))[:N_PROBE]
+        candidates = np.concatenate(
+            [self.list_rows[self.list_offsets[c]:self.list_offsets[c + 1]] for c in probe]
+        )
+        if not len(candidates):
+            return []
+        candidates.sort()  # sequential reads from the memmap
+        scores = self.vectors[candidates].astype(np.float32) @ query_vector / 127
+        k = min(k, len(candidates))
+        best = np.argpartition(-scores, k - 1)[:k]
+        best = best[np.argsort(-scores[best])]
+        return [(int(candidates[i]), float(scores[i])) for i in best]
+
+
+def get_index():
+    """Return the current SemanticIndex, reloading it after a rebuild; None if absent."""
+    global _index
+    manifest_path = INDEX_DIR / "manifest.json"
+    if not manifest_path.exists():
+        return None
+    mtime = manifest_path.stat().st_mtime
+    if _index is None or _index.mtime != mtime:
+        with _lock:
+            if _index is None or _index.mtime != mtime:
+                _index = SemanticIndex()
+    return _index
+
+
+def search(query, k=200):
+    """
+    Return {palestra_id: hit} for the palestras whose segments best match query,
+    ordered best first. Each hit is a dict with score, track_id, first, last, start.
+    Returns {} when the semantic extra or the index is not available.
+    """
+    try:
+        index = get_index()
+        if index is None:
+            return {}
+        query_vector = embed([query])[0]
+    except ImportError:
+        return {}
+
+    hits = {}
+    for row, score in index.search(query_vector, k=k):
+        r = index.rows[row]
+        pid = int(r["palestra_id"])
+        if pid not in hits:
+            hits[pid] = {
+                "score": score,
+                "track_id": int(r["track_id"]),
+                "first": int(r["first"]),
+                "last": int(r["last"]),
+                "start": float(r["start"]),
+            }
+    return hits
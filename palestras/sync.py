@@ -0,0 +1,293 @@
+"""
+Row-level sync between two copies of the database, as run by sync_export and
+sync_import over a file or a pipe.
+
+A change set holds the palestras, transcripts and tracks whose updated_on is
+at or after a high-water mark, in the record format of exports.py, and ends
+with a {"sync_until": ...} record: the mark for the next run, on the
+exporting side's clock. Rows are matched by natural key, not by id: palestras
+by slug, tracks by palestra slug and mp3_url, transcripts by audio hash or
+through their tracks.
+
+Conflicts are resolved per group of fields:
+- palestra fields and taxonomy: the newer scraped_on wins
+- track transcription (transcript, method, transcribed_on): the newer transcribed_on wins
+- transcript text and timecodes: the newer transcribed_on of its tracks wins; concepts
+  follow the text, or fill in where missing
+- track name: the newer updated_on wins
+- audio hash, ETag and size only fill in blanks, they describe the local file
+
+Deletions and cleared fields are not propagated, and local_path never travels.
+"""
+from collections import Counter
+from datetime import timedelta
+
+from django.db import transaction
+from django.db.models import Max, Prefetch, Q
+from django.utils import timezone
+
+from .exports import parse_timestamp
+from .models import AudioTrack, Author, Category, Language, Palestra, Transcript
+
+# Rows written while an export runs may commit with an earlier updated_on; the next run re-reads them
+OVERLAP = timedelta(minutes=1)
+
+PALESTRA_FIELDS = (
+    "title", "url", "description", "sku", "categories", "tags", "weight", "dimensions",
+    "media_format", "language",
+)
+AUDIO_FIELDS = ("audio_sha256", "audio_etag", "audio_size")
+
+
+def _iso(value):
+    return value.isoformat() if value else None
+
+
+def _newer(incoming, local):
+    return incoming is not None and (local is None or incoming > local)
+
+
+def _by_sha(shas):
+    return {t.audio_sha256: t for t in Transcript.objects.filter(audio_sha256__in=[sha for sha in shas if sha])}
+
+
+def changes(since=None, chunk_size=500):
+    """Yield the change set since `since`: palestras, then transcripts, then tracks, then the next mark."""
+    until = timezone.now() - OVERLAP
+    changed = Q(updated_on__gte=since) if since else Q()
+
+    palestras = Palestra.objects.filter(changed).prefetch_related("authors", "languages", "category_terms")
+    for p in palestras.order_by("id").iterator(chunk_size=chunk_size):
+        yield {
+            "table": "palestra",
+            "slug": p.slug,
+            **{field: getattr(p, field) for field in PALESTRA_FIELDS},
+            "scraped_on": _iso(p.scraped_on),
+            "authors": [[a.slug, a.name] for a in p.authors.all()],
+            "languages": [language.name for language in p.languages.all()],
+            "category_terms": [category.name for category in p.category_terms.all()],
+            "updated_on": _iso(p.updated_on),
+        }
+
+    # A track that was (re)transcribed needs its transcript on the other side, changed or not
+    transcript_ids = Transcript.objects.filter(
+        Q(updated_on__gte=since) | Q(tracks__transcribed_on__gte=since) if since else Q()
+    ).values("id")
+    transcripts = Transcript.objects.filter(id__in=transcript_ids).annotate(
+        last_transcribed=Max("tracks__transcribed_on")
+    ).prefetch_related(Prefetch(
+        "tracks", queryset=AudioTrack.objects.select_related("palestra").only("mp3_url", "transcript", "palestra__slug")
+    ))
+    for t in transcripts.order_by("id").iterator(chunk_size=chunk_size):
+        yield {
+            "table": "transcript",
+            "ref": t.id,
+            "audio_sha256": t.audio_sha256,
+            "text": t.text,
+            "timecoded": t.timecoded,
+            "concepts": t.concepts,
+            "transcribed_on": _iso(t.last_transcribed),
+            "tracks": [[track.palestra.slug, track.mp3_url] for track in t.tracks.all()],
+            "updated_on": _iso(t.updated_on),
+        }
+
+    tracks = AudioTrack.objects.filter(changed).select_related("palestra").only(
+        "name", "mp3_url", *AUDIO_FIELDS, "transcript", "transcription_method", "transcribed_on",
+        "updated_on", "palestra__slug",
+    )
+    for t in tracks.order_by("id").iterator(chunk_size=chunk_size):
+        yield {
+            "table": "track",
+            "palestra": t.palestra.slug,
+            "mp3_url": t.mp3_url,
+            "name": t.name,
+            **{field: getattr(t, field) for field in AUDIO_FIELDS},
+            "transcript": t.transcript_id,
+            "transcription_method": t.transcription_method,
+            "transcribed_on": _iso(t.transcribed_on),
+            "updated_on": _iso(t.updated_on),
+        }
+
+    yield {"sync_until": _iso(max(until, since) if since else until)}
+
+
+class Merger:
+    """Apply change set records in batches; counts what was created, updated and left alone per table."""
+
+    def __init__(self):
+        self.refs = {}  # exporting side's transcript id -> local Transcript
+        self.terms = {}
+        self.counts = Counter()
+        self.until = None
+
+    @transaction.atomic
+    def apply(self, records):
+        by_table = {"palestra": [], "transcript": [], "track": []}
+        for rec in records:
+            if "sync_until" in rec:
+                self.until = rec["sync_until"]
+            else:
+                by_table[rec["table"]].append(rec)
+        if by_table["palestra"]:
+            self._palestras(by_table["palestra"])
+        if by_table["transcript"]:
+            self._transcripts(by_table["transcript"])
+        if by_table["track"]:
+            self._tracks(by_table["track"])
+
+    def _save(self, model, created, updated, fields):
+        """Write the merged rows, keeping the incoming updated_on so they are not sent straight back."""
+        model.objects.bulk_update(updated, [*fields, "updated_on"])
+        stamps = [obj.updated_on for obj in created]
+        model.objects.bulk_create(created)  # sets updated_on to now
+        for obj, stamp in zip(created, stamps):
+            obj.updated_on = stamp
+        model.objects.bulk_update(created, ["updated_on"])
+        name = model._meta.model_name
+        self.counts[f"{name} created"] += len(created)
+        self.counts[f"{name} updated"] += len(updated)
+
+    def _stamp(self, obj, rec):
+        obj.updated_on = max(filter(None, [obj.updated_on, parse_timestamp(rec["updated_on"])]))
+
+    def _palestras(self, records):
+        local = Palestra.objects.in_bulk([rec["slug"] for rec in records], field_name="slug")
+        created, updated, taxonomy = [], [], []
+        for rec in records:
+            palestra = local.get(rec["slug"])
+            scraped_on = parse_timestamp(rec["scraped_on"])
+            if palestra is None:
+                palestra = Palestra(slug=rec["slug"])
+                created.append(palestra)
+            elif _newer(scraped_on, palestra.scraped_on):
+                updated.append(palestra)
+            else:
+                self.counts["palestra unchanged"] += 1
+                continue
+            for field in PALESTRA_FIELDS:
+                setattr(palestra, field, rec[field])
+            palestra.scraped_on = scraped_on
+            self._stamp(palestra, rec)
+            taxonomy.append((palestra, rec))
+        self._save(Palestra, created, updated, [*PALESTRA_FIELDS, "scraped_on"])
+
+        for palestra, rec in taxonomy:
+            palestra.authors.set([self._term(Author, slug=slug, name=name) for slug, name in rec["authors"]])
+            palestra.languages.set([self._term(Language, name=name) for name in rec["languages"]])
+            palestra.category_terms.set([self._term(Category, name=name) for name in rec["category_terms"]])
+
+    def _term(self, model, **fields):
+        """The local author, language or category by slug or name, created if missing."""
+        key = (model, fields.get("slug") or fields["name"])
+        if key not in self.terms:
+            lookup = "slug" if "slug" in fields else "name"
+            self.terms[key] = model.objects.get_or_create(**{lookup: key[1]}, defaults=fields)[0]
+        return self.terms[key]
+
+    def _transcripts(self, records):
+        by_sha = _by_sha([rec["audio_sha256"] for rec in records])
+        tracks = {}
+        for slug, url, transcript_id, transcribed_on in AudioTrack.objects.filter(
+            mp3_url__in=[url for rec in records for _, url in rec["tracks"]]
+        ).values_list("palestra__slug", "mp3_url", "transcript_id", "transcribed_on"):
+            tracks.setdefault((slug, url), (transcript_id, transcribed_on))
+        by_id = Transcript.objects.in_bulk({transcript_id for transcript_id, _ in tracks.values() if transcript_id})
+        # When each local transcript was last transcribed, over all the tracks that use it
+        transcribed = dict(AudioTrack.objects.filter(
+            transcript__in=[*by_sha.values(), *by_id.values()]
+        ).values("transcript").annotate(last=Max("transcribed_on")).values_list("transcript", "last"))
+
+        created, updated = [], {}
+        for rec in records:
+            matches = [tracks[key] for key in map(tuple, rec["tracks"]) if key in tracks]
+            transcript = by_sha.get(rec["audio_sha256"]) or next(
+                (by_id[transcript_id] for transcript_id, _ in matches if transcript_id), None
+            )
+            if transcript is not None:
+                local_transcribed = transcribed.get(transcript.id)
+            else:
+                local_transcribed = max((transcribed_on for _, transcribed_on in matches if transcribed_on), default=None)
+            take_text = _newer(parse_timestamp(rec["transcribed_on"]), local_transcribed)
+            if transcript is None:
+                if not take_text:
+                    self.counts["transcript unchanged"] += 1
+                    continue
+                transcript = Transcript(
+                    audio_sha256=rec["audio_sha256"], text=rec["text"], timecoded=rec["timecoded"],
+                    concepts=rec["concepts"],
+                )
+                self._stamp(transcript, rec)
+                created.append(transcript)
+                self.refs[rec["ref"]] = transcript
+                continue
+
+            self.refs[rec["ref"]] = transcript
+            changed = False
+            if take_text and (transcript.text, transcript.timecoded) != (rec["text"], rec["timecoded"]):
+                transcript.text, transcript.timecoded = rec["text"], rec["timecoded"]
+                transcript.concepts = rec["concepts"]  # extracted from the text they came with
+                changed = True
+            elif rec["concepts"] and not transcript.concepts:
+                transcript.concepts = rec["concepts"]
+                changed = True
+            if rec["audio_sha256"] and not transcript.audio_sha256:
+                transcript.audio_sha256 = rec["audio_sha256"]
+                changed = True
+            if changed:
+                self._stamp(transcript, rec)
+                updated[transcript.id] = transcript
+            else:
+                self.counts["transcript unchanged"] += 1
+        self._save(Transcript, created, list(updated.values()), ["audio_sha256", "text", "timecoded", "concepts"])
+
+    def _tracks(self, records):
+        palestras = dict(Palestra.objects.filter(
+            slug__in={rec["palestra"] for rec in records}
+        ).values_list("slug", "id"))
+        local = {}
+        for track in AudioTrack.objects.filter(mp3_url__in=[rec["mp3_url"] for rec in records]).select_related(
+            "palestra"
+        ).only("name", "mp3_url", *AUDIO_FIELDS, "transcript", "transcription_method", "transcribed_on",
+               "updated_on", "palestra__slug"):
+            local.setdefault((track.palestra.slug, track.mp3_url), track)
+        # Transcripts not in the change set may already be here under the same audio
+        by_sha = _by_sha([rec["audio_sha256"] for rec in records if rec["transcript"] not in self.refs])
+
+        created, updated = [], []
+        for rec in records:
+            track = local.get((rec["palestra"], rec["mp3_url"]))
+            if track is None:
+                if rec["palestra"] not in palestras:
+                    self.counts["track without palestra"] += 1
+                    continue
+                track = AudioTrack(palestra_id=palestras[rec["palestra"]], mp3_url=rec["mp3_url"], name=rec["name"])
+                local[(rec["palestra"], rec["mp3_url"])] = track
+                created.append(track)
+            changed = False
+            if track.pk and track.name != rec["name"] and _newer(parse_timestamp(rec["updated_on"]), track.updated_on):
+                track.name = rec["name"]
+                changed = True
+            for field in AUDIO_FIELDS:
+                if rec[field] and not getattr(track, field):
+                    setattr(track, field, rec[field])
+                    changed = True
+            transcribed_on = parse_timestamp(rec["transcribed_on"])
+            if _newer(transcribed_on, track.transcribed_on):
+                transcript = self.refs.get(rec["transcript"]) or by_sha.get(rec["audio_sha256"])
+                if transcript is None:
+                    self.counts["track transcript missing"] += 1
+                else:
+                    track.transcript = transcript
+                    track.transcription_method = rec["transcription_method"]
+                    track.transcribed_on = transcribed_on
+                    changed = True
+            if not track.pk:
+                self._stamp(track, rec)
+            elif changed:
+                self._stamp(track, rec)
+                updated.append(track)
+            else:
+                self.counts["audiotrack unchanged"] += 1
+        self._save(AudioTrack, created, updated, [
+            "name", *AUDIO_FIELDS, "transcript", "transcription_method", "transcribed_on",
+        ])
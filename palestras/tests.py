@@ -1,3 +1,766 @@
-from django.test import TestCase
+import gzip
+import importlib.util
+import io
+import json
+import os
+import sqlite3
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+from pathlib import Path
+from unittest import mock, skipUnless
 
-# Create your tests here.
+import brotli
+import httpx
+
+from django.core.cache import cache
+from django.core.management import call_command
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import connection
+from django.test import SimpleTestCase, TestCase, TransactionTestCase, override_settings
+from django.utils import timezone
+
+from . import audio_download, compression, exports, fuzzy, query, renditions, search_index, semantic, typeahead
+from .caching import CHUNK_CHARS, VersionedIndex, bump_data_version, encode_json
+from .frontend import FrontendShell, og_tags
+from .models import AudioTrack, Author, CompressionDictionary, Palestra, Transcript
+from .sync import Merger, changes
+
+LOCMEM_CACHE = {"default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"}}
+
+
+# The readonly alias mirrors default in tests but opens its own connection,
+# which can't see rows created inside the test transaction.
+@override_settings(CACHES=LOCMEM_CACHE, DATABASE_ROUTERS=[])
+class SearchQueryCountTests(TestCase):
+    # count, 3 facet counts, page ids, page rows, authors and tracks prefetches
+    FIRST_PAGE_QUERIES = 8
+
+    def setUp(self):
+        cache.clear()
+
+    def _create(self, n):
+        author = Author.objects.create(name="Autor", slug="autor")
+        for i in range(n):
+            p = Palestra.objects.create(title=f"Meditação {i}", slug=f"meditacao-{i}", url=f"https://example.com/{i}")
+            p.authors.add(author)
+            for j in range(3):
+                AudioTrack.objects.create(palestra=p, name=f"Faixa {j}", mp3_url=f"https://example.com/{i}/{j}.mp3")
+
+    def _search(self, params):
+        response = self.client.get("/api/search", params, HTTP_ACCEPT_ENCODING="gzip")
+        self.assertEqual(response.status_code, 200)
+        body = response.content
+        if response.get("Content-Encoding") == "gzip":
+            body = gzip.decompress(body)
+        return json.loads(body)
+
+    def test_first_page_query_count_is_fixed(self):
+        self._create(25)
+        with self.assertNumQueries(self.FIRST_PAGE_QUERIES):
+            self._search({"q": "meditacao"})
+
+    def test_query_count_does_not_grow_with_results(self):
+        self._create(3)
+        with self.assertNumQueries(self.FIRST_PAGE_QUERIES):
+            self._search({"q": "meditacao"})
+
+    def test_count_and_facets_stop_at_the_cap(self):
+        self._create(3)
+        with mock.patch("palestras.views.TOTAL_CAP", 2):
+            data = self._search({"q": "meditacao"})
+        self.assertEqual((data["total"], data["total_capped"]), (2, True))
+        self.assertEqual(data["facets"]["authors"], {"autor": 2})
+        self.assertTrue(data["facets_capped"])
+        cache.clear()
+        self.assertFalse(self._search({"q": "meditacao"})["facets_capped"])
+
+    def test_track_count_counts_all_tracks(self):
+        self._create(1)
+        data = self._search({"q": "faixa 1", "fields": "track_name"})
+        self.assertEqual(data["results"][0]["matching_track_names"], ["Faixa 1"])
+        self.assertEqual(data["results"][0]["track_count"], 3)
+
+    def test_transcript_snippet(self):
+        self._create(2)
+        track = AudioTrack.objects.filter(palestra__slug="meditacao-1").first()
+        track.set_transcript("uma palestra sobre a fraternidade universal", "")
+        track.save()
+        data = self._search({"q": "fraternidade", "fields": "transcriptions"})
+        self.assertEqual([r["slug"] for r in data["results"]], ["meditacao-1"])
+        self.assertIn("fraternidade", data["results"][0]["transcription_snippets"][0]["snippet"])
+
+
+class QueryLanguageTests(TestCase):
+    def test_parse(self):
+        self.assertEqual(query.parse('luz "trigueirinho netto" medit* -carma title:paz tag:x'), [
+            query.Clause("luz"),
+            query.Clause("trigueirinho netto", phrase=True),
+            query.Clause("medit"),
+            query.Clause("carma", negated=True),
+            query.Clause("paz", field="title"),
+            query.Clause("x", field="tags"),
+        ])
+
+    def test_parse_keeps_unknown_fields_and_skips_punctuation(self):
+        self.assertEqual(query.parse('foo:bar "" - ?'), [query.Clause("foo:bar")])
+
+    def test_plan_puts_negations_last(self):
+        clauses = query.parse("-carma meditação")
+        conditions = query.plan(clauses, ["title"])
+        self.assertEqual(len(conditions), 2)
+        first, last = (str(Palestra.objects.filter(c).query) for c in conditions)
+        self.assertNotIn("NOT", first)
+        self.assertIn("NOT", last)
+
+    def test_plan_filters(self):
+        author = Author.objects.create(name="José Trigueirinho Netto", slug="trigueirinho")
+        luz = Palestra.objects.create(title="A luz interior", slug="luz", url="https://example.com/1",
+                                      description="Sobre a meditação")
+        luz.authors.add(author)
+        Palestra.objects.create(title="Carma e luz", slug="carma", url="https://example.com/2")
+        Palestra.objects.create(title="Paz", slug="paz", url="https://example.com/3", description="luz interior")
+
+        def search(q, fields=("title", "description", "author")):
+            palestras = Palestra.objects.all()
+            for condition in query.plan(query.parse(q), list(fields)):
+                palestras = palestras.filter(condition)
+            return sorted(palestras.values_list("slug", flat=True))
+
+        self.assertEqual(search("luz"), ["carma", "luz", "paz"])
+        self.assertEqual(search("luz -carma"), ["luz", "paz"])
+        self.assertEqual(search('"luz interior"'), ["luz", "paz"])
+        self.assertEqual(search("title:luz"), ["carma", "luz"])
+        self.assertEqual(search("medit*"), ["luz"])  # accent-insensitive prefix
+        self.assertEqual(search("author:trigueirinho"), ["luz"])
+        self.assertEqual(search("inter", fields=["title"]), ["luz"])
+
+
+# PostgreSQL picks sequential scans over empty test tables, so only SQLite plans are checked
+@skipUnless(connection.vendor == "sqlite", "query plans checked on SQLite")
+class CommandQueryIndexTests(TestCase):
+    """The status queries of the batch commands must not scan the track table."""
+
+    def assertUsesIndex(self, queryset, index_name):
+        plan = queryset.explain().replace("COVERING INDEX", "INDEX")
+        self.assertIn(f"USING INDEX {index_name}", plan)
+
+    def test_pending_transcription(self):
+        qs = AudioTrack.objects.exclude(local_path=None).filter(transcribed_on__isnull=True)
+        self.assertUsesIndex(qs, "track_transcribed_on_idx")
+
+    def test_pending_concepts(self):
+        qs = AudioTrack.objects.filter(transcribed_on__isnull=False, transcript__concepts=[])
+        self.assertUsesIndex(qs, "transcript_no_concepts_idx")
+
+    def test_pending_scrape(self):
+        self.assertUsesIndex(Palestra.objects.filter(scraped_on__isnull=True), "palestra_scraped_on_idx")
+
+    def test_stats_counts(self):
+        transcribed = AudioTrack.objects.exclude(transcript=None)
+        self.assertUsesIndex(transcribed.values("id"), "palestras_audiotrack_transcript_id_e7276044")
+        self.assertUsesIndex(transcribed.exclude(transcript__timecoded="").values("id"), "transcript_timecoded_idx")
+        self.assertUsesIndex(
+            AudioTrack.objects.exclude(transcription_method="").values("transcription_method"), "track_method_idx"
+        )
+        self.assertUsesIndex(Transcript.objects.filter(concepts=[]).values("id"), "transcript_no_concepts_idx")
+
+
+class SharedAudioTests(TestCase):
+    def test_same_audio_shares_one_transcript(self):
+        p = Palestra.objects.create(title="Palestra", slug="palestra", url="https://example.com/p")
+        first, second = (
+            AudioTrack.objects.create(
+                palestra=p, name=f"Faixa {i}", mp3_url=f"https://example.com/{i}.mp3", audio_sha256="ab" * 32
+            )
+            for i in range(2)
+        )
+        first.set_transcript("texto", "[00:00:01] texto")
+        first.save()
+        second.set_transcript("texto", "[00:00:01] texto")
+        second.save()
+        self.assertEqual(first.transcript_id, second.transcript_id)
+        self.assertEqual(Transcript.objects.get().audio_sha256, "ab" * 32)
+
+    def _tracks(self, n, **fields):
+        p = Palestra.objects.create(title="Palestra", slug="palestra", url="https://example.com/p")
+        return [
+            AudioTrack.objects.create(palestra=p, name=f"Faixa {i}", mp3_url=f"https://example.com/{i}.mp3", **fields)
+            for i in range(n)
+        ]
+
+    def test_etag_only_matches_the_same_url(self):
+        known, other = self._tracks(2)
+
+        def handler(request):
+            # Same ETag and size for different content, like nginx's mtime-size ETags
+            return httpx.Response(200, headers={"ETag": '"5f-1e"'}, content=request.url.path.encode())
+
+        client = httpx.Client
+        with tempfile.TemporaryDirectory() as tmp, \
+                mock.patch.object(audio_download, "AUDIOS_DIR", Path(tmp)), \
+                mock.patch.object(audio_download.httpx, "Client",
+                                  lambda **kw: client(transport=httpx.MockTransport(handler), **kw)):
+            audio_download.download_tracks([known, other])
+        known.refresh_from_db()
+        other.refresh_from_db()
+        self.assertEqual(other.local_path.name, "audios/1.mp3")
+        self.assertNotEqual(other.audio_sha256, known.audio_sha256)
+
+    def test_dedupe_takes_method_and_date_from_any_transcribed_track(self):
+        transcribed, first, second = self._tracks(3, audio_sha256="")
+        with tempfile.TemporaryDirectory() as tmp:
+            for track in (first, second):
+                (Path(tmp) / f"{track.id}.mp3").write_bytes(b"audio")
+                track.local_path = f"audios/{track.id}.mp3"
+                track.save()
+            transcribed.audio_sha256 = audio_download.file_sha256(Path(tmp) / f"{first.id}.mp3")
+            transcribed.set_transcript("texto", "[00:00:01] texto")
+            transcribed.transcription_method = "whisper"
+            transcribed.transcribed_on = timezone.now()
+            transcribed.save()
+            with mock.patch("palestras.management.commands.dedupe_audios.AUDIOS_DIR", Path(tmp)):
+                call_command("dedupe_audios", stdout=io.StringIO())
+        for track in AudioTrack.objects.filter(id__in=[first.id, second.id]):
+            self.assertEqual(track.transcript_id, transcribed.transcript_id)
+            self.assertEqual((track.transcription_method, track.transcribed_on),
+                             ("whisper", transcribed.transcribed_on))
+
+    def test_import_shares_transcripts_by_audio_hash(self):
+        tracks = self._tracks(2, audio_sha256="ab" * 32)
+        with tempfile.TemporaryDirectory() as tmp:
+            path = Path(tmp) / "export.jsonl"
+            path.write_text("".join(json.dumps({
+                "id": track.id, "mp3_url": track.mp3_url, "name": track.name, "palestra_slug": "palestra",
+                "transcription": "texto", "transcription_timecoded": "[00:00:01] texto",
+                "transcription_method": "whisper", "transcribed_on": None,
+            }) + "\n" for track in tracks))
+            call_command("import_transcriptions", str(path), stdout=io.StringIO())
+        self.assertEqual(Transcript.objects.get().audio_sha256, "ab" * 32)
+        self.assertEqual(AudioTrack.objects.filter(transcript=Transcript.objects.get()).count(), 2)
+
+
+class CompressedTranscriptTests(TestCase):
+    TIMECODED = "[00:00:01] uma palestra sobre a fraternidade\n[00:00:09] e sobre a fraternidade universal"
+
+    def tearDown(self):
+        compression.reset()
+
+    def _stored(self, transcript):
+        return bytes(Transcript.objects.filter(id=transcript.id).values_list("timecoded", flat=True).get())
+
+    def test_round_trip(self):
+        transcript = Transcript.objects.create(text="texto", timecoded=self.TIMECODED)
+        self.assertNotIn(b"fraternidade", self._stored(transcript))
+        self.assertEqual(Transcript.objects.get(id=transcript.id).timecoded, self.TIMECODED)
+        self.assertFalse(Transcript.objects.filter(timecoded="").exists())
+
+    def test_dictionary_keeps_old_values_readable(self):
+        old = Transcript.objects.create(timecoded=self.TIMECODED)
+        CompressionDictionary.objects.create(
+            codec=compression.ZLIB, data=compression.train([self.TIMECODED] * 3, compression.ZLIB)
+        )
+        compression.reset()
+        new = Transcript.objects.create(timecoded=self.TIMECODED)
+        self.assertLess(len(self._stored(new)), len(self._stored(old)))
+        self.assertEqual(Transcript.objects.get(id=old.id).timecoded, self.TIMECODED)
+        self.assertEqual(Transcript.objects.get(id=new.id).timecoded, self.TIMECODED)
+
+
+class SyncTests(TestCase):
+    def _transcribe(self, track, text, transcribed_on):
+        track.set_transcript(text, f"[00:00:01] {text}")
+        track.transcribed_on = transcribed_on
+        track.save()
+
+    def test_newer_transcription_wins(self):
+        now = timezone.now()
+        p = Palestra.objects.create(title="Palestra", slug="palestra", url="https://example.com/p")
+        track = AudioTrack.objects.create(palestra=p, name="Faixa", mp3_url="https://example.com/1.mp3")
+        self._transcribe(track, "remoto", now)
+        records = [json.loads(json.dumps(record)) for record in changes()]
+
+        self._transcribe(track, "local", now - timedelta(days=1))
+        Merger().apply(records)
+        self.assertEqual(AudioTrack.objects.get(id=track.id).transcript.text, "remoto")
+
+        self._transcribe(track, "local", now + timedelta(days=1))
+        merger = Merger()
+        merger.apply(records)
+        self.assertEqual(AudioTrack.objects.get(id=track.id).transcript.text, "local")
+        self.assertEqual(merger.counts["audiotrack updated"], 0)
+        self.assertEqual(merger.until, records[-1]["sync_until"])
+
+    def test_local_transcript_found_by_hash_keeps_newer_text(self):
+        now = timezone.now()
+        p = Palestra.objects.create(title="Palestra", slug="palestra", url="https://example.com/p")
+        remote = AudioTrack.objects.create(
+            palestra=p, name="Faixa", mp3_url="https://example.com/1.mp3", audio_sha256="ab" * 32
+        )
+        self._transcribe(remote, "remoto antigo", now - timedelta(days=1))
+        records = [json.loads(json.dumps(record)) for record in changes()]
+
+        # Here only another track with the same audio is transcribed, and more recently
+        AudioTrack.objects.filter(id=remote.id).update(transcript=None, transcribed_on=None)
+        Transcript.objects.all().delete()
+        local = AudioTrack.objects.create(
+            palestra=p, name="Copia", mp3_url="https://example.com/2.mp3", audio_sha256="ab" * 32
+        )
+        self._transcribe(local, "local", now)
+
+        merger = Merger()
+        merger.apply(records)
+        self.assertEqual(Transcript.objects.get().text, "local")
+        self.assertEqual(merger.counts["transcript updated"], 0)
+
+    def test_missing_rows_are_created(self):
+        p = Palestra.objects.create(title="Palestra", slug="palestra", url="https://example.com/p")
+        p.authors.add(Author.objects.create(name="Autor", slug="autor"))
+        track = AudioTrack.objects.create(palestra=p, name="Faixa", mp3_url="https://example.com/1.mp3")
+        self._transcribe(track, "texto", timezone.now())
+        records = [json.loads(json.dumps(record)) for record in changes()]
+        p.delete()
+        Transcript.objects.all().delete()
+
+        Merger().apply(records)
+        track = AudioTrack.objects.select_related("palestra", "transcript").get()
+        self.assertEqual((track.palestra.slug, track.transcript.timecoded), ("palestra", "[00:00:01] texto"))
+        self.assertEqual([a.slug for a in track.palestra.authors.all()], ["autor"])
+
+
+@skipUnless(connection.vendor == "sqlite", "snapshots back up SQLite")
+class SnapshotTests(TransactionTestCase):
+    def test_compacted_snapshot_restores(self):
+        Palestra.objects.create(title="Palestra", slug="palestra", url="https://example.com/p")
+        with tempfile.TemporaryDirectory() as tmp:
+            output = Path(tmp) / "db.sqlite3.gz"
+            call_command("snapshot", str(output), "--compact", "--pause", "0", stdout=io.StringIO())
+            restored = Path(tmp) / "restored.sqlite3"
+            restored.write_bytes(gzip.decompress(output.read_bytes()))
+            db = sqlite3.connect(restored)
+            self.assertEqual(db.execute("SELECT slug FROM palestras_palestra").fetchall(), [("palestra",)])
+            db.close()
+
+
+@skipUnless(importlib.util.find_spec("numpy"), "needs the 'semantic' extra")
+class SemanticIndexTests(SimpleTestCase):
+    def test_kmeans_on_a_tiny_corpus(self):
+        import numpy as np
+
+        sample = np.eye(5, 8, dtype=np.float32)
+        centroids = semantic.kmeans(sample, semantic.n_lists_for(len(sample)))
+        self.assertEqual(centroids.shape, (5, 8))
+
+
+class ImportTranscriptionsTests(TestCase):
+    def setUp(self):
+        p = Palestra.objects.create(title="Palestra", slug="palestra", url="https://example.com/p")
+        self.tracks = [
+            AudioTrack.objects.create(palestra=p, name=f"Faixa {i}", mp3_url=f"https://example.com/{i}.mp3")
+            for i in range(3)
+        ]
+
+    def _import(self, records, *args):
+        with tempfile.TemporaryDirectory() as tmp:
+            path = Path(tmp) / "export.jsonl.gz"
+            with gzip.open(path, "wt", encoding="utf-8") as f:
+                f.writelines(json.dumps(record) + "\n" for record in records)
+            out = io.StringIO()
+            call_command("import_transcriptions", str(path), *args, stdout=out)
+        return out.getvalue()
+
+    def _record(self, track, text, transcribed_on):
+        return {
+            "id": track.id, "mp3_url": track.mp3_url, "name": track.name, "palestra_slug": "palestra",
+            "transcription": text, "transcription_timecoded": f"[00:00:01] {text}",
+            "transcription_method": "remote", "transcribed_on": transcribed_on.isoformat(),
+        }
+
+    def test_newer_only_replaces_older_transcriptions(self):
+        now = timezone.now()
+        older, newer = self.tracks[:2]
+        for track in (older, newer):
+            track.set_transcript("local", "[00:00:01] local")
+            track.transcribed_on = now
+            track.save()
+        self._import([
+            self._record(older, "remote", now + timedelta(hours=1)),
+            self._record(newer, "remote", now - timedelta(hours=1)),
+        ], "--newer")
+        self.assertEqual(AudioTrack.objects.get(id=older.id).transcript.text, "remote")
+        self.assertEqual(AudioTrack.objects.get(id=newer.id).transcript.text, "local")
+
+    def test_batches(self):
+        now = timezone.now()
+        missing = {**self._record(self.tracks[0], "?", now), "id": 0, "mp3_url": "https://example.com/x.mp3"}
+        out = self._import([
+            self._record(self.tracks[0], "zero", now),
+            self._record(self.tracks[1], "one", now),
+            missing,
+            self._record(self.tracks[2], "two", now),
+            self._record(self.tracks[0], "zero again", now),  # transcribed by the first batch by now
+        ], "--batch-size", "2")
+        self.assertEqual(out.count(" imported ("), 3)
+        self.assertIn("Imported: 3, skipped (already transcribed): 1, not found: 1", out)
+        self.assertEqual(
+            [track.transcript.text for track in AudioTrack.objects.select_related("transcript").order_by("id")],
+            ["zero", "one", "two"],
+        )
+
+
+@override_settings(CACHES=LOCMEM_CACHE, DATABASE_ROUTERS=[])
+class CachedApiTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        # Large enough to be served compressed
+        Palestra.objects.create(title="Palestra", slug="palestra", url="https://example.com/p", description="x" * 5000)
+
+    def _get(self, accept_encoding, **headers):
+        return self.client.get("/api/palestras/palestra", HTTP_ACCEPT_ENCODING=accept_encoding, **headers)
+
+    def test_encoding_follows_q_values(self):
+        self.assertEqual(self._get("gzip, br")["Content-Encoding"], "br")
+        self.assertEqual(self._get("br;q=0, gzip")["Content-Encoding"], "gzip")
+        self.assertEqual(self._get("gzip;q=1.0, br;q=0.5")["Content-Encoding"], "gzip")
+        response = self._get("*;q=0, identity")
+        self.assertFalse(response.has_header("Content-Encoding"))
+        self.assertEqual(json.loads(b"".join(response.streaming_content))["slug"], "palestra")
+        body = brotli.decompress(self._get("br").content)
+        self.assertEqual(json.loads(body)["description"], "x" * 5000)
+
+    def test_small_bodies_stay_plain_with_a_strong_etag(self):
+        # Worth gzipping for a generic middleware, but under COMPRESS_MIN_BYTES
+        Palestra.objects.create(title="Curta", slug="curta", url="https://example.com/c", description="y" * 400)
+        response = self.client.get("/api/palestras/curta", HTTP_ACCEPT_ENCODING="gzip, br")
+        self.assertFalse(response.has_header("Content-Encoding"))
+        self.assertFalse(response["ETag"].startswith("W/"))
+        self.assertEqual(json.loads(response.content)["slug"], "curta")
+
+    def test_pages_are_gzipped(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            index = Path(tmp) / "index.html"
+            index.write_text("<html><head></head><body>" + "<p>x</p>" * 200 + "</body></html>")
+            with mock.patch("palestras.views.shell", FrontendShell(index)):
+                response = self.client.get("/palestras/palestra", HTTP_ACCEPT_ENCODING="gzip")
+        self.assertEqual(response["Content-Encoding"], "gzip")
+        self.assertIn(b'og:title', gzip.decompress(response.content))
+
+    def test_page_cache_ignores_the_query_string(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            index = Path(tmp) / "index.html"
+            index.write_text("<html><head></head><body></body></html>")
+            with mock.patch("palestras.views.shell", FrontendShell(index)), \
+                    mock.patch("palestras.views.og_tags", wraps=og_tags) as tags:
+                first = self.client.get("/palestras/palestra?utm_source=x").content
+                second = self.client.get("/palestras/palestra?fbclid=y").content
+        self.assertEqual(first, second)
+        tags.assert_called_once()
+        self.assertIn(b'content="http://testserver/palestras/palestra"', first)
+
+    def test_revalidation_is_a_304_until_the_data_changes(self):
+        first = self._get("gzip")
+        etag = first["ETag"]
+        self.assertEqual(first.status_code, 200)
+        self.assertEqual(first["Cache-Control"], "no-cache")
+        self.assertEqual(self._get("gzip", HTTP_IF_NONE_MATCH=etag).status_code, 304)
+        # Each coding is its own representation
+        self.assertNotEqual(self._get("br")["ETag"], etag)
+        Palestra.objects.filter(slug="palestra").update(title="Renamed")
+        self.assertEqual(self._get("gzip", HTTP_IF_NONE_MATCH=etag).status_code, 304)  # bulk write, no signal
+        bump_data_version()
+        response = self._get("gzip", HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response["ETag"], etag)
+        self.assertEqual(json.loads(gzip.decompress(response.content))["title"], "Renamed")
+
+
+class EncodeJsonTests(SimpleTestCase):
+    def test_small_payloads_stay_plain(self):
+        self.assertEqual(encode_json({"a": 1}), {"identity": b'{"a": 1}'})
+
+    def test_bodies_compressed_across_chunks(self):
+        data = {"items": [{"n": i, "text": "ação " * 50} for i in range(400)], "on": timezone.now()}
+        expected = json.dumps(data, cls=DjangoJSONEncoder).encode()
+        self.assertGreater(len(expected), 3 * CHUNK_CHARS)
+        bodies = encode_json(data)
+        self.assertEqual(gzip.decompress(bodies["gzip"]), expected)
+        self.assertEqual(brotli.decompress(bodies["br"]), expected)
+        self.assertLess(len(bodies["br"]), len(expected) // 10)
+
+
+class ReadRecordsTests(SimpleTestCase):
+    RECORDS = [{"id": 1, "text": "ação, [x]"}, 12345, "fim", [1.5, {"a": None}], True]
+
+    def test_legacy_array_across_chunk_boundaries(self):
+        text = " [ " + ", ".join(json.dumps(r, ensure_ascii=False) for r in self.RECORDS) + " ]\n"
+        for size in range(1, 12):
+            with self.subTest(chunk=size), mock.patch.object(exports, "READ_CHUNK", size):
+                self.assertEqual(list(exports.read_records(io.StringIO(text))), self.RECORDS)
+
+    def test_truncated_array_raises(self):
+        with mock.patch.object(exports, "READ_CHUNK", 4), self.assertRaises(json.JSONDecodeError):
+            list(exports.read_records(io.StringIO('[{"id": 1}, {"id": 2')))
+
+    def test_json_lines(self):
+        text = "\n" + "\n".join(json.dumps(r) for r in self.RECORDS) + "\n\n"
+        self.assertEqual(list(exports.read_records(io.StringIO(text))), self.RECORDS)
+
+
+@skipUnless(connection.vendor == "sqlite", "the SQLite vocabulary is whole words; PostgreSQL's is stems")
+@override_settings(CACHES=LOCMEM_CACHE, DATABASE_ROUTERS=[])
+class FuzzyTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.addCleanup(setattr, fuzzy, "index", fuzzy.index)
+        fuzzy.index = VersionedIndex(fuzzy.index.build)
+        Palestra.objects.create(title="Meditação e fraternidade", slug="m", url="https://example.com/m")
+
+    def test_expands_close_words(self):
+        fuzzy.index.refresh()
+        self.assertEqual(fuzzy.expand({"meditacoa", "fraternidad", "xyz"}), {
+            "meditacoa": ["meditacao"], "fraternidad": ["fraternidade"],
+        })
+
+    def test_index_updates_in_the_background(self):
+        fuzzy.index.refresh()
+        Palestra.objects.create(title="Serenidade", slug="s", url="https://example.com/s")
+        with mock.patch("palestras.caching.threading.Thread") as thread:
+            self.assertEqual(fuzzy.expand({"serenidad"}), {})  # served from the old index meanwhile
+            self.assertEqual(fuzzy.expand({"serenidad"}), {})
+        thread.assert_called_once()
+        with mock.patch("palestras.caching.connections"):  # keep the test's connection open
+            thread.call_args.kwargs["target"](*thread.call_args.kwargs["args"])
+        self.assertEqual(fuzzy.expand({"serenidad"}), {"serenidad": ["serenidade"]})
+        self.assertEqual(fuzzy.expand({"fraternidad"}), {"fraternidad": ["fraternidade"]})
+
+
+@override_settings(CACHES=LOCMEM_CACHE, DATABASE_ROUTERS=[])
+class SuggestTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.addCleanup(setattr, typeahead, "index", typeahead.index)
+        typeahead.index = VersionedIndex(typeahead.index.build)
+        author = Author.objects.create(name="José Trigueirinho", slug="trigueirinho")
+        Palestra.objects.create(title="A Luz Interior", slug="luz", url="https://example.com/l").authors.add(author)
+
+    def test_nothing_until_the_index_is_built(self):
+        with mock.patch("palestras.caching.threading.Thread") as thread:
+            self.assertEqual(typeahead.complete("luz"), [])
+        thread.assert_called_once()
+
+    def test_completes_titles_and_authors(self):
+        with mock.patch.object(typeahead, "VOCABULARY_PATH", Path("/nonexistent")):
+            typeahead.index.refresh()
+        self.assertEqual(typeahead.complete("inte"), [{"label": "A Luz Interior", "kind": "title", "slug": "luz"}])
+        self.assertEqual(typeahead.complete("TRIG"), [
+            {"label": "José Trigueirinho", "kind": "author", "slug": "trigueirinho"},
+        ])
+        self.assertEqual(typeahead.complete("j"), [])
+
+
+@override_settings(CACHES=LOCMEM_CACHE, DATABASE_ROUTERS=[])
+class PalestraSearchTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        p = Palestra.objects.create(title="Palestra", slug="palestra", url="https://example.com/p")
+        self.timecoded, plain, other = (
+            AudioTrack.objects.create(palestra=p, name=f"Faixa {i}", mp3_url=f"https://example.com/{i}.mp3")
+            for i in range(3)
+        )
+        self.timecoded.set_transcript("a luz e a paz. luz", "[00:00:01] a luz e a paz.\n[00:01:05] Luz")
+        plain.set_transcript("luz sem tempos", "")  # the player shows no lines for it
+        other.set_transcript("nada aqui", "[00:00:01] nada aqui")
+        for track in (self.timecoded, plain, other):
+            track.save()
+
+    def _search(self, q):
+        response = self.client.get("/api/palestras/palestra/search", {"q": q})
+        self.assertEqual(response.status_code, 200)
+        return json.loads(response.content)
+
+    def test_matches_in_timecoded_lines(self):
+        data = self._search("luz")
+        self.assertEqual(data["matches"], [
+            {"track_id": self.timecoded.id, "line": 0, "seconds": 1, "start": 2, "end": 5},
+            {"track_id": self.timecoded.id, "line": 1, "seconds": 65, "start": 0, "end": 3},
+        ])
+        self.assertFalse(data["truncated"])
+
+    def test_matches_are_capped(self):
+        with mock.patch("palestras.views.MAX_TRANSCRIPT_MATCHES", 1):
+            data = self._search("luz")
+        self.assertEqual((len(data["matches"]), data["truncated"]), (1, True))
+
+    def test_only_transcript_terms_are_matched(self):
+        self.assertEqual(self._search("title:luz")["matches"], [])
+        self.assertEqual(len(self._search("transcription:luz")["matches"]), 2)
+
+
+def _fake_ffmpeg(*args):
+    """Stands in for ffmpeg: writes the output file, and one segment for HLS."""
+    output = Path(args[-1])
+    if output.suffix == ".m3u8":
+        (output.parent / "seg_0000.ts").write_bytes(b"\0" * 3000)
+        output.write_text("#EXTM3U\n#EXTINF:10.000000,\nseg_0000.ts\n#EXT-X-ENDLIST\n")
+    else:
+        output.write_bytes(b"opus")
+
+
+class TranscodeTests(TestCase):
+    def setUp(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        audios, self.renditions_dir = Path(tmp.name) / "audios", Path(tmp.name) / "renditions"
+        audios.mkdir()
+        for patcher in (
+            mock.patch("palestras.management.commands.transcode.AUDIOS_DIR", audios),
+            mock.patch.object(renditions, "RENDITIONS_DIR", self.renditions_dir),
+            # workers in threads, so they see the patches
+            mock.patch("palestras.management.commands.transcode.ProcessPoolExecutor", ThreadPoolExecutor),
+        ):
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        p = Palestra.objects.create(title="Palestra", slug="palestra", url="https://example.com/p")
+        self.tracks = []
+        for i, content in enumerate((b"same", b"same", b"other")):
+            (audios / f"{i}.mp3").write_bytes(content)
+            self.tracks.append(AudioTrack.objects.create(
+                palestra=p, name=f"Faixa {i}", mp3_url=f"https://example.com/{i}.mp3", local_path=f"audios/{i}.mp3"
+            ))
+
+    def _transcode(self):
+        with mock.patch.object(renditions, "_ffmpeg", side_effect=_fake_ffmpeg) as ffmpeg:
+            call_command("transcode", "--workers", "1", stdout=io.StringIO())
+        return ffmpeg.call_count
+
+    def test_each_audio_is_transcoded_once_and_linked(self):
+        # per audio: one Opus file and one HLS variant per rung
+        self.assertEqual(self._transcode(), 2 * (1 + len(renditions.HLS_BITRATES)))
+        first, second, third = AudioTrack.objects.order_by("id")
+        sha = first.audio_sha256
+        self.assertEqual(first.renditions, {
+            "opus": f"renditions/{sha}/audio.opus", "hls": f"renditions/{sha}/hls/master.m3u8",
+        })
+        self.assertEqual(second.renditions, first.renditions)
+        self.assertNotEqual(third.renditions, first.renditions)
+        master = (self.renditions_dir / sha / "hls" / "master.m3u8").read_text()
+        self.assertEqual(master.count("#EXT-X-STREAM-INF:BANDWIDTH=2400,"), len(renditions.HLS_BITRATES))
+        for bitrate in renditions.HLS_BITRATES:
+            self.assertIn(f"\n{bitrate}/index.m3u8\n", master)
+
+    def test_audios_already_transcoded_are_only_linked(self):
+        self._transcode()
+        AudioTrack.objects.filter(id=self.tracks[1].id).update(renditions={})
+        self.assertEqual(self._transcode(), 0)
+        self.assertEqual(
+            AudioTrack.objects.get(id=self.tracks[1].id).renditions,
+            AudioTrack.objects.get(id=self.tracks[0].id).renditions,
+        )
+
+
+@skipUnless(os.environ.get("POSTGRES_DB"), "set POSTGRES_DB to run against PostgreSQL")
+@override_settings(CACHES=LOCMEM_CACHE, DATABASE_ROUTERS=[])
+class PostgresSearchTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.addCleanup(setattr, fuzzy, "index", fuzzy.index)
+        fuzzy.index = VersionedIndex(fuzzy.index.build)
+        author = Author.objects.create(name="José Trigueirinho", slug="trigueirinho")
+        self.palestra = Palestra.objects.create(
+            title="Meditação", slug="meditacao", url="https://example.com/m", tags="serenidade"
+        )
+        self.palestra.authors.add(author)
+        track = AudioTrack.objects.create(palestra=self.palestra, name="Faixa", mp3_url="https://example.com/1.mp3")
+        track.set_transcript("a fraternidade universal", "")
+        track.save()
+
+    def _cursor_values(self, sql, params=()):
+        with connection.cursor() as cursor:
+            cursor.execute(sql, params)
+            return [row[0] for row in cursor.fetchall()]
+
+    def test_install_postgres_is_idempotent(self):
+        with connection.cursor() as cursor:
+            cursor.execute("SET CONSTRAINTS ALL IMMEDIATE")  # no ALTER TABLE while deferred checks are pending
+        with connection.schema_editor() as editor:
+            search_index.install_postgres(editor)
+        indexes = set(self._cursor_values("SELECT indexname FROM pg_indexes WHERE schemaname = 'public'"))
+        for table, columns in search_index.TRIGRAM_COLUMNS.items():
+            self.assertLessEqual({f"{table}_{column}_trgm" for column in columns}, indexes)
+        for table, _ in search_index.DOCUMENTS.values():
+            self.assertIn(f"{table}_search_vector", indexes)
+        self.assertEqual(self._cursor_values("SELECT f_unaccent('Meditação')"), ["Meditacao"])
+
+    def test_match_subqueries(self):
+        for document, columns, words in (
+            ("palestra", ["title"], ["meditacao"]),
+            ("palestra", ["tags"], ["seren"]),
+            ("track", ["name"], ["faixa"]),
+            ("transcript", ["text"], ["fraternidade", "universal"]),
+        ):
+            with self.subTest(document=document, words=words):
+                expression = search_index.match_expression(connection, document, columns, words)
+                self.assertEqual(
+                    self._cursor_values(search_index.match_subquery(connection, document), [expression]),
+                    [self.palestra.id],
+                )
+        expression = search_index.match_expression(connection, "palestra", ["description"], ["meditacao"])
+        self.assertEqual(self._cursor_values(search_index.match_subquery(connection, "palestra"), [expression]), [])
+
+    def test_stopwords_do_not_empty_the_results(self):
+        Palestra.objects.create(title="A luz do mundo", slug="luz", url="https://example.com/l")
+
+        def search(q):
+            palestras = Palestra.objects.all()
+            for condition in query.plan(query.parse(q), ["title", "description", "author"]):
+                palestras = palestras.filter(condition)
+            return sorted(palestras.values_list("slug", flat=True))
+
+        self.assertEqual(search("luz do mundo"), ["luz"])
+        self.assertEqual(search("o caminho"), [])
+        self.assertEqual(search('"luz do mundo"'), ["luz"])
+        self.assertEqual(search("meditação -do"), ["meditacao"])
+        self.assertEqual(search("do"), ["luz", "meditacao"])
+
+    def test_trigram_lookup(self):
+        self.assertTrue(Palestra.objects.filter(title__unaccent_icontains="MEDITACAO").exists())
+
+    def test_fuzzy_vocabulary_is_stems_from_ts_stat(self):
+        vocabulary = fuzzy._vocabulary()
+        self.assertLessEqual({"meditaca", "fratern", "universal", "trigueirinho"}, vocabulary.keys())
+        fuzzy.index.refresh()
+        clauses, expansions = query.expand_fuzzy(query.parse("meditacoa"))
+        self.assertEqual(expansions, {"meditacoa": ["meditaca"]})
+        palestras = Palestra.objects.all()
+        for condition in query.plan(clauses, ["title"]):
+            palestras = palestras.filter(condition)
+        self.assertEqual(list(palestras), [self.palestra])
+
+
+class PrerenderTests(TestCase):
+    def setUp(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        index = Path(tmp.name) / "index.html"
+        index.write_text('<html><head></head><body><div id="root"></div></body></html>')
+        patcher = mock.patch("palestras.management.commands.prerender.shell", FrontendShell(index))
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.output = Path(tmp.name) / "out"
+        p = Palestra.objects.create(title="Palestra", slug="palestra", url="https://example.com/p")
+        self.track = AudioTrack.objects.create(palestra=p, name="Faixa", mp3_url="https://example.com/1.mp3")
+
+    def _prerender(self):
+        out = io.StringIO()
+        call_command("prerender", "--base-url", "https://site", "--output", str(self.output), stdout=out)
+        return out.getvalue().splitlines()[0]
+
+    def test_renders_changed_palestras_with_compressed_siblings(self):
+        self.assertEqual(self._prerender(), "1 palestras, 1 to render, 0 removed")
+        detail = self.output / "api" / "palestras" / "palestra.json"
+        self.assertEqual(gzip.decompress((detail.parent / "palestra.json.gz").read_bytes()), detail.read_bytes())
+        self.assertEqual(brotli.decompress((detail.parent / "palestra.json.br").read_bytes()), detail.read_bytes())
+        self.assertEqual(self._prerender(), "1 palestras, 0 to render, 0 removed")
+        AudioTrack.objects.filter(id=self.track.id).update(renditions={"opus": "renditions/x/audio.opus"})
+        self.assertEqual(self._prerender(), "1 palestras, 1 to render, 0 removed")
+        self.assertIn("/media/renditions/x/audio.opus", detail.read_text())
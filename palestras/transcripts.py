@@ -0,0 +1,69 @@
+import re
+
+from .db_functions import strip_accents
+
+TIMESTAMP_RE = re.compile(r"^\[(\d{2}):(\d{2}):(\d{2})\]\s*(.*)")
+
+
+def parse_timecoded(text):
+    """Return list of (start_secs, text) from timecoded transcription."""
+    segments = []
+    for line in text.splitlines():
+        m = TIMESTAMP_RE.match(line)
+        if m:
+            h, mi, s, txt = int(m.group(1)), int(m.group(2)), int(m.group(3)), m.group(4)
+            segments.append((h * 3600 + mi * 60 + s, txt))
+    return segments
+
+
+def transcript_lines(text):
+    """Return (start_secs or None, text) for every non-empty line, indexed as the player shows them."""
+    lines = []
+    for line in text.split("\n"):
+        if not line:
+            continue
+        m = TIMESTAMP_RE.match(line)
+        if m:
+            h, mi, s, txt = int(m.group(1)), int(m.group(2)), int(m.group(3)), m.group(4)
+            lines.append((h * 3600 + mi * 60 + s, txt))
+        else:
+            lines.append((None, line))
+    return lines
+
+
+def fold_with_offsets(text):
+    """
+    Return text through strip_accents and, for each folded character, the
+    index of the original character it came from (None when they line up).
+    """
+    if text.isascii():
+        return text.lower(), None
+    folded, offsets = [], []
+    for i, ch in enumerate(text):
+        for c in strip_accents(ch):
+            folded.append(c)
+            offsets.append(i)
+    return "".join(folded), offsets
+
+
+def match_pattern(terms):
+    """Regex matching any of the terms at a word start in folded text, None without terms."""
+    parts = [
+        r"\W+".join(re.escape(word) for word in strip_accents(term).split())
+        for term in terms
+    ]
+    parts = [part for part in parts if part]
+    if not parts:
+        return None
+    return re.compile(r"(?<!\w)(?:" + "|".join(sorted(parts, key=len, reverse=True)) + ")")
+
+
+def find_matches(lines, pattern):
+    """Yield (line index, seconds, start, end) for every match, offsets into the original line text."""
+    for index, (seconds, text) in enumerate(lines):
+        folded, offsets = fold_with_offsets(text)
+        for m in pattern.finditer(folded):
+            if offsets is None:
+                yield index, seconds, m.start(), m.end()
+            else:
+                yield index, seconds, offsets[m.start()], offsets[m.end() - 1] + 1
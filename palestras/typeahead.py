@@ -0,0 +1,105 @@
+"""
+Prefix completions for the search box.
+
+Titles, author names, concepts and frequent transcript terms (the vocabulary
+file written by build_vocabulary) are folded with strip_accents into one
+sorted list, so a lookup is a bisect plus a short forward scan. The list
+lives in process memory; after a data version bump a background thread
+builds the next one while requests keep completing from the old one.
+"""
+import bisect
+import heapq
+import json
+import math
+from pathlib import Path
+
+from django.conf import settings
+
+from .caching import VersionedIndex
+from .db_functions import strip_accents
+from .facets import facet_map
+from .models import AudioTrack, Palestra
+
+VOCABULARY_PATH = Path(getattr(settings, "VOCABULARY_PATH", settings.BASE_DIR / "vocabulary.json"))
+
+MIN_PREFIX = 2
+MAX_SCAN = 500       # entries ranked per lookup; bounds latency for short prefixes
+MIN_WORD = 3         # title words shorter than this don't start a completion key
+KIND_BOOST = {"title": 3.0, "author": 2.5, "concept": 1.5, "term": 0.0}
+
+
+def fold(text):
+    return " ".join(strip_accents(text).split())
+
+
+def read_vocabulary():
+    """Return [(term, document frequency)] from the vocabulary file, [] if absent."""
+    if not VOCABULARY_PATH.exists():
+        return []
+    with open(VOCABULARY_PATH, encoding="utf-8") as f:
+        return [tuple(item) for item in json.load(f)["terms"]]
+
+
+class SuggestIndex:
+    def __init__(self):
+        entries = {}  # (key, kind, label) -> [count, slug]
+
+        def add(key, kind, label, count=1, slug=None):
+            entry = entries.setdefault((key, kind, label), [0, slug])
+            entry[0] += count
+
+        for title, slug in Palestra.objects.values_list("title", "slug").iterator():
+            words = fold(title).split()
+            for i, word in enumerate(words):
+                if i == 0 or len(word) >= MIN_WORD:
+                    add(" ".join(words[i:]), "title", title, slug=slug)
+        for author in facet_map()["authors"]:
+            words = fold(author["name"]).split()
+            for i in range(len(words)):
+                add(" ".join(words[i:]), "author", author["name"], author["count"], author["slug"])
+        concept_labels = {}
+        for concepts in AudioTrack.objects.exclude(transcript=None).values_list("transcript__concepts", flat=True).iterator():
+            for concept in concepts or []:
+                key = fold(concept)
+                if key:
+                    add(key, "concept", concept_labels.setdefault(key, concept.strip()))
+        for term, df in read_vocabulary():
+            add(term, "term", term, df)
+
+        rows = sorted(
+            (key, KIND_BOOST[kind] + math.log1p(count), kind, label, slug)
+            for (key, kind, label), (count, slug) in entries.items()
+        )
+        self.keys = [row[0] for row in rows]
+        self.rows = rows
+
+    def complete(self, prefix, limit=10):
+        start = bisect.bisect_left(self.keys, prefix)
+        end = bisect.bisect_right(self.keys, prefix + "\uffff", lo=start, hi=min(len(self.keys), start + MAX_SCAN))
+        best = heapq.nlargest(limit * 3, self.rows[start:end], key=lambda row: (row[1], -len(row[3])))
+        seen, suggestions = set(), []
+        for key, _, kind, label, slug in best:
+            # a concept that is also a frequent term is suggested once
+            seen_key = (slug or key, kind if slug else "word")
+            if seen_key in seen:
+                continue
+            seen.add(seen_key)
+            item = {"label": label, "kind": kind}
+            if slug:
+                item["slug"] = slug
+            suggestions.append(item)
+            if len(suggestions) == limit:
+                break
+        return suggestions
+
+
+index = VersionedIndex(lambda previous: SuggestIndex())
+
+
+def complete(query, limit=10):
+    """Return up to limit completions for what has been typed so far."""
+    prefix = fold(query)
+    if len(prefix) < MIN_PREFIX:
+        return []
+    current = index.get()
+    return current.complete(prefix, limit) if current else []
@@ -1,12 +1,26 @@
-from django.conf import settings
-from django.db.models import Q
-from django.http import HttpResponse, JsonResponse, Http404
-from django.utils.html import escape
+import json
+from base64 import urlsafe_b64decode, urlsafe_b64encode
 
+from django.core.cache import cache
+from django.db.models import Count, Prefetch
+from django.http import HttpResponse, JsonResponse
+from django.views.decorators.gzip import gzip_page
+
+from . import query as query_language
+from . import semantic, typeahead
+from .caching import cached_api, versioned_key
 from .db_functions import strip_accents
-from .models import Author, Palestra
+from .facets import facet_counts, facet_map, filter_by
+from .frontend import og_tags, shell
+from .models import AudioTrack, Palestra, RelatedPalestra
+from .routers import read_only
+from .transcripts import find_matches, match_pattern, transcript_lines
 
-FRONTEND_INDEX = settings.BASE_DIR / "static" / "frontend" / "index.html"
+RRF_K = 60                  # reciprocal rank fusion damping
+FUSION_DEPTH = 200          # keyword results considered when fusing with semantic hits
+PAGE_CACHE_TTL = 24 * 3600
+TOTAL_CAP = 1000            # search counts and facets stop here; both are then flagged as lower bounds
+MAX_TRANSCRIPT_MATCHES = 500
 
 
 def _author_data(author):
@@ -21,12 +35,12 @@ def _author_data(author):
     }
 
 
-def _find_snippet(text, words, max_len=200):
-    """Return a snippet of text around the first matching word."""
+def _find_snippet(text, folded_words, max_len=200):
+    """Return a snippet of text around the first matching word (words already passed through strip_accents)."""
     normalized = strip_accents(text)
     best_idx = -1
-    for w in words:
-        idx = normalized.find(strip_accents(w))
+    for w in folded_words:
+        idx = normalized.find(w)
         if idx != -1:
             best_idx = idx
             break
@@ -42,51 +56,65 @@ def _find_snippet(text, words, max_len=200):
     return snippet
 
 
+def _fuse(*rankings):
+    """Merge ranked id lists with reciprocal rank fusion, best first."""
+    scores = {}
+    for ranking in rankings:
+        for rank, pid in enumerate(ranking):
+            scores[pid] = scores.get(pid, 0) + 1 / (RRF_K + rank + 1)
+    return sorted(scores, key=scores.get, reverse=True)
+
+
+def _encode_cursor(position):
+    return urlsafe_b64encode(json.dumps(position).encode()).decode().rstrip("=")
+
+
+def _decode_cursor(token):
+    """Return the position encoded in a next token, or None for a missing or garbled one."""
+    if not token:
+        return None
+    try:
+        position = json.loads(urlsafe_b64decode(token + "=" * (-len(token) % 4)))
+    except ValueError:
+        return None
+    if isinstance(position, dict) and isinstance(position.get("after", position.get("offset")), int):
+        return position
+    return None
+
+
+@cached_api
 def authors_list(request):
-    authors = Author.objects.order_by("name").values("name", "slug")
-    return JsonResponse({"authors": list(authors)})
+    return {"authors": facet_map()["authors"]}
 
 
+@cached_api
 def languages_list(request):
-    raw = (
-        Palestra.objects.exclude(language__isnull=True)
-        .exclude(language="")
-        .values_list("language", flat=True)
-    )
-    langs = set()
-    for val in raw:
-        for lang in val.split(","):
-            lang = lang.strip()
-            if lang:
-                langs.add(lang)
-    return JsonResponse({"languages": sorted(langs)})
-
-
-def _split_csv_field(field_name):
-    raw = (
-        Palestra.objects.exclude(**{f"{field_name}__isnull": True})
-        .exclude(**{field_name: ""})
-        .values_list(field_name, flat=True)
-    )
-    values = set()
-    for val in raw:
-        for item in val.split(","):
-            item = item.strip()
-            if item:
-                values.add(item)
-    return sorted(values)
+    languages = facet_map()["languages"]
+    return {
+        "languages": [lang["name"] for lang in languages],
+        "counts": {lang["name"]: lang["count"] for lang in languages},
+    }
 
 
+@cached_api
 def categories_list(request):
-    return JsonResponse({"categories": _split_csv_field("categories")})
+    categories = facet_map()["categories"]
+    return {
+        "categories": [cat["name"] for cat in categories],
+        "counts": {cat["name"]: cat["count"] for cat in categories},
+    }
 
 
-def palestra_detail(request, slug):
-    try:
-        p = Palestra.objects.prefetch_related("authors", "tracks").get(slug=slug)
-    except Palestra.DoesNotExist:
-        return JsonResponse({"error": "Not found"}, status=404)
+@read_only()
+def suggest(request):
+    """Prefix completions for the search box, served from the in-memory index."""
+    response = JsonResponse({"suggestions": typeahead.complete(request.GET.get("q", ""))})
+    response["Cache-Control"] = "max-age=60"
+    return response
 
+
+def palestra_detail_data(p):
+    """Detail payload for a palestra with authors and tracks__transcript prefetched."""
     tracks = []
     for t in p.tracks.all():
         if t.local_path:
@@ -97,10 +125,17 @@ def palestra_detail(request, slug):
             "id": t.id,
             "name": t.name,
             "audio_url": audio_url,
-            "transcription_timecoded": t.transcription_timecoded,
+            # Low-bitrate streams, when transcoded: {"opus": url, "hls": master playlist url}
+            "renditions": {kind: f"/media/{path}" for kind, path in t.renditions.items()},
+            "transcription_timecoded": t.transcript.timecoded if t.transcript else "",
         })
 
-    return JsonResponse({
+    related = [
+        {"title": r.related.title, "slug": r.related.slug, "score": r.score}
+        for r in RelatedPalestra.objects.filter(palestra=p).select_related("related").order_by("-score")
+    ]
+
+    return {
         "id": p.id,
         "title": p.title,
         "slug": p.slug,
@@ -111,34 +146,80 @@ def palestra_detail(request, slug):
         "language": p.language,
         "authors": [_author_data(a) for a in p.authors.all()],
         "tracks": tracks,
-    })
+        "related": related,
+    }
 
 
-def palestra_page(request, slug):
-    """Serve index.html with Open Graph meta tags for link previews."""
+@cached_api
+def palestra_detail(request, slug):
     try:
-        p = Palestra.objects.prefetch_related("authors").get(slug=slug)
+        p = Palestra.objects.prefetch_related("authors", "tracks__transcript").get(slug=slug)
     except Palestra.DoesNotExist:
-        with open(FRONTEND_INDEX) as f:
-            return HttpResponse(f.read(), content_type="text/html")
-
-    author_names = ", ".join(a.name for a in p.authors.all())
-    og_title = f"{author_names} - {p.title}" if author_names else p.title
-    description = p.description[:200].strip() if p.description else ""
+        return JsonResponse({"error": "Not found"}, status=404)
+    return palestra_detail_data(p)
 
-    og_tags = f"""
-    <meta property="og:type" content="website" />
-    <meta property="og:title" content="{escape(og_title)}" />
-    <meta property="og:description" content="{escape(description)}" />
-    <meta property="og:url" content="{escape(request.build_absolute_uri())}" />"""
 
-    with open(FRONTEND_INDEX) as f:
-        html = f.read()
+@cached_api
+def palestra_search(request, slug):
+    """
+    The matches of q in the palestra's timecoded transcripts (the ones the
+    player shows), as (track, line index, seconds, character offsets into the
+    line) for next/previous navigation; at most MAX_TRANSCRIPT_MATCHES.
+    """
+    try:
+        p = Palestra.objects.only("id").get(slug=slug)
+    except Palestra.DoesNotExist:
+        return JsonResponse({"error": "Not found"}, status=404)
 
-    html = html.replace("</head>", og_tags + "\n  </head>", 1)
+    clauses = query_language.parse(request.GET.get("q", ""))
+    if request.GET.get("fuzzy"):
+        clauses, _ = query_language.expand_fuzzy(clauses)
+    # Terms restricted to another field (title:luz) say nothing about the transcripts
+    clauses = [c for c in clauses if c.field in (None, "transcriptions")]
+    pattern = match_pattern(query_language.terms(clauses))
+
+    matches = []
+    truncated = False
+    if pattern:
+        # Only the transcripts the full-text index says match are read and scanned
+        tracks = (
+            p.tracks.filter(query_language.transcript_condition(clauses))
+            .exclude(transcript=None).exclude(transcript__timecoded="")
+            .select_related("transcript").only("id", "transcript__timecoded").order_by("id")
+        )
+        for track in tracks:
+            lines = transcript_lines(track.transcript.timecoded)
+            for line, seconds, start, end in find_matches(lines, pattern):
+                if len(matches) == MAX_TRANSCRIPT_MATCHES:
+                    truncated = True
+                    break
+                matches.append({
+                    "track_id": track.id, "line": line, "seconds": seconds, "start": start, "end": end,
+                })
+            if truncated:
+                break
+    return {"matches": matches, "total": len(matches), "truncated": truncated}
+
+
+@gzip_page
+@read_only()
+def palestra_page(request, slug):
+    """Serve index.html with Open Graph meta tags for link previews."""
+    # Without the query string, so ?utm_*/?fbclid= variants of a link share one entry
+    url = request.build_absolute_uri(request.path)
+    key = versioned_key(f"page:{shell.version()}:{request.get_host()}:{slug}")
+    html = cache.get(key)
+    if html is None:
+        try:
+            p = Palestra.objects.prefetch_related("authors").get(slug=slug)
+        except Palestra.DoesNotExist:
+            return HttpResponse(shell.document(), content_type="text/html")
+        html = shell.render(og_tags(p, url).encode())
+        cache.set(key, html, PAGE_CACHE_TTL)
     return HttpResponse(html, content_type="text/html")
 
 
+@cached_api
 def search(request):
     query = request.GET.get("q", "").strip()
     page = int(request.GET.get("page", 1))
@@ -146,82 +227,117 @@ def search(request):
     author_slugs = request.GET.getlist("author")
     selected_languages = request.GET.getlist("language")
     selected_categories = request.GET.getlist("category")
-
-    if not query and not author_slugs and not selected_languages and not selected_categories:
-        return JsonResponse({"results": [], "total": 0, "page": 1, "pages": 1})
-
-    words = query.split() if query else []
+    mode = request.GET.get("mode", "keyword")
+    cursor = _decode_cursor(request.GET.get("cursor"))
+
+    clauses = query_language.parse(query)
+    expansions = {}
+    if request.GET.get("fuzzy") and mode != "semantic":
+        clauses, expansions = query_language.expand_fuzzy(clauses)
+    if not clauses and not author_slugs and not selected_languages and not selected_categories:
+        return {"results": [], "total": 0, "total_capped": False, "page": 1, "pages": 1, "next": None, "expansions": {},
+                "facets_capped": False}
+
+    words = query_language.terms(clauses)
     fields = request.GET.getlist("fields")
+    active_fields = [f for f in query_language.LIKE_LOOKUPS if not fields or f in fields]
 
-    FIELD_MAP = {
-        "title": "title__unaccent_icontains",
-        "description": "description__unaccent_icontains",
-        "categories": "categories__unaccent_icontains",
-        "tags": "tags__unaccent_icontains",
-        "track_name": "tracks__name__unaccent_icontains",
-        "transcriptions": "tracks__transcription__unaccent_icontains",
-    }
+    qs = Palestra.objects.all()
+
+    if author_slugs:
+        qs = filter_by(qs, "authors", author_slugs)
 
-    active_fields = {k: v for k, v in FIELD_MAP.items() if k in fields} if fields else FIELD_MAP
+    if selected_languages:
+        qs = filter_by(qs, "languages", selected_languages)
 
-    qs = Palestra.objects.prefetch_related("authors", "tracks")
+    if selected_categories:
+        qs = filter_by(qs, "categories", selected_categories)
 
-    for word in words:
-        word_q = Q()
-        for lookup in active_fields.values():
-            word_q |= Q(**{lookup: word})
-        qs = qs.filter(word_q)
+    filtered = qs
+    for condition in query_language.plan(clauses, active_fields):
+        qs = qs.filter(condition)
 
-    if author_slugs:
-        qs = qs.filter(authors__slug__in=author_slugs)
+    qs = qs.distinct().order_by("id")
 
-    if selected_languages:
-        selected_set = set(selected_languages)
-        all_raw = (
-            Palestra.objects.exclude(language__isnull=True)
-            .exclude(language="")
-            .values_list("language", flat=True)
-            .distinct()
-        )
-        matching_raw = {
-            raw for raw in all_raw
-            if {p.strip() for p in raw.split(",")} & selected_set
-        }
-        qs = qs.filter(language__in=matching_raw) if matching_raw else qs.none()
-
-    for selected, field in ((selected_categories, "categories"),):
-        if selected:
-            selected_set = set(selected)
-            all_raw = Palestra.objects.exclude(**{f"{field}__isnull": True}).exclude(**{field: ""}).values_list(field, flat=True).distinct()
-            matching_raw = {raw for raw in all_raw if {v.strip() for v in raw.split(",")} & selected_set}
-            qs = qs.filter(**{f"{field}__in": matching_raw}) if matching_raw else qs.none()
-
-    qs = qs.distinct()
-    total = qs.count()
-    pages = max(1, (total + per_page - 1) // per_page)
-    page = max(1, min(page, pages))
-    offset = (page - 1) * per_page
+    semantic_hits = semantic.search(query) if mode == "semantic" and query else {}
+    if semantic_hits:
+        keyword_ids = list(qs.values_list("id", flat=True)[:FUSION_DEPTH])
+        allowed = set(filtered.filter(id__in=list(semantic_hits)).values_list("id", flat=True))
+        ranked = _fuse(keyword_ids, [pid for pid in semantic_hits if pid in allowed])
+        matched = Palestra.objects.filter(id__in=ranked)
+    else:
+        matched = qs
+
+    # Counting and facets are only done for the first request of a result set;
+    # cursor requests just read the next page.
+    total = pages = facets = None
+    total_capped = False
+    if cursor is None:
+        total = len(ranked) if semantic_hits else matched.values("id")[:TOTAL_CAP + 1].count()
+        total_capped = total > TOTAL_CAP
+        total = min(total, TOTAL_CAP)
+        pages = max(1, (total + per_page - 1) // per_page)
+        page = max(1, min(page, pages))
+        facets = facet_counts(matched, limit=TOTAL_CAP)
+
+    if semantic_hits:
+        offset = cursor.get("offset", 0) if cursor else (page - 1) * per_page
+        page_ids = ranked[offset : offset + per_page]
+        has_more = offset + per_page < len(ranked)
+        next_cursor = _encode_cursor({"offset": offset + per_page}) if has_more else None
+    else:
+        if cursor:
+            page_qs = qs.filter(id__gt=cursor.get("after", 0))
+        else:
+            page_qs = qs[(page - 1) * per_page :]
+        page_ids = list(page_qs.values_list("id", flat=True)[: per_page + 1])
+        has_more = len(page_ids) > per_page
+        page_ids = page_ids[:per_page]
+        next_cursor = _encode_cursor({"after": page_ids[-1]}) if has_more else None
 
     search_transcriptions = "transcriptions" in active_fields
     search_track_name = "track_name" in active_fields
 
+    # The page is loaded apart from the search joins, so the track count covers
+    # every track and the whole page costs a fixed number of queries. Transcripts
+    # are only joined in when snippets are cut from them.
+    tracks = AudioTrack.objects.all()
+    if search_transcriptions or semantic_hits:
+        tracks = tracks.select_related("transcript")
+    by_id = (
+        Palestra.objects.filter(id__in=page_ids)
+        .annotate(track_count=Count("tracks"))
+        .prefetch_related("authors", Prefetch("tracks", queryset=tracks))
+        .in_bulk()
+    )
+    page_palestras = [by_id[pid] for pid in page_ids if pid in by_id]
+    folded_words = [strip_accents(w) for w in words]
+
     results = []
-    for p in qs[offset : offset + per_page]:
+    for p in page_palestras:
         transcription_snippets = []
         matching_track_names = []
+        hit = semantic_hits.get(p.id)
         for track in p.tracks.all():
+            if hit and hit["track_id"] == track.id and track.transcript:
+                transcription_snippets.append({
+                    "track_name": track.name,
+                    "snippet": semantic.window_text(track.transcript, hit["first"], hit["last"], hit["start"]),
+                    "seconds": hit["start"] if hit["start"] >= 0 else None,
+                })
+                continue
             has_transcription_snippet = False
-            if search_transcriptions and track.transcription:
-                snippet = _find_snippet(track.transcription, words)
+            if search_transcriptions and track.transcript and track.transcript.text:
+                snippet = _find_snippet(track.transcript.text, folded_words)
                 if snippet:
                     has_transcription_snippet = True
                     transcription_snippets.append(
                         {"track_name": track.name, "snippet": snippet}
                     )
-            if search_track_name and not has_transcription_snippet and words and all(
-                strip_accents(word.lower()) in strip_accents(track.name.lower()) for word in words
-            ):
-                matching_track_names.append(track.name)
+            if search_track_name and not has_transcription_snippet and folded_words:
+                folded_name = strip_accents(track.name)
+                if all(word in folded_name for word in folded_words):
+                    matching_track_names.append(track.name)
 
         results.append(
             {
@@ -234,12 +350,21 @@ def search(request):
                 "tags": p.tags,
                 "language": p.language,
                 "authors": [_author_data(a) for a in p.authors.all()],
-                "track_count": p.tracks.count(),
+                "track_count": p.track_count,
                 "matching_track_names": matching_track_names,
                 "transcription_snippets": transcription_snippets,
             }
         )
 
-    return JsonResponse(
-        {"results": results, "total": total, "page": page, "pages": pages}
-    )
+    return {
+        "results": results,
+        "total": total,
+        "total_capped": total_capped,
+        "page": page if cursor is None else None,
+        "pages": pages,
+        "next": next_cursor,
+        "expansions": expansions,
+        "facets": facets,
+        # Facets only cover the first TOTAL_CAP matches, so capped counts are lower bounds
+        "facets_capped": total_capped,
+    }